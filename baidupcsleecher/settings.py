@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
+from json import loads
 from os import getenv
 from pathlib import Path
 
@@ -62,7 +63,35 @@ REMOTE_LEECHER_DIR = str(Path(getenv("REMOTE_LEECHER_DIR", "/leecher")).resolve(
 RUNNER_SLEEP_SECONDS = int(getenv("RUNNER_SLEEP_SECONDS", "5"))
 SAMPLE_SIZE = int(getenv("SAMPLE_SIZE", "10240"))
 FULL_DOWNLOAD_IMMEDIATELY = bool(int(getenv("FULL_DOWNLOAD_IMMEDIATELY", 0)))
+# the order of processing tasks: fifo, priority, sjf (shortest job first), fair (take turns between callback hosts)
+SCHEDULING_POLICY = getenv("SCHEDULING_POLICY", "priority")
+# continue with the next stages in the same worker once a stage is done
+PIPELINE_STAGES = bool(int(getenv("PIPELINE_STAGES", 0)))
 RETRY_TIMES_LIMIT = int(getenv("RETRY_TIMES_LIMIT", 5))
+# wait before retrying, doubled on every retry, with random jitter
+RETRY_BACKOFF_SECONDS = int(getenv("RETRY_BACKOFF_SECONDS", "30"))
+RETRY_THROTTLED_BACKOFF_SECONDS = int(getenv("RETRY_THROTTLED_BACKOFF_SECONDS", "300"))
+RETRY_BACKOFF_MAX_SECONDS = int(getenv("RETRY_BACKOFF_MAX_SECONDS", "21600"))
+# callback requests timeout after seconds
+CALLBACK_TIMEOUT_SECONDS = int(getenv("CALLBACK_TIMEOUT_SECONDS", "10"))
+# give up delivering a callback event after failed times
+CALLBACK_RETRY_LIMIT = int(getenv("CALLBACK_RETRY_LIMIT", "5"))
+# wait before retrying delivery, doubled on every retry
+CALLBACK_BACKOFF_SECONDS = int(getenv("CALLBACK_BACKOFF_SECONDS", "10"))
+# post up to this number of events to the same callback url in one request
+CALLBACK_BATCH_SIZE = int(getenv("CALLBACK_BATCH_SIZE", "1"))
+# extra rules to classify error messages, json list of [regex, error_class, recoverable]
+ERROR_RULES = loads(getenv("ERROR_RULES", "[]"))
+# workers report they are alive every few seconds while processing a task
+HEARTBEAT_INTERVAL_SECONDS = int(getenv("HEARTBEAT_INTERVAL_SECONDS", "30"))
+# task without heartbeat for a long time will be returned to its stage
+HEARTBEAT_TIMEOUT_SECONDS = int(getenv("HEARTBEAT_TIMEOUT_SECONDS", "300"))
+# save download progress of running tasks every few seconds
+PROGRESS_INTERVAL_SECONDS = int(getenv("PROGRESS_INTERVAL_SECONDS", "2"))
+# check for changed tasks every few seconds while streaming task events
+TASK_EVENTS_POLL_SECONDS = float(getenv("TASK_EVENTS_POLL_SECONDS", "1"))
+# close task event streams after seconds, clients will reconnect
+TASK_EVENTS_TIMEOUT_SECONDS = int(getenv("TASK_EVENTS_TIMEOUT_SECONDS", "300"))
 # shared link transfer policy: always, if_not_present
 TRANSFER_POLICY = getenv("TRANSFER_POLICY", "if_not_present")
 PAN_BAIDU_BDUSS = getenv("PAN_BAIDU_BDUSS", "")
@@ -70,6 +99,31 @@ PAN_BAIDU_COOKIES = getenv("PAN_BAIDU_COOKIES", "")
 # do not download these path
 IGNORE_PATH_RE = getenv("IGNORE_PATH_RE", ".*__MACOSX.*|.*spam.*")
 
+# cache serialized tasks and rendered task lists for seconds, 0 to disable
+TASK_CACHE_SECONDS = int(getenv("TASK_CACHE_SECONDS", "60"))
+# refresh progress of active tasks on the ui every few seconds
+UI_PROGRESS_INTERVAL_SECONDS = int(getenv("UI_PROGRESS_INTERVAL_SECONDS", "3"))
+# paginate task lists of api and ui by: page (page numbers), cursor (faster on large tables)
+TASK_PAGINATION = getenv("TASK_PAGINATION", "page")
+# move or delete directories of deleted tasks with this number of threads
+PURGE_WORKERS = int(getenv("PURGE_WORKERS", "4"))
+# delete up to this number of files per second while purging, 0 for no limit
+PURGE_FILES_PER_SECOND = float(getenv("PURGE_FILES_PER_SECOND", "0"))
+# evict the oldest directories in the trash once it is larger than bytes, 0 for no limit
+TRASH_MAX_SIZE = int(getenv("TRASH_MAX_SIZE", "0"))
+# evict directories moved into the trash for more than days, 0 to keep forever
+TRASH_MAX_AGE_DAYS = int(getenv("TRASH_MAX_AGE_DAYS", "0"))
+# leave at least bytes of free space in the disk of DATA_DIR, tasks wait until their files fit
+DISK_RESERVED_SIZE = int(getenv("DISK_RESERVED_SIZE", "0"))
+# keep fully downloaded files under bytes, evicting least recently accessed tasks, 0 for no quota
+DATA_DIR_QUOTA = int(getenv("DATA_DIR_QUOTA", "0"))
+# link files already downloaded by other tasks (same md5 and size) instead of downloading them again
+DEDUPE_FILES = bool(int(getenv("DEDUPE_FILES", "1")))
+# finish new tasks at once if the same share has been downloaded, unless `dedupe` is set on creation
+DEDUPE_TASKS = bool(int(getenv("DEDUPE_TASKS", "0")))
+# only reuse the files of shares downloaded within days, 0 for no limit
+DEDUPE_MAX_AGE_DAYS = int(getenv("DEDUPE_MAX_AGE_DAYS", "7"))
+
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "drf_link_header_pagination.LinkHeaderPagination",
     "PAGE_SIZE": int(getenv("API_PAGE_SIZE", "20")),
@@ -77,6 +131,8 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # serve static files without runserver
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -153,6 +209,18 @@ if "mysql" in DATABASES["default"]["ENGINE"]:
         "charset": "utf8mb4",
     }
 
+# e.g. django.core.cache.backends.filebased.FileBasedCache with /var/tmp/baidupcsleecher,
+# or django.core.cache.backends.redis.RedisCache with redis://127.0.0.1:6379
+CACHES = {
+    "default": {
+        "BACKEND": getenv(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": getenv("CACHE_LOCATION", ""),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -27,6 +27,7 @@ router.register(r"task", views.TaskViewSet)
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("ui/", include("ui.urls")),
+    path("task/events/", views.task_events, name="task-events"),
     path("", include(router.urls)),
 ]
 
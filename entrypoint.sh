@@ -3,7 +3,8 @@
 python manage.py migrate
 python manage.py collectstatic --noinput
 
-python manage.py runserver 0.0.0.0:8000 &
+# an ASGI server, so that streams of task events are not buffered
+uvicorn baidupcsleecher.asgi:application --host 0.0.0.0 --port 8000 &
 
 sleep 1
 echo
@@ -12,6 +13,9 @@ python manage.py runtransfer &
 python manage.py runsamplingdownloader &
 python manage.py runleecher &
 python manage.py runresume &
+python manage.py runcallback &
+python manage.py runpurge &
+python manage.py runresync &
 echo
 
 wait -n
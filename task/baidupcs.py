@@ -17,6 +17,8 @@ from baidupcs_py.baidupcs import BaiduPCSError
 from baidupcs_py.baidupcs import PCS_UA
 from django.conf import settings
 
+from .content import ContentIndex
+from .rules import PathRules
 from .utils import cookies2dict
 from .utils import download_url
 from .utils import match_regex
@@ -93,6 +95,8 @@ class BaiduPCSClient:
         callback_save_captcha: Optional[Callable] = None,
         captcha_id: str = "",
         captcha_code: str = "",
+        callback_transferred: Optional[Callable] = None,
+        rules: Optional[PathRules] = None,
     ) -> None:
         save_shared(
             self,
@@ -102,6 +106,8 @@ class BaiduPCSClient:
             callback_save_captcha=callback_save_captcha,
             captcha_id=captcha_id,
             captcha_code=captcha_code,
+            callback_transferred=callback_transferred,
+            rules=rules,
         )
 
     def download_dir(
@@ -109,15 +115,29 @@ class BaiduPCSClient:
         remote_dir: str,
         local_dir: str,
         sample_size: int = 0,
+        callback_progress: Optional[Callable[[int], None]] = None,
+        content_index: Optional[ContentIndex] = None,
+        rules: Optional[PathRules] = None,
     ) -> None:
         for file in self.list_files(remote_dir):
             if not file["is_file"]:
                 continue
             remote_path = str(Path(remote_dir) / file["path"])
             source_sub_path = remote_path[len(remote_dir) + 1 :]
+            if rules and not rules.match(source_sub_path, file["size"]):
+                logger.info(f"  {remote_path} not matched rules, skipping")
+                continue
             local_dir_ = (Path(local_dir) / source_sub_path).parent
             file_size = file["size"]
-            self.download_file(remote_path, local_dir_, file_size, sample_size)
+            self.download_file(
+                remote_path,
+                local_dir_,
+                file_size,
+                sample_size,
+                callback_progress=callback_progress,
+                md5=file["md5"],
+                content_index=content_index,
+            )
 
     def download_file(
         self,
@@ -125,6 +145,9 @@ class BaiduPCSClient:
         local_dir: str,
         file_size: int,
         sample_size: int = 0,
+        callback_progress: Optional[Callable[[int], None]] = None,
+        md5: Optional[str] = None,
+        content_index: Optional[ContentIndex] = None,
     ) -> Optional[int]:
         local_path = Path(local_dir) / basename(remote_path)
         logger.info(f"  {remote_path} -> {local_path}")
@@ -135,13 +158,26 @@ class BaiduPCSClient:
         if not local_path.parent.exists():
             local_path.parent.mkdir(parents=True)
 
+        # whole files only, samples are not shared
+        dedupe = content_index is not None and md5 and not sample_size
+
         if local_path.exists():
-            if (sample_size and sample_size <= getsize(local_path)) or (
-                not sample_size and file_size <= getsize(local_path)
+            local_size = getsize(local_path)
+            if (sample_size and sample_size <= local_size) or (
+                not sample_size and file_size <= local_size
             ):
                 logger.info(f"{local_path} is ready existed.")
+                if dedupe:
+                    content_index.add(md5, file_size, local_path)
+                if callback_progress:
+                    callback_progress(local_size)
                 return
 
+        if dedupe and content_index.link(md5, file_size, local_path):
+            if callback_progress:
+                callback_progress(file_size)
+            return file_size
+
         url = self.api.download_link(remote_path)
         if not url:
             logger.info(remote_path)
@@ -153,17 +189,72 @@ class BaiduPCSClient:
             # TODO 'Range': 'bytes=%d-' % resume_byte_pos,
         }
 
-        total = download_url(local_path, url, headers, limit=sample_size)
+        total = download_url(
+            local_path,
+            url,
+            headers,
+            limit=sample_size,
+            callback_progress=callback_progress,
+        )
+        if dedupe and local_path.exists() and getsize(local_path) == file_size:
+            content_index.add(md5, file_size, local_path)
         return total
 
-    def leech(self, remote_dir: str, local_dir: Path, sample_size: int = 0) -> None:
+    def leech(
+        self,
+        remote_dir: str,
+        local_dir: Path,
+        sample_size: int = 0,
+        callback_progress: Optional[Callable[[int], None]] = None,
+        content_index: Optional[ContentIndex] = None,
+        rules: Optional[PathRules] = None,
+    ) -> None:
         if not local_dir.exists():
             makedirs(local_dir, exist_ok=True)
 
-        self.download_dir(remote_dir, local_dir, sample_size=sample_size)
+        self.download_dir(
+            remote_dir,
+            local_dir,
+            sample_size=sample_size,
+            callback_progress=callback_progress,
+            content_index=content_index,
+            rules=rules,
+        )
+
+    def delete(self, *remote_dirs: str) -> None:
+        self.api.remove(*remote_dirs)
 
-    def delete(self, remote_dir: str) -> None:
-        self.api.remove(remote_dir)
+    def transfer_shared_files(
+        self,
+        remote_dir: str,
+        shared_url: str,
+        files: List[Dict[str, Any]],
+        chunk_size: int = 100,
+    ) -> None:
+        """
+        Save the given files listed by `list_shared_files` to the remote dir,
+        at the same paths as in the share.
+        """
+        parents: Dict[str, List[Dict[str, Any]]] = {}
+        for file in files:
+            parent = PurePosixPath(remote_dir) / PurePosixPath(file["path"]).parent
+            parents.setdefault(str(parent), []).append(file)
+
+        for rd, sub_files in parents.items():
+            if not self.api.exists(rd):
+                self.api.makedir(rd)
+            for i in range(0, len(sub_files), chunk_size):
+                chunk = sub_files[i : i + chunk_size]
+                first = chunk[0]
+                self.api.transfer_shared_paths(
+                    rd,
+                    [file["fs_id"] for file in chunk],
+                    first["uk"],
+                    first["share_id"],
+                    first["bdstoken"],
+                    shared_url,
+                )
+                logger.info(f"save: {len(chunk)} files to {rd}")
 
 
 def remotepath_exists(
@@ -187,7 +278,13 @@ def save_shared(
     callback_save_captcha: Optional[Callable] = None,
     captcha_id: str = "",
     captcha_code: str = "",
+    callback_transferred: Optional[Callable] = None,
+    rules: Optional[PathRules] = None,
 ) -> None:
+    """
+    Save the shared paths to the remote dir. With rules, directories are
+    taken apart to save the matched files only, in chunks of every dir.
+    """
     assert remotedir.startswith("/"), "`remotedir` must be an absolute path"
 
     shared_url = unify_shared_link(shared_url)
@@ -202,23 +299,7 @@ def save_shared(
             captcha_code,
         )
 
-    try:
-        shared_paths = deque(client.api.shared_paths(shared_url))
-    except Exception as e:
-        error = str(e)
-        if "error_code: 117," in error and "'expiredType': -1," in error:
-            i = error.find(" 117,")
-            friendly_message = error[:i] + " 117, message: 该分享已过期"
-            raise BaiduPCSError(friendly_message)
-        if "error_code: 145," in error:
-            i = error.find(" 145,")
-            friendly_message = error[:i] + " 145, message: 该分享已被删除"
-            raise BaiduPCSError(friendly_message)
-        if "message: {'csrf':" in error:
-            i = error.find("{'csrf'")
-            sensitive_info_removed = error[:i] + "...}"
-            raise BaiduPCSError(sensitive_info_removed)
-        raise e
+    shared_paths = deque(list_shared_paths(client, shared_url))
 
     # Record the remotedir of each shared_path
     _remotedirs = {}
@@ -226,11 +307,39 @@ def save_shared(
         _remotedirs[sp] = remotedir
 
     _dir_exists = set()
+    matched: Dict[str, List[Any]] = {}
+
+    def take_sub_paths(shared_path, rd: str) -> None:
+        sub_paths = list_all_sub_paths(
+            client.api,
+            shared_path.path,
+            shared_path.uk,
+            shared_path.share_id,
+            shared_path.bdstoken,
+        )
+        rd = (Path(rd) / basename(shared_path.path)).as_posix()
+        for sp in sub_paths:
+            _remotedirs[sp] = rd
+        shared_paths.extendleft(sub_paths[::-1])
 
     while shared_paths:
         shared_path = shared_paths.popleft()
         rd = _remotedirs[shared_path]
 
+        if rules:
+            name = PurePosixPath(shared_path.path).name
+            sub_path = str(PurePosixPath(rd, name).relative_to(remotedir))
+            if shared_path.is_dir:
+                if rules.match_dir(sub_path):
+                    take_sub_paths(shared_path, rd)
+                continue
+            if not rules.match(sub_path, shared_path.size):
+                logger.info(f"{shared_path.path} not matched rules, skipping")
+                continue
+            # transferred in chunks of every remote dir below
+            matched.setdefault(rd, []).append(shared_path)
+            continue
+
         # Make sure remote dir exists
         if rd not in _dir_exists:
             if not client.api.exists(rd):
@@ -264,6 +373,8 @@ def save_shared(
                 shared_url,
             )
             logger.info(f"save: {shared_path.path} to {rd}")
+            if callback_transferred:
+                callback_transferred(shared_path, rd)
             continue
         except BaiduPCSError as err:
             if err.error_code == 12:  # 12: "文件已经存在"
@@ -287,18 +398,131 @@ def save_shared(
                 raise err
 
         if shared_path.is_dir:
-            # Take all sub paths
+            take_sub_paths(shared_path, rd)
+
+    for rd, files in matched.items():
+        if not client.api.exists(rd):
+            client.api.makedir(rd)
+            existing = set()
+        else:
+            existing = {PurePosixPath(sp.path).name for sp in client.api.list(rd)}
+        files = [f for f in files if PurePosixPath(f.path).name not in existing]
+        transfer_in_chunks(client, shared_url, rd, files, callback_transferred)
+
+
+def transfer_in_chunks(
+    client: BaiduPCSClient,
+    shared_url: str,
+    remote_dir: str,
+    shared_paths: List[Any],
+    callback_transferred: Optional[Callable] = None,
+    chunk_size: int = 100,
+) -> None:
+    """
+    Save shared files into the remote dir with one call per chunk, instead
+    of one per file. Chunks refused as a whole are saved one by one.
+    """
+    for i in range(0, len(shared_paths), chunk_size):
+        chunk = shared_paths[i : i + chunk_size]
+        first = chunk[0]
+        try:
+            client.api.transfer_shared_paths(
+                remote_dir,
+                [sp.fs_id for sp in chunk],
+                first.uk,
+                first.share_id,
+                first.bdstoken,
+                shared_url,
+            )
+        except BaiduPCSError as err:
+            # 12: "文件已经存在", -33: "一次支持操作999个，减点试试吧",
+            # 4: "share transfer pcs error", 130: "转存文件数超限"
+            if len(chunk) > 1 and err.error_code in (12, -33, 4, 130):
+                transfer_in_chunks(
+                    client,
+                    shared_url,
+                    remote_dir,
+                    chunk,
+                    callback_transferred,
+                    chunk_size=1,
+                )
+                continue
+            if err.error_code != 12:
+                raise err
+            logger.warning(f"WARNING: {first.path} has be in {remote_dir}")
+            continue
+        logger.info(f"save: {len(chunk)} files to {remote_dir}")
+        if callback_transferred:
+            for shared_path in chunk:
+                callback_transferred(shared_path, remote_dir)
+
+
+def list_shared_paths(client: BaiduPCSClient, shared_url: str) -> List[Any]:
+    try:
+        return client.api.shared_paths(shared_url)
+    except Exception as e:
+        error = str(e)
+        if "error_code: 117," in error and "'expiredType': -1," in error:
+            i = error.find(" 117,")
+            friendly_message = error[:i] + " 117, message: 该分享已过期"
+            raise BaiduPCSError(friendly_message)
+        if "error_code: 145," in error:
+            i = error.find(" 145,")
+            friendly_message = error[:i] + " 145, message: 该分享已被删除"
+            raise BaiduPCSError(friendly_message)
+        if "message: {'csrf':" in error:
+            i = error.find("{'csrf'")
+            sensitive_info_removed = error[:i] + "...}"
+            raise BaiduPCSError(sensitive_info_removed)
+        raise e
+
+
+def list_shared_files(
+    client: BaiduPCSClient,
+    shared_url: str,
+    password: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    All files of the share, with paths relative to the share, as they
+    would be saved by `save_shared`.
+    """
+    shared_url = unify_shared_link(shared_url)
+    if password:
+        access_shared(client, shared_url, password)
+
+    shared_paths = deque(
+        (PurePosixPath(sp.path).name, sp)
+        for sp in list_shared_paths(client, shared_url)
+    )
+    files = []
+    while shared_paths:
+        path, shared_path = shared_paths.popleft()
+        if shared_path.is_dir:
             sub_paths = list_all_sub_paths(
                 client.api,
                 shared_path.path,
-                uk,
-                share_id,
-                bdstoken,
+                shared_path.uk,
+                shared_path.share_id,
+                shared_path.bdstoken,
+            )
+            shared_paths.extend(
+                (f"{path}/{PurePosixPath(sp.path).name}", sp) for sp in sub_paths
             )
-            rd = (Path(rd) / basename(shared_path.path)).as_posix()
-            for sp in sub_paths:
-                _remotedirs[sp] = rd
-            shared_paths.extendleft(sub_paths[::-1])
+            continue
+        files.append(
+            dict(
+                path=path,
+                is_dir=False,
+                is_file=True,
+                size=shared_path.size,
+                md5=shared_path.md5,
+                fs_id=shared_path.fs_id,
+                uk=shared_path.uk,
+                share_id=shared_path.share_id,
+                bdstoken=shared_path.bdstoken,
+            ),
+        )
+    return files
 
 
 def list_all_sub_paths(
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import List
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Task
+from .serializers import TaskSerializer
+
+
+def get_cache_key(task_id: int, version: int, updated_at: datetime) -> str:
+    """
+    Every saved change of the task leads to a new key, so cached documents
+    never need to be deleted, they just expire.
+
+    >>> from datetime import timezone
+    >>> get_cache_key(1, 2, datetime(2023, 1, 1, tzinfo=timezone.utc))
+    'task:1:2:1672531200.0'
+    """
+    return f"task:{task_id}:{version}:{updated_at.timestamp()}"
+
+
+def get_task_documents(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Serialize tasks given by rows of id, version and updated_at, reusing
+    the cached documents of unchanged tasks.
+    """
+    keys = [get_cache_key(r["id"], r["version"], r["updated_at"]) for r in rows]
+    if settings.TASK_CACHE_SECONDS:
+        cached = cache.get_many(keys)
+    else:
+        cached = {}
+
+    fresh = {}
+    missing = [row["id"] for row, key in zip(rows, keys) if key not in cached]
+    if missing:
+        loaded = {}
+        for task in Task.objects.filter(id__in=missing):
+            fresh[task.id] = dict(TaskSerializer(task).data)
+            loaded[get_cache_key(task.id, task.version, task.updated_at)] = fresh[
+                task.id
+            ]
+        if settings.TASK_CACHE_SECONDS:
+            cache.set_many(loaded, timeout=settings.TASK_CACHE_SECONDS)
+
+    documents = []
+    for row, key in zip(rows, keys):
+        document = cached.get(key) or fresh.get(row["id"])
+        # tasks deleted in the meantime are left out
+        if document:
+            documents.append(document)
+    return documents
@@ -1,25 +1,150 @@
 import logging
+from datetime import timedelta
+from itertools import groupby
+from json import dumps
+from json import loads
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
 
 import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
 
+from .models import CallbackEvent
 from .models import Task
+from .serializers import TaskEventSerializer
 from .serializers import TaskSerializer
+from .utils import get_backoff_seconds
 from .utils import handle_exception
 
 logger = logging.getLogger(__name__)
 
 
-def callback(task: Task, action: str) -> None:
+CALLBACK_VERSION = 1
+
+# changed fields of task to be sent as delta with the callback actions
+ACTION_DELTA_FIELDS = {
+    "captcha_required": ["captcha_url"],
+    "link_saved": ["transfer_completed_at"],
+    "files_ready": ["file_listed_at"],
+    "sampling_downloaded": ["sample_downloaded_at"],
+    "files_downloaded": ["full_downloaded_at", "finished_at"],
+    "files_resynced": ["resynced_at"],
+    "resync_failed": ["message", "next_retry_at"],
+}
+
+
+def get_payload(task: Task, action: str) -> Dict[str, Any]:
+    if task.callback_full:
+        data = TaskSerializer(instance=task).data
+    else:
+        data = TaskEventSerializer(instance=task).data
+    payload = dict(version=CALLBACK_VERSION, action=action, task=data)
+    fields = ACTION_DELTA_FIELDS.get(action)
+    if fields:
+        payload["delta"] = {name: getattr(task, name) for name in fields}
+    return payload
+
+
+def callback(task: Task, action: str) -> Optional[CallbackEvent]:
+    """
+    Save the callback event to the outbox, `runcallback` will deliver it.
+    """
     url = task.callback
     if not url:
-        return
-    json = TaskSerializer(instance=task)
-    message = dict(action=action, task=json.data)
-    print(message)
-    try:
-        resp = requests.post(url, json=message)
-        resp.raise_for_status()
-        return resp
-    except Exception as exc:
-        logger.error(f"Error posting data to callback URL: {url}")
-        handle_exception(exc)
+        return None
+    return CallbackEvent.objects.create(
+        task=task,
+        url=url,
+        action=action,
+        payload=dumps(get_payload(task, action), cls=DjangoJSONEncoder),
+    )
+
+
+def get_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def post_events(session: requests.Session, events: List[CallbackEvent]) -> None:
+    messages = [loads(event.payload) for event in events]
+    if len(messages) == 1:
+        body = messages[0]
+    else:
+        body = dict(events=messages)
+    resp = session.post(
+        events[0].url,
+        json=body,
+        timeout=settings.CALLBACK_TIMEOUT_SECONDS,
+    )
+    resp.raise_for_status()
+
+
+def delivered(events: List[CallbackEvent]) -> None:
+    ids = [event.id for event in events]
+    CallbackEvent.objects.filter(id__in=ids).update(delivered_at=timezone.now())
+
+
+def delivery_failed(events: List[CallbackEvent], message: str) -> None:
+    for event in events:
+        event.attempts += 1
+        event.message = message[: CallbackEvent._meta.get_field("message").max_length]
+        if event.attempts >= settings.CALLBACK_RETRY_LIMIT:
+            event.failed = True
+        else:
+            delay = get_backoff_seconds(
+                event.attempts - 1,
+                settings.CALLBACK_BACKOFF_SECONDS,
+                settings.RETRY_BACKOFF_MAX_SECONDS,
+            )
+            event.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        event.save()
+
+
+def postpone(events: List[CallbackEvent], next_attempt_at) -> None:
+    ids = [event.id for event in events]
+    CallbackEvent.objects.filter(id__in=ids).update(next_attempt_at=next_attempt_at)
+
+
+def send_callbacks(
+    session: Optional[requests.Session] = None,
+    limit: int = 100,
+) -> int:
+    """
+    Deliver due callback events, in order of creation for every url.
+    Events to the same url are posted in batches of `CALLBACK_BATCH_SIZE`,
+    and the rest events of an url are postponed once a delivery failed.
+    Events are claimed first, so that workers never post the same ones.
+    Return the number of delivered events.
+    """
+    session = session or get_session()
+    events = CallbackEvent.claim(list(CallbackEvent.filter_due()[:limit]))
+    events.sort(key=lambda e: (e.url, e.id))
+    batch_size = max(settings.CALLBACK_BATCH_SIZE, 1)
+    total = 0
+    for url, url_events in groupby(events, key=lambda e: e.url):
+        url_events = list(url_events)
+        for i in range(0, len(url_events), batch_size):
+            batch = url_events[i : i + batch_size]
+            try:
+                post_events(session, batch)
+            except Exception as exc:
+                logger.error(f"Error posting data to callback URL: {url}")
+                delivery_failed(batch, handle_exception(exc))
+                if batch[0].failed:
+                    # release the claimed rest, they could be posted now
+                    postpone(url_events[i + batch_size :], timezone.now())
+                else:
+                    # keep the order of events to the same url
+                    postpone(url_events[i + batch_size :], batch[0].next_attempt_at)
+                break
+            delivered(batch)
+            total += len(batch)
+    return total
@@ -0,0 +1,98 @@
+import fcntl
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from .models import ContentFile
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# ioctl to share the blocks of a file, on btrfs, xfs and other CoW filesystems
+FICLONE = 0x40049409
+
+
+def reflink(source: Path, target: Path) -> None:
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_file(source: Path, target: Path) -> bool:
+    """
+    Hardlink the source file to the target, or reflink it if hardlinks
+    are not allowed, e.g. across filesystems. Return False if neither
+    works, then the file has to be copied or downloaded.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as temp_dir:
+    ...     source = Path(temp_dir) / "source"
+    ...     _ = source.write_text("hello")
+    ...     target = Path(temp_dir) / "target"
+    ...     _ = target.write_text("partial")
+    ...     link_file(source, target), target.read_text()
+    (True, 'hello')
+    """
+    temp = target.with_name(f".{target.name}.link")
+    try:
+        os.link(source, temp)
+    except OSError:
+        try:
+            reflink(source, temp)
+        except OSError:
+            temp.unlink(missing_ok=True)
+            return False
+    os.replace(temp, target)
+    return True
+
+
+class ContentIndex:
+    """
+    Files downloaded by all tasks, by md5 and size. The files of a task
+    are recorded as downloaded, and linked from others found in the index.
+    """
+
+    def __init__(self, task: Task) -> None:
+        self.task = task
+
+    def get_relative_path(self, path: Path) -> Optional[str]:
+        try:
+            return str(Path(path).relative_to(settings.DATA_DIR))
+        except ValueError:
+            return None
+
+    def find(self, md5: str, size: int, exclude: str = "") -> Optional[Path]:
+        entries = ContentFile.objects.filter(md5=md5, size=size).exclude(path=exclude)
+        for entry in entries.order_by("-id").iterator():
+            path = settings.DATA_DIR / entry.path
+            try:
+                if path.stat().st_size == size:
+                    return path
+            except FileNotFoundError:
+                pass
+            # deleted, evicted or modified since
+            entry.delete()
+        return None
+
+    def add(self, md5: str, size: int, path: Path) -> None:
+        relative_path = self.get_relative_path(path)
+        if relative_path is None:
+            return
+        ContentFile.objects.update_or_create(
+            task=self.task,
+            path=relative_path,
+            defaults=dict(md5=md5, size=size),
+        )
+
+    def link(self, md5: str, size: int, path: Path) -> bool:
+        """
+        Link a downloaded copy of the file to the path, if there is one.
+        """
+        source = self.find(md5, size, exclude=self.get_relative_path(path) or "")
+        if not source or not link_file(source, path):
+            return False
+        logger.info(f"{path} linked to the same file {source}")
+        self.add(md5, size, path)
+        return True
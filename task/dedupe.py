@@ -0,0 +1,103 @@
+import logging
+from datetime import timedelta
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .callback import callback
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# fields taken from the finished task of the same share
+COPIED_FIELDS = (
+    "files",
+    "total_files",
+    "total_size",
+    "largest_file",
+    "largest_file_size",
+)
+
+# stages of the duplicate are all completed at once, so that its durations
+# are not mixed with the timestamps of the original
+COMPLETED_FIELDS = (
+    "transfer_completed_at",
+    "file_listed_at",
+    "sample_downloaded_at",
+    "full_downloaded_at",
+    "finished_at",
+)
+
+
+def filter_originals() -> QuerySet:
+    """
+    Fully downloaded tasks, whose local files are still kept.
+    Duplicates are left out, their files are as old as the originals.
+    """
+    tasks = Task.objects.filter(
+        status=Task.Status.FINISHED,
+        failed=False,
+        full_downloaded_at__isnull=False,
+        local_evicted_at__isnull=True,
+        duplicate_of__isnull=True,
+    )
+    if settings.DEDUPE_MAX_AGE_DAYS:
+        downloaded_after = timezone.now() - timedelta(days=settings.DEDUPE_MAX_AGE_DAYS)
+        tasks = tasks.filter(full_downloaded_at__gte=downloaded_after)
+    return tasks.order_by("-full_downloaded_at")
+
+
+def get_originals(tasks: Iterable[Task]) -> Dict[str, Task]:
+    """
+    The latest finished task of the same share of every task, by path.
+    Tasks of the same path share the same local files.
+    """
+    paths = {task.path: task for task in tasks}
+    shared_ids = {task.shared_id for task in paths.values()}
+    originals: Dict[str, Task] = {}
+    for original in filter_originals().filter(shared_id__in=shared_ids).iterator():
+        if original.path in paths and original.path not in originals:
+            if is_fresh(original):
+                originals[original.path] = original
+    return originals
+
+
+def is_fresh(original: Task) -> bool:
+    """
+    A cheap check that the files are still there, without asking baidu.
+    """
+    return original.data_path.exists()
+
+
+def fast_forward(task: Task, original: Task) -> None:
+    """
+    Finish the task with the manifest of the original one, without saving.
+    """
+    for name in COPIED_FIELDS:
+        setattr(task, name, getattr(original, name))
+    now = timezone.now()
+    task.status = Task.Status.FINISHED
+    task.full_download_now = True
+    task.started_at = task.started_at or now
+    for name in COMPLETED_FIELDS:
+        setattr(task, name, now)
+    task.duplicate_of_id = original.duplicate_of_id or original.id
+
+
+def dedupe(task: Task) -> Optional[Task]:
+    """
+    Fast-forward the saved task to finished, if the same share has been
+    downloaded. Return the original task.
+    """
+    original = get_originals([task]).get(task.path)
+    if not original or original.pk == task.pk:
+        return None
+    fast_forward(task, original)
+    task.save()
+    logger.info(f"{task} fast-forwarded from {original}")
+    callback(task, "files_downloaded")
+    return original
@@ -0,0 +1,206 @@
+import logging
+import shutil
+from pathlib import Path
+from threading import Event
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ContentFile
+from .models import Task
+from .utils import RateLimiter
+from .utils import remove_tree
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientDiskSpace(Exception):
+    pass
+
+
+def get_existing_path(path: Path) -> Path:
+    """
+    The path, or its nearest existing parent, to get the disk usage of.
+
+    >>> get_existing_path(Path("/not/exists/at/all"))
+    PosixPath('/')
+    """
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def get_free_space() -> int:
+    usage = shutil.disk_usage(get_existing_path(settings.DATA_DIR))
+    return usage.free - settings.DISK_RESERVED_SIZE
+
+
+def get_capacity() -> int:
+    usage = shutil.disk_usage(get_existing_path(settings.DATA_DIR))
+    capacity = usage.total - settings.DISK_RESERVED_SIZE
+    if settings.DATA_DIR_QUOTA:
+        capacity = min(capacity, settings.DATA_DIR_QUOTA)
+    return capacity
+
+
+def get_reserved_size(exclude: Optional[Task] = None) -> int:
+    """
+    Bytes still to be downloaded by the tasks being leeched now, which
+    the free space has not taken into account yet.
+    """
+    tasks = Task.objects.filter(
+        Task.q_leased(),
+        status=Task.Status.SAMPLING_DOWNLOADED,
+        full_download_now=True,
+    )
+    if exclude:
+        tasks = tasks.exclude(pk=exclude.pk)
+    size = tasks.aggregate(size=Sum(F("total_size") - F("progress_size")))["size"]
+    return max(size or 0, 0)
+
+
+def filter_sharing() -> QuerySet:
+    """
+    Tasks of the same share as the task of the outer query, which use the
+    same local directory, e.g. duplicates.
+    """
+    return Task.objects.filter(
+        shared_id=OuterRef("shared_id"),
+        shared_password=OuterRef("shared_password"),
+    )
+
+
+def get_linked_size(tasks: QuerySet) -> int:
+    """
+    Bytes of files hardlinked to the same content by the content index,
+    which are counted by every task but stored once.
+    """
+    same_content = ContentFile.objects.filter(
+        task__in=tasks,
+        md5=OuterRef("md5"),
+        size=OuterRef("size"),
+    ).exclude(pk=OuterRef("pk"))
+    entries = ContentFile.objects.filter(Exists(same_content), task__in=tasks)
+    counted = 0
+    stored = {}
+    for path, size in entries.values_list("path", "size").iterator():
+        try:
+            stat = (settings.DATA_DIR / path).stat()
+        except FileNotFoundError:
+            continue
+        counted += size
+        stored[(stat.st_dev, stat.st_ino)] = size
+    return counted - sum(stored.values())
+
+
+def get_local_size() -> int:
+    """
+    Bytes of the fully downloaded tasks, which are counted by the quota.
+    A directory shared by tasks of the same share is counted once.
+    """
+    tasks = Task.objects.filter(
+        status=Task.Status.FINISHED,
+        full_downloaded_at__isnull=False,
+        local_evicted_at__isnull=True,
+    )
+    dirs = tasks.values("shared_id", "shared_password").annotate(
+        dir_size=Max("total_size"),
+    )
+    size = dirs.aggregate(size=Sum("dir_size"))["size"] or 0
+    return size - get_linked_size(tasks)
+
+
+def get_shortage(task: Task) -> int:
+    """
+    Bytes to be freed before the task fits in the disk and the quota.
+    """
+    reserved = get_reserved_size(exclude=task)
+    shortage = task.total_size + reserved - get_free_space()
+    if settings.DATA_DIR_QUOTA:
+        used = get_local_size() + reserved
+        shortage = max(shortage, used + task.total_size - settings.DATA_DIR_QUOTA)
+    return max(shortage, 0)
+
+
+def check_capacity(task: Task) -> None:
+    capacity = get_capacity()
+    if task.total_size > capacity:
+        raise InsufficientDiskSpace(
+            f"larger than the disk: {task.total_size} bytes to download, "
+            f"{capacity} bytes of capacity",
+        )
+
+
+def filter_evictable() -> QuerySet:
+    """
+    Fully downloaded tasks with local files, least recently accessed first.
+    A directory shared by tasks of the same share is as recent as the last
+    accessed of them, and kept while any of them is being processed.
+    """
+    tasks = Task.objects.filter(
+        status=Task.Status.FINISHED,
+        failed=False,
+        full_downloaded_at__isnull=False,
+        local_evicted_at__isnull=True,
+    )
+    last_used = (
+        filter_sharing()
+        .values("shared_id")
+        .annotate(last_used=Max(Coalesce("accessed_at", "full_downloaded_at")))
+        .values("last_used")
+    )
+    tasks = tasks.exclude(Exists(filter_sharing().filter(Task.q_leased())))
+    return tasks.order_by(Subquery(last_used).asc(), "id")
+
+
+def evict_local_files(task: Task, limiter: RateLimiter) -> None:
+    """
+    Delete the local directory of the task, and mark all the tasks sharing
+    it as evicted.
+    """
+    if task.data_path.exists():
+        remove_tree(task.data_path, limiter, Event())
+    sharing = Task.objects.filter(
+        shared_id=task.shared_id,
+        shared_password=task.shared_password,
+        local_evicted_at__isnull=True,
+    )
+    Task.bulk_update(sharing, local_evicted_at=timezone.now())
+    logger.info(f"local files of {task} evicted.")
+
+
+def admit(task: Task) -> bool:
+    """
+    Whether there is room for the files of the task, evicting local files
+    of other tasks if DATA_DIR_QUOTA is set. Tasks that do not fit wait
+    for the next round, and fail if they could never fit.
+    """
+    check_capacity(task)
+    shortage = get_shortage(task)
+    if shortage and settings.DATA_DIR_QUOTA:
+        limiter = RateLimiter(settings.PURGE_FILES_PER_SECOND)
+        evictable = filter_evictable().exclude(
+            shared_id=task.shared_id,
+            shared_password=task.shared_password,
+        )
+        evicted = set()
+        for other in evictable.only("id", "shared_id", "shared_password").iterator():
+            if other.path in evicted:
+                continue
+            evict_local_files(other, limiter)
+            evicted.add(other.path)
+            shortage = get_shortage(task)
+            if not shortage:
+                break
+    if shortage:
+        logger.info(f"{task} waits for {shortage} bytes of disk space.")
+    return not shortage
@@ -0,0 +1,89 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+from django.conf import settings
+
+THROTTLED = "throttled"
+NETWORK = "network"
+NOT_FOUND = "not_found"
+INVALID_PARAMS = "invalid_params"
+SHARE_REMOVED = "share_removed"
+SHARE_EXPIRED = "share_expired"
+WRONG_PASSWORD = "wrong_password"
+DISK_FULL = "disk_full"
+UNKNOWN = "unknown"
+
+# (regex, error class, recoverable), the first matched rule wins
+ERROR_RULES = [
+    (r"error_code: -65,|操作过于频繁，请您稍后重试", THROTTLED, True),
+    (
+        r"Remote end closed connection without response"
+        r"|urlopen error \[Errno 104\] Connection reset by peer"
+        r"|urlopen error \[Errno 99\] Cannot assign requested address"
+        r"|ConnectionResetError\(104, 'Connection reset",
+        NETWORK,
+        True,
+    ),
+    (r"^BaiduPCS\._request$", NETWORK, True),
+    (r"error_code: 105,|啊哦，链接错误没找到文件，请打开正确的分享链接", NOT_FOUND, False),
+    (r"error_code: 31066,|message: 文件不存在", NOT_FOUND, False),
+    (r"error_code: 2,|message: 参数错误", INVALID_PARAMS, False),
+    (r"error_code: -7,|message: 该分享已删除或已取消", SHARE_REMOVED, False),
+    (r"error_code: 145,|message: 该分享已被删除", SHARE_REMOVED, False),
+    (r"error_code: -12,|message: 访问密码错误", WRONG_PASSWORD, False),
+    (r"error_code: 117,|message: 该分享已过期", SHARE_EXPIRED, False),
+    (r"\[Errno 28\] No space left on device", DISK_FULL, True),
+    (r"^larger than the disk: ", DISK_FULL, False),
+]
+
+ERROR_CODE_RE = re.compile(r"error_code: (-?\d+),")
+
+
+class Error(NamedTuple):
+    code: Optional[int]
+    error_class: str
+    recoverable: bool
+
+
+@lru_cache(maxsize=8)
+def compile_rules(
+    extra_rules: Tuple[Tuple[str, str, bool], ...],
+) -> Sequence[Tuple[Pattern, str, bool]]:
+    rules = list(extra_rules) + ERROR_RULES
+    return [(re.compile(regex), name, bool(ok)) for regex, name, ok in rules]
+
+
+def classify_error(message: str) -> Error:
+    """
+    Classify an error message by the rules in `ERROR_RULES`, and the rules
+    configured by `settings.ERROR_RULES`, which are checked first.
+
+    Examples:
+        >>> classify_error("error_code: -65, message: 操作过于频繁，请您稍后重试")
+        Error(code=-65, error_class='throttled', recoverable=True)
+        >>> classify_error("BaiduPCS._request")
+        Error(code=None, error_class='network', recoverable=True)
+        >>> classify_error("error_code: 105, message: 啊哦，链接错误没找到文件")
+        Error(code=105, error_class='not_found', recoverable=False)
+        >>> classify_error("unknown error")
+        Error(code=None, error_class='unknown', recoverable=False)
+    """
+    extra_rules = tuple(tuple(rule) for rule in settings.ERROR_RULES)
+    match = ERROR_CODE_RE.search(message)
+    code = int(match.group(1)) if match else None
+    for pattern, error_class, recoverable in compile_rules(extra_rules):
+        if pattern.search(message):
+            return Error(code, error_class, recoverable)
+    # assume task is not recoverable by default to avoid flood requests
+    return Error(code, UNKNOWN, False)
+
+
+def get_retry_base_seconds(error_class: str) -> int:
+    if error_class == THROTTLED:
+        return settings.RETRY_THROTTLED_BACKOFF_SECONDS
+    return settings.RETRY_BACKOFF_SECONDS
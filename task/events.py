@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+from json import dumps
+from time import monotonic
+from typing import Any
+from typing import AsyncGenerator
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Task
+from .serializers import TaskEventSerializer
+
+KEEP_ALIVE_SECONDS = 15
+BATCH_SIZE = 100
+
+# (updated_at, id) of the last sent task, tasks are streamed in this order
+Cursor = Tuple[datetime, int]
+
+
+def format_cursor(cursor: Cursor) -> str:
+    """
+    >>> from datetime import timezone
+    >>> format_cursor((datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc), 12))
+    '2023-01-02T03:04:05+00:00,12'
+    """
+    updated_at, task_id = cursor
+    return f"{updated_at.isoformat()},{task_id}"
+
+
+def parse_cursor(value: str) -> Optional[Cursor]:
+    """
+    >>> parse_cursor('2023-01-02T03:04:05+00:00,12')
+    (datetime.datetime(2023, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc), 12)
+    >>> parse_cursor('invalid') is None
+    True
+    """
+    updated_at, _, task_id = value.rpartition(",")
+    try:
+        updated_at = parse_datetime(updated_at)
+        task_id = int(task_id)
+    except ValueError:
+        return None
+    if not updated_at:
+        return None
+    return updated_at, task_id
+
+
+def format_event(data: Dict[str, Any], event_id: str, event: str = "task") -> str:
+    """
+    >>> print(format_event({"id": 1}, "abc"), end="")
+    id: abc
+    event: task
+    data: {"id": 1}
+    <BLANKLINE>
+    """
+    data = dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+def get_delta(
+    previous: Optional[Dict[str, Any]],
+    current: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    >>> get_delta({"id": 1, "a": 1, "b": 2}, {"id": 1, "a": 1, "b": 3})
+    {'id': 1, 'b': 3}
+    >>> get_delta({"id": 1, "a": 1}, {"id": 1, "a": 1})
+    {}
+    """
+    if previous is None:
+        return current
+    delta = {k: v for k, v in current.items() if previous.get(k) != v}
+    if not delta:
+        return {}
+    return dict(id=current["id"], **delta)
+
+
+def get_changed_tasks(
+    ids: List[int],
+    cursor: Optional[Cursor],
+) -> List[Tuple[Cursor, Dict[str, Any]]]:
+    tasks = Task.objects.order_by("updated_at", "id")
+    if ids:
+        tasks = tasks.filter(id__in=ids)
+    if cursor:
+        updated_at, task_id = cursor
+        tasks = tasks.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=task_id),
+        )
+    return [
+        ((task.updated_at, task.id), dict(TaskEventSerializer(task).data))
+        for task in tasks[:BATCH_SIZE]
+    ]
+
+
+async def stream_task_events(
+    ids: List[int],
+    cursor: Optional[Cursor],
+    timeout: float,
+    once: bool = False,
+) -> AsyncGenerator[str, None]:
+    """
+    Poll changed tasks and push the changed fields of each task, until
+    timeout, or the first events are sent if `once` is set (long polling).
+    """
+    sent: Dict[int, Dict[str, Any]] = {}
+    deadline = monotonic() + timeout
+    last_sent_at = monotonic()
+    while True:
+        changes = await sync_to_async(get_changed_tasks)(ids, cursor)
+        for cursor, data in changes:
+            delta = get_delta(sent.get(data["id"]), data)
+            sent[data["id"]] = data
+            if delta:
+                yield format_event(delta, format_cursor(cursor))
+                last_sent_at = monotonic()
+        if len(changes) == BATCH_SIZE:
+            continue
+        if (once and sent) or monotonic() >= deadline:
+            return
+        if monotonic() - last_sent_at >= KEEP_ALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent_at = monotonic()
+        await asyncio.sleep(settings.TASK_EVENTS_POLL_SECONDS)
@@ -0,0 +1,154 @@
+import re
+import zlib
+from fnmatch import translate
+from itertools import islice
+from json import dumps
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+
+from asgiref.sync import sync_to_async
+
+
+def match_prefix(path: str, prefix: str, recursive: bool = True) -> bool:
+    """
+    Whether the path is the prefix directory itself, or inside it.
+
+    >>> match_prefix("dir1/my.doc", "dir1")
+    True
+    >>> match_prefix("dir10/my.doc", "dir1")
+    False
+    >>> match_prefix("dir1/sub/my.doc", "dir1/", recursive=False)
+    False
+    >>> match_prefix("my.doc", "", recursive=False)
+    True
+    """
+    prefix = prefix.strip("/")
+    if prefix:
+        if path == prefix:
+            return True
+        if not path.startswith(prefix + "/"):
+            return False
+        path = path[len(prefix) + 1 :]
+    return recursive or "/" not in path
+
+
+def filter_files(
+    files: Iterable[Dict[str, Any]],
+    key: str = "path",
+    prefix: str = "",
+    recursive: bool = True,
+    glob: str = "",
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    >>> files = [
+    ...     {"path": "a", "size": 0},
+    ...     {"path": "a/b.mp3", "size": 10},
+    ...     {"path": "a/c.txt", "size": 20},
+    ...     {"path": "d.mp3", "size": 30},
+    ... ]
+    >>> [f["path"] for f in filter_files(files, prefix="a/", glob="*.mp3")]
+    ['a/b.mp3']
+    >>> [f["path"] for f in filter_files(files, min_size=15, max_size=30)]
+    ['a/c.txt', 'd.mp3']
+    """
+    pattern = re.compile(translate(glob)) if glob else None
+    for file in files:
+        path = file[key]
+        if (prefix or not recursive) and not match_prefix(path, prefix, recursive):
+            continue
+        if pattern and not pattern.match(path):
+            continue
+        if min_size is not None and file["size"] < min_size:
+            continue
+        if max_size is not None and file["size"] > max_size:
+            continue
+        yield file
+
+
+def select_fields(
+    files: Iterable[Dict[str, Any]],
+    fields: Sequence[str],
+) -> Iterator[Dict[str, Any]]:
+    """
+    >>> list(select_fields([{"path": "a", "size": 0, "md5": None}], ["path"]))
+    [{'path': 'a'}]
+    """
+    if not fields:
+        yield from files
+        return
+    for file in files:
+        yield {k: file[k] for k in fields if k in file}
+
+
+def paginate(
+    files: Iterable[Dict[str, Any]],
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    >>> list(paginate(range(10), 2, 3))
+    [2, 3, 4]
+    """
+    stop = offset + limit if limit is not None else None
+    return islice(files, offset, stop)
+
+
+def to_ndjson(files: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    >>> list(to_ndjson([{"path": "张楚"}]))
+    [b'{"path": "\\xe5\\xbc\\xa0\\xe6\\xa5\\x9a"}\\n']
+    """
+    for file in files:
+        yield (dumps(file, ensure_ascii=False) + "\n").encode()
+
+
+def gzip_stream(chunks: Iterable[bytes], batch_size: int = 65536) -> Iterator[bytes]:
+    """
+    Compress chunks on the fly, flushing about every `batch_size` bytes.
+
+    >>> import gzip
+    >>> gzip.decompress(b"".join(gzip_stream([b"hello ", b"world"])))
+    b'hello world'
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= batch_size:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def iterate_in_thread(
+    chunks: Iterable[bytes],
+    batch_size: int = 100,
+) -> AsyncIterator[bytes]:
+    """
+    Serve chunks of a sync iterator to an ASGI server a few at a time,
+    instead of being collected all at once by Django.
+
+    >>> import asyncio
+    >>> async def collect():
+    ...     return [c async for c in iterate_in_thread(iter([b"a", b"b", b"c"]), 2)]
+    >>> asyncio.run(collect())
+    [b'a', b'b', b'c']
+    """
+    iterator = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch_size)))
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        for chunk in batch:
+            yield chunk
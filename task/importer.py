@@ -0,0 +1,187 @@
+from itertools import islice
+from json import loads
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Union
+
+from .callback import callback
+from .dedupe import fast_forward
+from .dedupe import get_originals
+from .models import Task
+from .serializers import TaskSerializer
+
+BATCH_SIZE = 500
+
+# fields could be set for every imported link
+IMPORT_FIELDS = (
+    "shared_link",
+    "shared_password",
+    "full_download_now",
+    "priority",
+    "callback",
+    "callback_full",
+)
+
+
+class InvalidLine(NamedTuple):
+    """A line failed to parse, reported as an invalid item."""
+
+    error: str
+
+
+def parse_lines(
+    lines: Iterable[str],
+) -> Generator[Union[str, Dict, InvalidLine], None, None]:
+    """
+    Parse NDJSON or plain text, or a mix of them: one json object, or
+    one link optionally followed by the password per line.
+
+    >>> list(parse_lines(['{"shared_link": "a"}', '', '# comment', 'b pwd']))
+    [{'shared_link': 'a'}, {'shared_link': 'b', 'shared_password': 'pwd'}]
+    >>> invalid, item = parse_lines(['{"shared_link": "a"', 'b'])
+    >>> invalid.error.startswith("invalid json"), item
+    (True, {'shared_link': 'b'})
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                yield loads(line)
+            except ValueError as e:
+                yield InvalidLine(f"invalid json: {e}")
+            continue
+        link, *password = line.split()
+        item = dict(shared_link=link)
+        if password:
+            item["shared_password"] = password[0]
+        yield item
+
+
+def parse_links(content: str) -> Iterable[Union[str, Dict]]:
+    """
+    >>> list(parse_links('["a", {"shared_link": "b"}]'))
+    ['a', {'shared_link': 'b'}]
+    >>> list(parse_links('a\\nb'))
+    [{'shared_link': 'a'}, {'shared_link': 'b'}]
+    """
+    if content.lstrip().startswith("["):
+        return loads(content)
+    return parse_lines(content.splitlines())
+
+
+def format_errors(errors: Dict[str, Any]) -> str:
+    """
+    >>> format_errors({"priority": ["A valid integer is required."]})
+    'priority: A valid integer is required.'
+    """
+    return "; ".join(
+        f"{field}: {' '.join(str(error) for error in field_errors)}"
+        for field, field_errors in errors.items()
+    )
+
+
+def build_task(item: Union[str, Dict[str, Any], InvalidLine]) -> Task:
+    if isinstance(item, InvalidLine):
+        raise ValueError(item.error)
+    if isinstance(item, str):
+        item = dict(shared_link=item)
+    if not isinstance(item, dict):
+        raise ValueError(f"invalid item: {item}")
+    unknown = set(item) - set(IMPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    # validate fields the same way as creating a task by the api
+    serializer = TaskSerializer(data=item)
+    if not serializer.is_valid():
+        raise ValueError(format_errors(serializer.errors))
+    data = dict(serializer.validated_data)
+    data.pop("dedupe", None)
+    return Task(**data)
+
+
+def get_exist_shared_ids(shared_ids: Iterable[str]) -> set:
+    tasks = Task.objects.filter(shared_id__in=set(shared_ids))
+    return set(tasks.values_list("shared_id", flat=True))
+
+
+def import_batch(
+    items: List[Union[str, Dict[str, Any]]],
+    start: int = 0,
+    skip_duplicates: bool = True,
+    dedupe: bool = False,
+) -> List[Dict[str, Any]]:
+    results = []
+    tasks = []
+    for index, item in enumerate(items, start):
+        try:
+            task = build_task(item)
+        except (ValueError, TypeError) as e:
+            results.append(dict(index=index, status="invalid", error=str(e)))
+            continue
+        result = dict(index=index, status="created", shared_id=task.shared_id)
+        results.append(result)
+        tasks.append((result, task))
+
+    originals = get_originals(task for _, task in tasks) if dedupe else {}
+    if skip_duplicates:
+        # shares already downloaded are kept, to be finished at once
+        seen = get_exist_shared_ids(
+            task.shared_id for _, task in tasks if task.path not in originals
+        )
+        unique = []
+        for result, task in tasks:
+            if task.shared_id in seen:
+                result["status"] = "duplicate"
+                continue
+            seen.add(task.shared_id)
+            unique.append((result, task))
+        tasks = unique
+
+    for result, task in tasks:
+        if task.path in originals:
+            fast_forward(task, originals[task.path])
+
+    Task.objects.bulk_create([task for _, task in tasks])
+    for result, task in tasks:
+        result["id"] = task.id
+        if task.duplicate_of_id:
+            result["duplicate_of"] = task.duplicate_of_id
+            callback(task, "files_downloaded")
+    return results
+
+
+def import_links(
+    items: Iterable[Union[str, Dict[str, Any]]],
+    skip_duplicates: bool = True,
+    batch_size: int = BATCH_SIZE,
+    dedupe: bool = False,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Validate and create tasks in batches, skip links whose shared_id is
+    already exists by default. Yield the result of every item in order.
+    With `dedupe`, tasks of shares already downloaded are created even
+    if skipping duplicates, and finished at once.
+    """
+    items = iter(items)
+    start = 0
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield from import_batch(batch, start, skip_duplicates, dedupe)
+        start += len(batch)
+
+
+def summarize(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    summary = dict(created=0, duplicate=0, invalid=0, results=[])
+    for result in results:
+        summary[result["status"]] += 1
+        summary["results"].append(result)
+    return summary
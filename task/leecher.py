@@ -1,21 +1,66 @@
 import logging
+from contextlib import contextmanager
+from pathlib import PurePosixPath
+from threading import Event
+from threading import Thread
+from typing import Generator
 
 from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 
 from .baidupcs import BaiduPCSClient
 from .baidupcs import CaptchaRequired
 from .callback import callback
+from .content import ContentIndex
+from .disk import admit
+from .disk import InsufficientDiskSpace
 from .models import Task
 from .utils import handle_exception
 
 logger = logging.getLogger(__name__)
 
 
+def keep_heartbeat(task: Task, stopped: Event) -> None:
+    """
+    Beat every HEARTBEAT_INTERVAL_SECONDS until stopped, as long calls,
+    e.g. transferring a huge share, make no progress to beat with.
+    """
+    try:
+        while not stopped.wait(settings.HEARTBEAT_INTERVAL_SECONDS):
+            task.heartbeat(force=True)
+    finally:
+        # every thread has its own connection
+        connection.close()
+
+
+@contextmanager
+def lease(task: Task) -> Generator[None, None, None]:
+    """
+    Keep heartbeats on the task while it is being processed, so that a task
+    abandoned by a dead worker can be found and returned to its stage.
+    """
+    if getattr(task, "_leased", False):
+        yield
+        return
+    task._leased = True
+    task.heartbeat(force=True)
+    stopped = Event()
+    beater = Thread(target=keep_heartbeat, args=(task, stopped), daemon=True)
+    beater.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        beater.join()
+        task._leased = False
+        task.release()
+
+
 def start_task(task: Task) -> None:
     task.status = Task.Status.STARTED
     task.started_at = timezone.now()
-    task.save()
+    task.save(update_fields=["status", "started_at"])
 
 
 def save_link(client: "BaiduPCSClient", task: Task) -> None:
@@ -24,9 +69,21 @@ def save_link(client: "BaiduPCSClient", task: Task) -> None:
         task.captcha = content
         task.captcha_id = captcha_id
         task.captcha_url = captcha_img_url
-        task.save()
+        task.save(
+            update_fields=["captcha_required", "captcha", "captcha_id", "captcha_url"],
+        )
         callback(task, "captcha_required")
 
+    if settings.PIPELINE_STAGES:
+        download_sample = sample_transferred(client, task)
+    else:
+        download_sample = None
+
+    def callback_transferred(shared_path, remote_dir):
+        task.heartbeat()
+        if download_sample:
+            download_sample(shared_path, remote_dir)
+
     if (settings.TRANSFER_POLICY == "if_not_present") and client.list_files(
         task.remote_path,
         retry=0,
@@ -41,43 +98,87 @@ def save_link(client: "BaiduPCSClient", task: Task) -> None:
             callback_save_captcha=save_captcha,
             captcha_id=task.captcha_id or "",
             captcha_code=task.captcha_code or "",
+            callback_transferred=callback_transferred,
+            rules=task.get_rules(),
         )
     task.transfer_completed_at = timezone.now()
-    task.save()
+    task.save(update_fields=["transfer_completed_at"])
     logger.info(f"save {task} succeeded.")
     callback(task, "link_saved")
 
 
+def sample_transferred(client: "BaiduPCSClient", task: Task):
+    """
+    Return a callback that downloads samples of every shared path as soon
+    as it has been saved, while the rest of the share is still being saved.
+    """
+
+    def download_sample(shared_path, remote_dir: str) -> None:
+        name = PurePosixPath(shared_path.path).name
+        remote_path = str(PurePosixPath(remote_dir) / name)
+        sub_path = remote_path[len(task.remote_path) :].lstrip("/")
+        local_path = task.sample_data_path / sub_path
+        try:
+            if shared_path.is_dir:
+                client.leech(
+                    remote_dir=remote_path,
+                    local_dir=local_path,
+                    sample_size=settings.SAMPLE_SIZE,
+                )
+            else:
+                client.download_file(
+                    remote_path,
+                    local_path.parent,
+                    shared_path.size,
+                    sample_size=settings.SAMPLE_SIZE,
+                )
+        except Exception as e:
+            # the sampling stage will download it again later
+            logger.error(f"early sampling of {remote_path} failed.")
+            handle_exception(e)
+
+    return download_sample
+
+
 def set_files(client: "BaiduPCSClient", task: Task) -> None:
     task.set_files(list(client.list_files(task.remote_path)))
     task.file_listed_at = timezone.now()
-    task.save()
+    task.save(update_fields=[*Task.FILES_FIELDS, "file_listed_at"])
     logger.info(f"list {task} files succeeded.")
     callback(task, "files_ready")
 
 
 def download_samples(client: "BaiduPCSClient", task: Task) -> None:
     logger.info("downloading samples...")
+    task.reset_progress()
     client.leech(
         remote_dir=task.remote_path,
         local_dir=settings.DATA_DIR / task.sample_path,
         sample_size=settings.SAMPLE_SIZE,
+        callback_progress=task.add_progress,
+        rules=task.get_rules(),
     )
     task.sample_downloaded_at = timezone.now()
-    task.save()
+    task.save(update_fields=["sample_downloaded_at"])
     logger.info(f"sample of {task} downloaded.")
     callback(task, "sampling_downloaded")
 
 
 def download(client: "BaiduPCSClient", task: Task) -> None:
     logger.info("downloading...")
+    task.reset_progress()
     client.leech(
         remote_dir=task.remote_path,
         local_dir=task.data_path,
         sample_size=0,
+        callback_progress=task.add_progress,
+        content_index=ContentIndex(task) if settings.DEDUPE_FILES else None,
+        rules=task.get_rules(),
     )
     task.full_downloaded_at = timezone.now()
-    task.save()
+    # files evicted before are all present again
+    task.local_evicted_at = None
+    task.save(update_fields=["full_downloaded_at", "local_evicted_at"])
     logger.info(f"leech {task} succeeded.")
 
 
@@ -85,65 +186,129 @@ def task_failed(task: Task, message: str) -> None:
     task.status = Task.Status.FINISHED
     task.finished_at = timezone.now()
     task.failed = True
-    task.message = message[: Task._meta.get_field("message").max_length]
-    task.save()
+    task.set_error(message)
+    task.next_retry_at = task.get_next_retry_at()
+    task.save(
+        update_fields=[
+            "status",
+            "finished_at",
+            "failed",
+            *Task.ERROR_FIELDS,
+            "next_retry_at",
+        ],
+    )
 
 
 def finish_transfer(task: Task) -> None:
     task.status = Task.Status.TRANSFERRED
-    task.save()
+    task.save(update_fields=["status"])
 
 
 def transfer(client: "BaiduPCSClient", task: Task) -> None:
     logger.info(f"start transfer {task} ...")
-    start_task(task)
+    with lease(task):
+        start_task(task)
 
-    try:
-        save_link(client, task)
-        set_files(client, task)
-        finish_transfer(task)
-        logger.info(f"transfer {task} succeed.")
-    except CaptchaRequired:
-        logging.info(f"captcha required: {task}")
-    except Exception as e:
-        logging.error(f"transfer {task} failed.")
-        task_failed(task, handle_exception(e))
+        try:
+            save_link(client, task)
+            set_files(client, task)
+            finish_transfer(task)
+            logger.info(f"transfer {task} succeed.")
+        except CaptchaRequired:
+            logging.info(f"captcha required: {task}")
+        except Exception as e:
+            logging.error(f"transfer {task} failed.")
+            task_failed(task, handle_exception(e))
 
 
 def finish_sampling(task: Task) -> None:
     task.status = Task.Status.SAMPLING_DOWNLOADED
-    task.save()
+    # counts the bytes of full files from now on
+    task.progress_size = 0
+    task.save(update_fields=["status", "progress_size"])
 
 
 def sampling(client: "BaiduPCSClient", task: Task) -> None:
     logger.info(f"start download sampling of {task}")
-
-    try:
-        download_samples(client, task)
-    except Exception as e:
-        logging.error(f"download sampling of {task} failed.")
-        task_failed(task, handle_exception(e))
-
-    finish_sampling(task)
+    with lease(task):
+        try:
+            download_samples(client, task)
+        except Exception as e:
+            logging.error(f"download sampling of {task} failed.")
+            task_failed(task, handle_exception(e))
+
+        finish_sampling(task)
     logger.info(f"download sampling of {task} succeed.")
 
 
 def finish_task(task: Task) -> None:
     task.status = Task.Status.FINISHED
     task.finished_at = timezone.now()
-    task.save()
+    task.save(update_fields=["status", "finished_at"])
 
 
 def leech(client: "BaiduPCSClient", task: Task) -> None:
-    logger.info(f"start leech {task} to {task.data_path}")
-
     try:
-        download(client, task)
-    except Exception as e:
-        logging.error(f"download all files of {task} failed.")
+        if not admit(task):
+            # wait in the queue until there is room for the files
+            return
+    except InsufficientDiskSpace as e:
+        logging.error(f"{task} does not fit in the disk.")
         task_failed(task, handle_exception(e))
         return
 
-    finish_task(task)
+    logger.info(f"start leech {task} to {task.data_path}")
+    with lease(task):
+        try:
+            download(client, task)
+        except Exception as e:
+            logging.error(f"download all files of {task} failed.")
+            task_failed(task, handle_exception(e))
+            return
+
+        finish_task(task)
     callback(task, "files_downloaded")
     logger.info(f"leech {task} to {task.data_path} succeed.")
+
+
+def pipeline(client: "BaiduPCSClient", task: Task) -> None:
+    """
+    Run the remaining stages of a task one after another in this worker,
+    instead of waiting for the next poll of each stage runner.
+    """
+    with lease(task):
+        _pipeline(client, task)
+
+
+def _pipeline(client: "BaiduPCSClient", task: Task) -> None:
+    if task.status == Task.Status.INITED:
+        transfer(client, task)
+    if task.failed:
+        return
+
+    if task.status == Task.Status.TRANSFERRED:
+        sampling(client, task)
+    if task.failed:
+        return
+
+    # full_download_now may be permitted while sampling, stages above never
+    # save it, so the permit given by the api is read here
+    task.refresh_from_db(fields=["full_download_now"])
+    if task.status == Task.Status.SAMPLING_DOWNLOADED and task.full_download_now:
+        leech(client, task)
+
+
+def run_stage(client: "BaiduPCSClient", task: Task, stage) -> bool:
+    """
+    Run the stage of the task selected by a runner, unless another worker
+    has taken it since. Return whether it has been run.
+    """
+    if not task.claim():
+        logger.info(f"{task} has been taken by another worker, skipped.")
+        return False
+    with lease(task):
+        if settings.PIPELINE_STAGES:
+            pipeline(client, task)
+        else:
+            stage(client, task)
+    return True
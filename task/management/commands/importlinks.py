@@ -0,0 +1,71 @@
+import sys
+from argparse import BooleanOptionalAction
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task.importer import import_links
+from task.importer import parse_lines
+from task.importer import parse_links
+
+
+class Command(BaseCommand):
+    help = "create tasks from a JSON array, NDJSON or plain text of links."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file",
+            nargs="?",
+            default="-",
+            help="file to import, read from stdin by default.",
+        )
+        parser.add_argument(
+            "--allow-duplicates",
+            action="store_true",
+            help="create tasks even if the shared_id already exists.",
+        )
+        parser.add_argument(
+            "--dedupe",
+            action=BooleanOptionalAction,
+            default=settings.DEDUPE_TASKS,
+            help="finish created tasks at once if the same share has been downloaded.",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"] == "-":
+            stream = sys.stdin
+        else:
+            stream = open(options["file"], encoding="utf-8")
+
+        with stream:
+            first = stream.readline()
+            if first.lstrip().startswith("["):
+                items = parse_links(first + stream.read())
+            else:
+                # read lines lazily, tasks are created batch by batch
+                items = parse_lines(self.chain(first, stream))
+            counts = dict(created=0, duplicate=0, invalid=0)
+            results = import_links(
+                items,
+                skip_duplicates=not options["allow_duplicates"],
+                dedupe=options["dedupe"],
+            )
+            for result in results:
+                counts[result["status"]] += 1
+                if result["status"] == "invalid":
+                    self.stderr.write(f"item {result['index']}: {result['error']}")
+                elif result["status"] == "duplicate":
+                    self.stderr.write(
+                        f"item {result['index']}: {result['shared_id']} exists",
+                    )
+
+        self.stdout.write(
+            "created: {created}, duplicate: {duplicate}, invalid: {invalid}".format(
+                **counts,
+            ),
+        )
+
+    @staticmethod
+    def chain(first, stream):
+        yield first
+        yield from stream
@@ -0,0 +1,32 @@
+import logging
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task.callback import get_session
+from task.callback import send_callbacks
+
+logger = logging.getLogger("runcallback")
+
+
+class Command(BaseCommand):
+    help = "deliver callback events."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="deliver due callback events and exit immediately.",
+        )
+
+    def handle(self, *args, **options):
+        logger.info("callback sender started.")
+        session = get_session()
+        while True:
+            while send_callbacks(session):
+                pass
+
+            if options["once"]:
+                return
+            sleep(settings.RUNNER_SLEEP_SECONDS)
@@ -6,7 +6,9 @@ from django.core.management.base import BaseCommand
 
 from task.baidupcs import get_baidupcs_client
 from task.leecher import leech
+from task.leecher import run_stage
 from task.models import Task
+from task.scheduler import run_queue
 
 logger = logging.getLogger("runleecher")
 
@@ -25,8 +27,10 @@ class Command(BaseCommand):
         logger.info("leecher started.")
         client = get_baidupcs_client()
         while True:
-            for task in Task.filter_sampling_downloaded():
-                leech(client, task)
+            run_queue(
+                Task.filter_sampling_downloaded(),
+                lambda task: run_stage(client, task, leech),
+            )
 
             if options["once"]:
                 return
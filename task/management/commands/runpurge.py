@@ -0,0 +1,45 @@
+import logging
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task.models import PurgeJob
+from task.purge import run_job
+from task.trash import evict
+from task.trash import sync_entries
+
+logger = logging.getLogger("runpurge")
+
+
+class Command(BaseCommand):
+    help = "clear local files of deleted tasks as requested by purge jobs, and evict expired trash."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="run pending purge jobs and exit immediately.",
+        )
+
+    def run_once(self):
+        reaped = PurgeJob.reap_abandoned()
+        if reaped:
+            logger.warning(f"{reaped} purge jobs of dead runners returned to pending")
+        for job in PurgeJob.filter_pending():
+            if not job.claim():
+                continue
+            logger.info(f"start purge job: {job}")
+            run_job(job)
+            logger.info(f"purge job finished: {job}")
+        if settings.TRASH_MAX_SIZE or settings.TRASH_MAX_AGE_DAYS:
+            evict()
+
+    def handle(self, *args, **options):
+        logger.info("purge runner started.")
+        sync_entries()
+        while True:
+            self.run_once()
+            if options["once"]:
+                return
+            sleep(settings.RUNNER_SLEEP_SECONDS)
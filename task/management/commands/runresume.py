@@ -10,7 +10,7 @@ logger = logging.getLogger("runresume")
 
 
 class Command(BaseCommand):
-    help = "resume failed but recoverable tasks."
+    help = "resume failed but recoverable tasks, and tasks abandoned by dead workers."
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -19,18 +19,19 @@ class Command(BaseCommand):
             help="resume all failed tasks once and exit immediately.",
         )
 
+    def reap_once(self):
+        for task in Task.reap_lease_expired():
+            logger.warning(f"task lease expired, returned to {task.status}: {task}")
+
     def resume_once(self):
-        for task in Task.filter_failed():
-            if not task.recoverable:
-                continue
-            if task.retry_times >= settings.RETRY_TIMES_LIMIT:
-                continue
+        for task in Task.filter_due_retries():
             logger.info(f"schedule resume task: {task}, {task.get_current_stage()}")
             task.schedule_resume()
 
     def handle(self, *args, **options):
         logger.info("auto resume failed but recoverable tasks.")
         while True:
+            self.reap_once()
             self.resume_once()
             if options["once"]:
                 logger.info("auto resume tasks once and exit now.")
@@ -0,0 +1,36 @@
+import logging
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from task.baidupcs import get_baidupcs_client
+from task.models import Task
+from task.resync import resync
+
+logger = logging.getLogger("runresync")
+
+
+class Command(BaseCommand):
+    help = "fetch new and changed files of shares of finished tasks, as requested by resync."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="resync requested tasks and exit immediately.",
+        )
+
+    def run_once(self, client):
+        for task in Task.filter_resync_requested():
+            if task.claim():
+                resync(client, task)
+
+    def handle(self, *args, **options):
+        logger.info("resync runner started.")
+        client = get_baidupcs_client()
+        while True:
+            self.run_once(client)
+            if options["once"]:
+                return
+            sleep(settings.RUNNER_SLEEP_SECONDS)
@@ -5,8 +5,10 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from task.baidupcs import get_baidupcs_client
+from task.leecher import run_stage
 from task.leecher import sampling
 from task.models import Task
+from task.scheduler import run_queue
 
 logger = logging.getLogger("runsamplingdownloader")
 
@@ -25,8 +27,10 @@ class Command(BaseCommand):
         logger.info("sampling downlader started.")
         client = get_baidupcs_client()
         while True:
-            for task in Task.filter_transferd():
-                sampling(client, task)
+            run_queue(
+                Task.filter_transferd(),
+                lambda task: run_stage(client, task, sampling),
+            )
 
             if options["once"]:
                 return
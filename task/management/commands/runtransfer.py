@@ -5,8 +5,10 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from task.baidupcs import get_baidupcs_client
+from task.leecher import run_stage
 from task.leecher import transfer
 from task.models import Task
+from task.scheduler import run_queue
 
 logger = logging.getLogger("runtransfer")
 
@@ -25,8 +27,10 @@ class Command(BaseCommand):
         logger.info("transfer started.")
         client = get_baidupcs_client()
         while True:
-            for task in Task.filter_ready_to_transfer():
-                transfer(client, task)
+            run_queue(
+                Task.filter_ready_to_transfer(),
+                lambda task: run_stage(client, task, transfer),
+            )
 
             if options["once"]:
                 return
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:49
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0011_alter_task_shared_id_alter_task_shared_link_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:50
+from json import loads
+
+from django.db import migrations
+from django.db import models
+
+
+def fill_total_files_and_size(apps, schema_editor):
+    Task = apps.get_model("task", "Task")
+    for task in Task.objects.exclude(files="").iterator():
+        files = loads(task.files or "[]") or []
+        task.total_files = len([f for f in files if f["is_file"]])
+        task.total_size = sum([f["size"] for f in files])
+        task.save(update_fields=["total_files", "total_size"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0012_task_heartbeat_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="priority",
+            field=models.IntegerField(
+                default=0,
+                help_text="Tasks with higher priority are processed first",
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="total_files",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="total_size",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["priority", "total_size"],
+                name="task_task_priorit_71f4fb_idx",
+            ),
+        ),
+        migrations.RunPython(
+            fill_total_files_and_size,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:51
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0013_task_priority_total_files_total_size"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="next_retry_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["failed", "next_retry_at"],
+                name="task_task_failed_28fbcd_idx",
+            ),
+        ),
+    ]
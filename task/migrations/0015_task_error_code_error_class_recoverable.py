@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:52
+import re
+
+from django.db import migrations
+from django.db import models
+
+# frozen copy of `task.errors.ERROR_RULES` at this migration,
+# (regex, error class, recoverable), the first matched rule wins
+ERROR_RULES = [
+    (r"error_code: -65,|操作过于频繁，请您稍后重试", "throttled", True),
+    (
+        r"Remote end closed connection without response"
+        r"|urlopen error \[Errno 104\] Connection reset by peer"
+        r"|urlopen error \[Errno 99\] Cannot assign requested address"
+        r"|ConnectionResetError\(104, 'Connection reset",
+        "network",
+        True,
+    ),
+    (r"^BaiduPCS\._request$", "network", True),
+    (r"error_code: 105,|啊哦，链接错误没找到文件，请打开正确的分享链接", "not_found", False),
+    (r"error_code: 31066,|message: 文件不存在", "not_found", False),
+    (r"error_code: 2,|message: 参数错误", "invalid_params", False),
+    (r"error_code: -7,|message: 该分享已删除或已取消", "share_removed", False),
+    (r"error_code: 145,|message: 该分享已被删除", "share_removed", False),
+    (r"error_code: -12,|message: 访问密码错误", "wrong_password", False),
+    (r"error_code: 117,|message: 该分享已过期", "share_expired", False),
+]
+
+ERROR_CODE_RE = re.compile(r"error_code: (-?\d+),")
+
+
+def classify_error(message):
+    match = ERROR_CODE_RE.search(message)
+    code = int(match.group(1)) if match else None
+    for regex, error_class, recoverable in ERROR_RULES:
+        if re.search(regex, message):
+            return code, error_class, recoverable
+    return code, "unknown", False
+
+
+def classify_failed_tasks(apps, schema_editor):
+    Task = apps.get_model("task", "Task")
+    for task in Task.objects.filter(failed=True).iterator():
+        code, error_class, recoverable = classify_error(task.message)
+        task.error_code = code
+        task.error_class = error_class
+        task.recoverable = recoverable
+        task.save(update_fields=["error_code", "error_class", "recoverable"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0014_task_next_retry_at"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="task",
+            name="task_task_failed_28fbcd_idx",
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="error_class",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=32,
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="error_code",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="recoverable",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["failed", "recoverable", "next_retry_at"],
+                name="task_task_failed_38548c_idx",
+            ),
+        ),
+        migrations.RunPython(
+            classify_failed_tasks,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:53
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0015_task_error_code_error_class_recoverable"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CallbackEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("url", models.CharField(max_length=1024)),
+                ("action", models.CharField(max_length=50)),
+                ("payload", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+                ("failed", models.BooleanField(default=False)),
+                ("message", models.CharField(blank=True, default="", max_length=1000)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="callback_events",
+                        to="task.task",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["delivered_at", "failed", "next_attempt_at"],
+                        name="task_callba_deliver_15f76f_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
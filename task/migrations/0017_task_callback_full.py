@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:53
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0016_callbackevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="callback_full",
+            field=models.BooleanField(
+                default=False,
+                help_text="Post the full task document instead of a compact event",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0017_task_callback_full"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="progress_size",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
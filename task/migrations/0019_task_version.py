@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:02
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0018_task_updated_at_progress_size"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
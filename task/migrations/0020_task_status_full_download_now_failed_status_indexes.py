@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:03
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0019_task_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "full_download_now"],
+                name="task_task_status_68949f_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["failed", "status"],
+                name="task_task_failed_6aabdd_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:10
+from json import loads
+
+from django.db import migrations
+from django.db import models
+
+
+def fill_largest_file(apps, schema_editor):
+    Task = apps.get_model("task", "Task")
+    max_length = Task._meta.get_field("largest_file").max_length
+    for task in Task.objects.exclude(files="").iterator():
+        files = loads(task.files or "[]") or []
+        if not files:
+            continue
+        size, path = max([(f["size"], f["path"]) for f in files])
+        task.largest_file = path[:max_length]
+        task.largest_file_size = size
+        task.save(update_fields=["largest_file", "largest_file_size"])
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX task_task_largest_file_search ON task_task "
+        "USING GIN (to_tsvector('simple', largest_file))",
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS task_task_largest_file_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0020_task_status_full_download_now_failed_status_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="largest_file",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="largest_file_size",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="shared_id",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                max_length=50,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["largest_file"],
+                name="task_task_largest_51bb4f_idx",
+            ),
+        ),
+        migrations.RunPython(fill_largest_file, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
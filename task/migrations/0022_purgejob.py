@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:13
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0021_task_largest_file"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PurgeJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Running", "Running"),
+                            ("Done", "Done"),
+                            ("Cancelled", "Cancelled"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Pending",
+                        max_length=20,
+                    ),
+                ),
+                ("move_to_trash", models.BooleanField(default=True)),
+                ("cancel_requested", models.BooleanField(default=False)),
+                ("total_dirs", models.IntegerField(default=0)),
+                ("purged_dirs", models.IntegerField(default=0)),
+                ("deleted_files", models.BigIntegerField(default=0)),
+                ("deleted_size", models.BigIntegerField(default=0)),
+                ("message", models.CharField(blank=True, default="", max_length=1000)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status"],
+                        name="task_purgej_status_4f232a_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:15
+import django.utils.timezone
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0022_purgejob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrashEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.BigIntegerField(default=0)),
+                (
+                    "moved_at",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=django.utils.timezone.now,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:17
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0023_trashentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="accessed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="local_evicted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:18
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0024_task_accessed_at_local_evicted_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("md5", models.CharField(max_length=32)),
+                ("size", models.BigIntegerField()),
+                ("path", models.CharField(max_length=1024)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="content_files",
+                        to="task.task",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["md5", "size"],
+                        name="task_conten_md5_b645ed_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0025_contentfile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="task.task",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:22
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0026_task_duplicate_of"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="resync_remove_deleted",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="resync_requested_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="resynced_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
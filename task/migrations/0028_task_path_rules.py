@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:27
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0027_task_resync"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="exclude_paths",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Glob patterns, or regex prefixed with re:, one per line",
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="include_paths",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Glob patterns, or regex prefixed with re:, one per line",
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="max_file_size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
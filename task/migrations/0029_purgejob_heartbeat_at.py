@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:47
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("task", "0028_task_path_rules"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purgejob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
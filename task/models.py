@@ -1,11 +1,9 @@
 import shutil
+from datetime import timedelta
 from json import dumps
 from json import loads
 from os import makedirs
-from os import walk
 from os.path import exists
-from os.path import getsize
-from os.path import join
 from pathlib import Path
 from typing import Any
 from typing import Dict
@@ -16,7 +14,17 @@ from typing import Tuple
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
 from django.db.models import Q
+from django.utils import timezone
+
+from .errors import classify_error
+from .errors import get_retry_base_seconds
+from .rules import PathRules
+from .utils import get_backoff_seconds
+from .utils import scan_files
 
 
 class Task(models.Model):
@@ -27,7 +35,7 @@ class Task(models.Model):
         SAMPLING_DOWNLOADED = "SampleDLed"
         FINISHED = "Finished"
 
-    shared_id = models.CharField(max_length=50, default="", blank=True)
+    shared_id = models.CharField(max_length=50, default="", blank=True, db_index=True)
     shared_link = models.CharField(
         max_length=100,
         help_text="Link, with or without password",
@@ -45,7 +53,13 @@ class Task(models.Model):
         default=Status.INITED,
     )
     callback = models.CharField(max_length=1024, blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    callback_full = models.BooleanField(
+        default=False,
+        help_text="Post the full task document instead of a compact event",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=0, editable=False)
     started_at = models.DateTimeField(blank=True, null=True, editable=False)
     finished_at = models.DateTimeField(
         blank=True,
@@ -73,10 +87,63 @@ class Task(models.Model):
         editable=False,
     )
     full_download_now = models.BooleanField(default=False, editable=True)
+    priority = models.IntegerField(
+        default=0,
+        help_text="Tasks with higher priority are processed first",
+    )
+    # select files of the share to save and download, see `PathRules`
+    include_paths = models.TextField(
+        default="",
+        blank=True,
+        help_text="Glob patterns, or regex prefixed with re:, one per line",
+    )
+    exclude_paths = models.TextField(
+        default="",
+        blank=True,
+        help_text="Glob patterns, or regex prefixed with re:, one per line",
+    )
+    max_file_size = models.BigIntegerField(blank=True, null=True)
     failed = models.BooleanField(default=False, editable=False)
     message = models.CharField(max_length=1000, editable=False)
+    error_code = models.IntegerField(blank=True, null=True, editable=False)
+    error_class = models.CharField(
+        max_length=32,
+        default="",
+        blank=True,
+        editable=False,
+    )
+    recoverable = models.BooleanField(default=False, editable=False)
     retry_times = models.IntegerField(default=0, editable=False)
+    next_retry_at = models.DateTimeField(blank=True, null=True, editable=False)
+    heartbeat_at = models.DateTimeField(blank=True, null=True, editable=False)
     files = models.TextField(editable=False)
+    total_files = models.IntegerField(default=0, editable=False)
+    total_size = models.BigIntegerField(default=0, editable=False)
+    largest_file = models.CharField(
+        max_length=255,
+        default="",
+        blank=True,
+        editable=False,
+    )
+    largest_file_size = models.BigIntegerField(blank=True, null=True, editable=False)
+    # bytes downloaded by the running sampling or leeching stage
+    progress_size = models.BigIntegerField(default=0, editable=False)
+    # local files were last read at, and deleted to make room for others at
+    accessed_at = models.DateTimeField(blank=True, null=True, editable=False)
+    local_evicted_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # new and changed files of the share are fetched by `runresync` if requested
+    resync_requested_at = models.DateTimeField(blank=True, null=True, editable=False)
+    resync_remove_deleted = models.BooleanField(default=False, editable=False)
+    resynced_at = models.DateTimeField(blank=True, null=True, editable=False)
+    # the finished task of the same share, this task was fast-forwarded from
+    duplicate_of = models.ForeignKey(
+        "self",
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="duplicates",
+        editable=False,
+    )
     captcha = models.BinaryField(editable=False, default=b"")
     captcha_required = models.BooleanField(default=False, editable=False)
     captcha_code = models.CharField(
@@ -99,8 +166,24 @@ class Task(models.Model):
         indexes = [
             models.Index(fields=["shared_link"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["priority", "total_size"]),
+            models.Index(fields=["failed", "recoverable", "next_retry_at"]),
+            models.Index(fields=["status", "full_download_now"]),
+            models.Index(fields=["failed", "status"]),
+            models.Index(fields=["largest_file"]),
         ]
 
+    # fields changed by `set_files` and `set_error`, workers save only the
+    # fields of their stages, so changes by the api meanwhile are kept
+    FILES_FIELDS = [
+        "files",
+        "total_files",
+        "total_size",
+        "largest_file",
+        "largest_file_size",
+    ]
+    ERROR_FIELDS = ["message", "error_code", "error_class", "recoverable"]
+
     def __repr__(self) -> str:
         return f"<Task id={self.id}, {self.shared_id} with {self.total_files} files>"
 
@@ -142,6 +225,18 @@ class Task(models.Model):
                 file["path"] = sub_path
             file_list.append(file)
         self.files = dumps(file_list)
+        self.total_files = len([f for f in file_list if f["is_file"]])
+        self.total_size = sum([f["size"] for f in file_list])
+        largest = self.get_largest_file()
+        if largest:
+            size, path = largest
+            max_length = Task._meta.get_field("largest_file").max_length
+            self.largest_file = path[:max_length]
+            self.largest_file_size = size
+
+    def get_rules(self) -> Optional[PathRules]:
+        rules = PathRules(self.include_paths, self.exclude_paths, self.max_file_size)
+        return rules if rules else None
 
     def load_files(self) -> List[Dict[str, Any]]:
         return loads(self.files or "[]") or []
@@ -166,11 +261,8 @@ class Task(models.Model):
             data_path = self.sample_data_path
         else:
             data_path = self.data_path
-        for root, dirs, files in walk(data_path):
-            for file in files:
-                filepath = join(root, file)
-                sub_path = filepath[len(str(data_path)) + 1 :]
-                yield {"file": sub_path, "size": getsize(filepath)}
+        for file in scan_files(data_path):
+            yield {"file": file.path, "size": file.size}
 
     @property
     def local_files(self) -> List[Dict[str, Any]]:
@@ -180,17 +272,9 @@ class Task(models.Model):
     def local_sample_files(self) -> List[Dict[str, Any]]:
         return list(self.list_local_files(samples_only=True))
 
-    @property
-    def total_files(self) -> int:
-        return len([f for f in self.load_files() if f["is_file"]])
-
     @property
     def local_size(self) -> int:
-        return sum([f["size"] for f in self.local_files])
-
-    @property
-    def total_size(self) -> int:
-        return sum([f["size"] for f in self.load_files()])
+        return sum(file.size for file in scan_files(self.data_path))
 
     def get_largest_file(self) -> Optional[Tuple[int, str]]:
         files = self.load_files()
@@ -198,61 +282,260 @@ class Task(models.Model):
             return max([(f["size"], f["path"]) for f in files])
         return None
 
-    @property
-    def largest_file(self) -> Optional[str]:
-        largest = self.get_largest_file()
-        if largest:
-            size, path = largest
-            return path
-        return None
-
-    @property
-    def largest_file_size(self) -> Optional[int]:
-        largest = self.get_largest_file()
-        if largest:
-            size, path = largest
-            return size
-        return None
-
     @classmethod
     def filter_ready_to_transfer(cls) -> models.QuerySet:
         inited = Q(status=cls.Status.INITED)
         tasks = cls.objects.filter(inited)
-        return tasks
+        return tasks.exclude(cls.q_leased())
 
     @classmethod
     def filter_transferd(cls) -> models.QuerySet:
-        return cls.objects.filter(status=cls.Status.TRANSFERRED)
+        tasks = cls.objects.filter(status=cls.Status.TRANSFERRED)
+        return tasks.exclude(cls.q_leased())
 
     @classmethod
     def filter_sampling_downloaded(cls) -> models.QuerySet:
-        return cls.objects.filter(
+        tasks = cls.objects.filter(
             status=cls.Status.SAMPLING_DOWNLOADED,
             full_download_now=True,
         )
+        return tasks.exclude(cls.q_leased())
+
+    @classmethod
+    def filter_resync_requested(cls) -> models.QuerySet:
+        tasks = cls.objects.filter(
+            status=cls.Status.FINISHED,
+            failed=False,
+            resync_requested_at__isnull=False,
+        )
+        return tasks.exclude(cls.q_leased()).order_by("resync_requested_at")
+
+    @staticmethod
+    def get_lease_expired_time():
+        return timezone.now() - timedelta(seconds=settings.HEARTBEAT_TIMEOUT_SECONDS)
+
+    @classmethod
+    def q_leased(cls) -> Q:
+        return Q(heartbeat_at__gte=cls.get_lease_expired_time())
+
+    @classmethod
+    def filter_lease_expired(cls) -> models.QuerySet:
+        expired_at = cls.get_lease_expired_time()
+        heartbeat_lost = Q(heartbeat_at__lt=expired_at)
+        # worker died before its first heartbeat
+        never_beat = Q(
+            status=cls.Status.STARTED,
+            captcha_required=False,
+            heartbeat_at__isnull=True,
+            started_at__lt=expired_at,
+        )
+        return cls.objects.filter(heartbeat_lost | never_beat, failed=False)
 
     @classmethod
     def filter_failed(cls) -> models.QuerySet:
         return cls.objects.filter(failed=True)
 
+    @classmethod
+    def filter_due_retries(cls) -> models.QuerySet:
+        due = Q(next_retry_at__isnull=True) | Q(next_retry_at__lte=timezone.now())
+        return cls.filter_failed().filter(
+            due,
+            recoverable=True,
+            retry_times__lt=settings.RETRY_TIMES_LIMIT,
+        )
+
     @property
     def is_waiting_for_captcha_code(self) -> bool:
-        return self.status == self.Status.STARTED and self.captcha_required
+        return (
+            self.status == self.Status.STARTED
+            and self.captcha_required
+            and not self.is_leased
+        )
 
-    def _reset_status(self, status: Optional[Status] = None) -> Status:
+    @property
+    def is_leased(self) -> bool:
+        if not self.heartbeat_at:
+            return False
+        return self.heartbeat_at >= self.get_lease_expired_time()
+
+    def heartbeat(self, force: bool = False) -> None:
+        """
+        Tell others the task is still being processed by a living worker.
+        Writes are throttled by HEARTBEAT_INTERVAL_SECONDS unless forced.
+        """
+        now = timezone.now()
+        interval = timedelta(seconds=settings.HEARTBEAT_INTERVAL_SECONDS)
+        if not force and self.heartbeat_at and now - self.heartbeat_at < interval:
+            return
+        self.heartbeat_at = now
+        Task.objects.filter(pk=self.pk).update(heartbeat_at=now)
+
+    def claim(self) -> bool:
+        """
+        Take the lease of the task, as it was selected by this worker.
+        The conditional UPDATE on the status and the heartbeat lets only
+        one of the workers selecting the same task win.
+        """
+        now = timezone.now()
+        claimed = (
+            Task.objects.filter(
+                pk=self.pk,
+                status=self.status,
+                heartbeat_at=self.heartbeat_at,
+            )
+            .exclude(Task.q_leased())
+            .update(heartbeat_at=now)
+        )
+        if claimed:
+            self.heartbeat_at = now
+        return bool(claimed)
+
+    def release(self) -> None:
+        self.heartbeat_at = None
+        Task.objects.filter(pk=self.pk).update(heartbeat_at=None)
+
+    def touch(self) -> None:
+        """
+        Record the access to local files, the least recently accessed are
+        evicted first. The version is kept, as no visible field changed.
+        """
+        self.accessed_at = timezone.now()
+        Task.objects.filter(pk=self.pk).update(accessed_at=self.accessed_at)
+
+    def save(self, *args, **kwargs) -> None:
+        # every saved change gets a new version, the etag of the task
+        self.version += 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {
+                *kwargs["update_fields"],
+                "version",
+                "updated_at",
+            }
+        super().save(*args, **kwargs)
+
+    def save_fields(self, **fields: Any) -> None:
+        """
+        Save the given fields only, with a single UPDATE query,
+        and bump the version like `save` does.
+        """
+        fields.setdefault("updated_at", timezone.now())
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        Task.objects.filter(pk=self.pk).update(version=F("version") + 1, **fields)
+
+    def bump_version(self) -> None:
+        """
+        Renew the etag and the cached document after local files changed,
+        as the downloaded sizes and percents are read from the filesystem.
+        """
+        self.save_fields()
+
+    def reset_progress(self) -> None:
+        self._progress_saved_at = timezone.now()
+        self.save_fields(progress_size=0, updated_at=self._progress_saved_at)
+
+    def add_progress(self, size: int) -> None:
+        """
+        Count downloaded bytes, and save them along with a heartbeat.
+        Writes are throttled by PROGRESS_INTERVAL_SECONDS.
+        """
+        self.progress_size += size
+        now = timezone.now()
+        interval = timedelta(seconds=settings.PROGRESS_INTERVAL_SECONDS)
+        saved_at = getattr(self, "_progress_saved_at", None)
+        if saved_at and now - saved_at < interval:
+            return
+        self._progress_saved_at = now
+        self.save_fields(progress_size=self.progress_size, updated_at=now)
+        self.heartbeat()
+
+    @staticmethod
+    def get_reset_fields() -> Dict[str, Any]:
+        error = classify_error("")
+        return dict(
+            failed=False,
+            message="",
+            error_code=error.code,
+            error_class=error.error_class,
+            recoverable=error.recoverable,
+            heartbeat_at=None,
+            next_retry_at=None,
+        )
+
+    def _reset_status(
+        self,
+        status: Optional[Status] = None,
+        count_retry: bool = True,
+    ) -> Status:
         if status:
             self.status = status
-        self.failed = False
-        self.message = ""
-        self.inc_retry_times()
+        for name, value in self.get_reset_fields().items():
+            setattr(self, name, value)
+        if count_retry:
+            self.inc_retry_times()
         self.save()
         return self.status
 
-    def restart(self) -> Status:
-        return self._reset_status(self.Status.INITED)
+    def restart(self, count_retry: bool = True) -> Status:
+        return self._reset_status(self.Status.INITED, count_retry)
+
+    def restart_downloading(self, count_retry: bool = True) -> Status:
+        return self._reset_status(self.Status.TRANSFERRED, count_retry)
 
-    def restart_downloading(self) -> Status:
-        return self._reset_status(self.Status.TRANSFERRED)
+    def request_resync(self, remove_deleted: bool = False) -> None:
+        self.save_fields(
+            resync_requested_at=timezone.now(),
+            resync_remove_deleted=remove_deleted,
+        )
+
+    @classmethod
+    def bulk_update(cls, tasks: models.QuerySet, **fields: Any) -> int:
+        """
+        Update tasks with a single UPDATE query, and bump their versions
+        like `save` does.
+        """
+        fields.setdefault("updated_at", timezone.now())
+        return tasks.update(version=F("version") + 1, **fields)
+
+    @classmethod
+    def bulk_reset_status(
+        cls,
+        tasks: models.QuerySet,
+        status: Optional[Status] = None,
+    ) -> int:
+        fields = cls.get_reset_fields()
+        if status:
+            fields["status"] = status
+        return cls.bulk_update(tasks, retry_times=F("retry_times") + 1, **fields)
+
+    @classmethod
+    def bulk_restart(cls, tasks: models.QuerySet) -> int:
+        return cls.bulk_reset_status(tasks, cls.Status.INITED)
+
+    @classmethod
+    def bulk_restart_downloading(cls, tasks: models.QuerySet) -> int:
+        return cls.bulk_reset_status(tasks, cls.Status.TRANSFERRED)
+
+    @classmethod
+    def bulk_resume(cls, tasks: models.QuerySet) -> int:
+        """
+        Resume failed tasks like `schedule_resume`, grouped by the stage
+        they failed in, which is told by the completed timestamps.
+        """
+        tasks = tasks.filter(failed=True)
+        transferring = Q(started_at__isnull=True) | Q(
+            transfer_completed_at__isnull=True,
+        )
+        downloading = ~transferring & (
+            Q(sample_downloaded_at__isnull=True)
+            | Q(full_download_now=True, full_downloaded_at__isnull=True)
+        )
+        return (
+            cls.bulk_restart(tasks.filter(transferring))
+            + cls.bulk_restart_downloading(tasks.filter(downloading))
+            + cls.bulk_reset_status(tasks.exclude(transferring).exclude(downloading))
+        )
 
     def get_stages(self) -> Generator[Tuple[str, str], None, None]:
         found_current = False
@@ -346,6 +629,21 @@ class Task(models.Model):
             return resume_methods[stage_name]
         return None
 
+    def set_error(self, message: str) -> None:
+        self.message = message[: Task._meta.get_field("message").max_length]
+        error = classify_error(message)
+        self.error_code = error.code
+        self.error_class = error.error_class
+        self.recoverable = error.recoverable
+
+    def get_next_retry_at(self):
+        delay = get_backoff_seconds(
+            self.retry_times,
+            get_retry_base_seconds(self.error_class),
+            settings.RETRY_BACKOFF_MAX_SECONDS,
+        )
+        return timezone.now() + timedelta(seconds=delay)
+
     def inc_retry_times(self) -> int:
         self.retry_times += 1
         self.save()
@@ -354,18 +652,60 @@ class Task(models.Model):
     def schedule_resume(self) -> None:
         if not self.failed:
             return
+        self._resume()
+
+    def _resume(self, count_retry: bool = True) -> None:
         method_name = self.get_resume_method_name()
         if method_name:
             method = getattr(self, method_name)
-            method()
+            method(count_retry)
         else:
-            self._reset_status()
+            self._reset_status(count_retry=count_retry)
 
     @classmethod
     def schedule_resume_failed(cls) -> None:
         for task in cls.filter_failed():
             task.schedule_resume()
 
+    @classmethod
+    def reap_lease_expired(cls) -> List["Task"]:
+        """
+        Return tasks abandoned by dead workers to the stage they were in.
+        Tasks are claimed first, in case a worker beats in the meantime.
+        A lost worker is not a failure of the task, no retry is counted.
+        """
+        tasks = [task for task in cls.filter_lease_expired() if task.claim()]
+        for task in tasks:
+            if task.status == cls.Status.FINISHED:
+                # abandoned resync, `runresync` will take it again
+                task.release()
+                continue
+            task._resume(count_retry=False)
+        return tasks
+
+    @property
+    def is_active(self) -> bool:
+        """
+        Whether the task is changing by itself, rather than waiting for
+        the permission to download, or finished.
+        """
+        if self.failed or self.status == self.Status.FINISHED:
+            return False
+        if self.status == self.Status.SAMPLING_DOWNLOADED:
+            return self.full_download_now
+        return True
+
+    @property
+    def progress_percent(self) -> float:
+        """
+        Percent of files downloaded, from stored fields only.
+        """
+        if self.full_downloaded_at:
+            return 100.0
+        if self.status != self.Status.SAMPLING_DOWNLOADED or not self.total_size:
+            return 0.0
+        return min(100.0, 100.0 * self.progress_size / self.total_size)
+
     @property
     def done(self) -> bool:
         if self.failed:
@@ -376,56 +716,36 @@ class Task(models.Model):
             return False
         return True
 
-    @property
-    def recoverable(self) -> bool:
-        if not self.failed:
-            return False
-
-        e = self.message
-        if (
-            e == "Remote end closed connection without response"
-            or e == "<urlopen error [Errno 104] Connection reset by peer>"
-            or e == "BaiduPCS._request"
-            or "error_code: -65," in e
-            or "操作过于频繁，请您稍后重试" in e
-            or "urlopen error [Errno 104] Connection reset by peer" in e
-            or "urlopen error [Errno 99] Cannot assign requested address" in e
-            or "ConnectionResetError(104, 'Connection reset" in e
-        ):
-            return True
-
-        if (
-            "error_code: 105," in e
-            or "啊哦，链接错误没找到文件，请打开正确的分享链接" in e
-            or "error_code: 31066," in e
-            or "message: 文件不存在" in e
-            or "error_code: 2," in e
-            or "message: 参数错误" in e
-            or "error_code: -7," in e
-            or "message: 该分享已删除或已取消" in e
-            or "error_code: -12," in e
-            or "message: 访问密码错误" in e
-            or "error_code: 117," in e
-            or "message: 该分享已过期" in e
-        ):
-            return False
-
-        # assume task is not recoverable by default to avoid flood requests
-        return False
-
     def delete_files(self) -> None:
         if exists(self.sample_path):
             shutil.rmtree(self.sample_path)
         if exists(self.data_path):
             shutil.rmtree(self.data_path)
 
-    def erase(self) -> None:
-        self.delete_files()
+    def filter_sharing_files(self) -> models.QuerySet:
+        """
+        Other tasks of the same share, e.g. duplicates, which use the same
+        local and remote directories.
+        """
+        return Task.objects.filter(
+            shared_id=self.shared_id,
+            shared_password=self.shared_password,
+        ).exclude(pk=self.pk)
+
+    def erase(self) -> bool:
+        """
+        Delete the task, and its local files unless other tasks of the same
+        share still use them. Return whether the files are deleted.
+        """
+        shared = self.filter_sharing_files().exists()
+        if not shared:
+            self.delete_files()
         self.delete()
+        return not shared
 
     @property
     def sample_downloaded_files(self) -> int:
-        return len(list(self.list_local_files()))
+        return sum(1 for _ in scan_files(self.data_path))
 
     @property
     def sample_download_percent(self) -> float:
@@ -442,3 +762,254 @@ class Task(models.Model):
         if self.total_files == 0:
             return 0.0
         return 100.0 * self.downloaded_size / self.total_size
+
+
+class CallbackEvent(models.Model):
+    task = models.ForeignKey(
+        Task,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="callback_events",
+    )
+    url = models.CharField(max_length=1024)
+    action = models.CharField(max_length=50)
+    payload = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    failed = models.BooleanField(default=False)
+    message = models.CharField(max_length=1000, default="", blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["delivered_at", "failed", "next_attempt_at"]),
+        ]
+
+    def __repr__(self) -> str:
+        return f"<CallbackEvent id={self.id}, {self.action} of task {self.task_id}>"
+
+    def __str__(self) -> str:
+        return repr(self)
+
+    @classmethod
+    def filter_pending(cls) -> models.QuerySet:
+        return cls.objects.filter(delivered_at__isnull=True, failed=False)
+
+    @classmethod
+    def filter_due(cls) -> models.QuerySet:
+        """
+        Events to be delivered now. To keep the order of events to the same
+        url, those behind an earlier pending event, which is not due yet or
+        claimed by a worker, are left out.
+        """
+        now = timezone.now()
+        waiting = cls.filter_pending().filter(
+            url=OuterRef("url"),
+            id__lt=OuterRef("id"),
+            next_attempt_at__gt=now,
+        )
+        return (
+            cls.filter_pending()
+            .filter(next_attempt_at__lte=now)
+            .exclude(Exists(waiting))
+            .order_by("id")
+        )
+
+    @classmethod
+    def claim(cls, events: List["CallbackEvent"]) -> List["CallbackEvent"]:
+        """
+        Take the events selected by this worker, by moving their next
+        attempts past the delivery. The conditional UPDATE on being due lets
+        only one of the workers selecting the same events win, and events of
+        a dead worker are due again after HEARTBEAT_TIMEOUT_SECONDS.
+        """
+        now = timezone.now()
+        claimed_until = now + timedelta(seconds=settings.HEARTBEAT_TIMEOUT_SECONDS)
+        ids = [event.id for event in events]
+        cls.filter_pending().filter(id__in=ids, next_attempt_at__lte=now).update(
+            next_attempt_at=claimed_until,
+        )
+        claimed = set(
+            cls.objects.filter(
+                id__in=ids,
+                next_attempt_at=claimed_until,
+            ).values_list("id", flat=True),
+        )
+        events = [event for event in events if event.id in claimed]
+        for event in events:
+            event.next_attempt_at = claimed_until
+        return events
+
+
+class PurgeJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "Pending"
+        RUNNING = "Running"
+        DONE = "Done"
+        CANCELLED = "Cancelled"
+        FAILED = "Failed"
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    move_to_trash = models.BooleanField(default=True)
+    cancel_requested = models.BooleanField(default=False)
+    # directories of deleted tasks found so far, and those moved or deleted
+    total_dirs = models.IntegerField(default=0)
+    purged_dirs = models.IntegerField(default=0)
+    deleted_files = models.BigIntegerField(default=0)
+    deleted_size = models.BigIntegerField(default=0)
+    message = models.CharField(max_length=1000, default="", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # progress last saved at, jobs left running by a dead runner are reaped
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status"]),
+        ]
+
+    # fields changed by the purge runner, `cancel_requested` is never among
+    # them, so a cancellation would not be overwritten by the progress
+    PROGRESS_FIELDS = [
+        "status",
+        "total_dirs",
+        "purged_dirs",
+        "deleted_files",
+        "deleted_size",
+        "message",
+        "finished_at",
+        "heartbeat_at",
+    ]
+
+    def __repr__(self) -> str:
+        return f"<PurgeJob id={self.id}, {self.status}>"
+
+    def __str__(self) -> str:
+        return repr(self)
+
+    @classmethod
+    def filter_pending(cls) -> models.QuerySet:
+        return cls.objects.filter(status=cls.Status.PENDING).order_by("id")
+
+    @classmethod
+    def reap_abandoned(cls) -> int:
+        """
+        Return jobs left running by dead runners, which have not saved the
+        progress for HEARTBEAT_TIMEOUT_SECONDS, to pending, or cancel them
+        as requested. Purged directories are kept counted, the others are
+        found again.
+        """
+        expired_at = timezone.now() - timedelta(
+            seconds=settings.HEARTBEAT_TIMEOUT_SECONDS,
+        )
+        never_beat = Q(heartbeat_at__isnull=True, started_at__lt=expired_at)
+        jobs = cls.objects.filter(
+            Q(heartbeat_at__lt=expired_at) | never_beat,
+            status=cls.Status.RUNNING,
+        )
+        jobs.filter(cancel_requested=True).update(
+            status=cls.Status.CANCELLED,
+            finished_at=timezone.now(),
+        )
+        return jobs.update(
+            status=cls.Status.PENDING,
+            heartbeat_at=None,
+            total_dirs=F("purged_dirs"),
+        )
+
+    @property
+    def done(self) -> bool:
+        return self.status in [
+            self.Status.DONE,
+            self.Status.CANCELLED,
+            self.Status.FAILED,
+        ]
+
+    def claim(self) -> bool:
+        """
+        Mark the pending job as running, return False if another runner
+        has taken it, or it has been cancelled.
+        """
+        now = timezone.now()
+        claimed = PurgeJob.objects.filter(
+            pk=self.pk,
+            status=self.Status.PENDING,
+        ).update(status=self.Status.RUNNING, started_at=now, heartbeat_at=now)
+        if claimed:
+            self.status = self.Status.RUNNING
+            self.started_at = now
+            self.heartbeat_at = now
+        return bool(claimed)
+
+    def is_cancel_requested(self) -> bool:
+        return PurgeJob.objects.filter(pk=self.pk, cancel_requested=True).exists()
+
+    def cancel(self) -> None:
+        """
+        Cancel the job if it is not started yet, or ask the runner to stop.
+        """
+        PurgeJob.objects.filter(pk=self.pk).update(cancel_requested=True)
+        PurgeJob.objects.filter(pk=self.pk, status=self.Status.PENDING).update(
+            status=self.Status.CANCELLED,
+            finished_at=timezone.now(),
+        )
+        self.refresh_from_db()
+
+    def save_progress(self) -> None:
+        self.heartbeat_at = timezone.now()
+        self.save(update_fields=self.PROGRESS_FIELDS)
+
+    def finish(self, status: str, message: str = "") -> None:
+        self.status = status
+        self.message = message[: self._meta.get_field("message").max_length]
+        self.finished_at = timezone.now()
+        self.save_progress()
+
+
+class TrashEntry(models.Model):
+    # name of the directory in the trash dir
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    moved_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __repr__(self) -> str:
+        return f"<TrashEntry {self.name}, {self.size} bytes>"
+
+    def __str__(self) -> str:
+        return repr(self)
+
+
+class ContentFile(models.Model):
+    """
+    A fully downloaded file, found by its md5 and size to be linked into
+    other tasks instead of being downloaded again.
+    """
+
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="content_files",
+    )
+    md5 = models.CharField(max_length=32)
+    size = models.BigIntegerField()
+    # relative to DATA_DIR
+    path = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["md5", "size"]),
+        ]
+
+    def __repr__(self) -> str:
+        return f"<ContentFile {self.md5}, {self.size} bytes: {self.path}>"
+
+    def __str__(self) -> str:
+        return repr(self)
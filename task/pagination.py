@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class TaskCursorPagination(CursorPagination):
+    """
+    Page through tasks by an opaque cursor of the id instead of a page
+    number, so deep pages need neither COUNT(*) nor OFFSET. Links to the
+    adjacent pages are returned in the `Link` header, the same as
+    `LinkHeaderPagination`.
+    """
+
+    ordering = "-id"
+
+    def get_paginated_response(self, data):
+        links = []
+        for url, label in (
+            (self.get_previous_link(), "prev"),
+            (self.get_next_link(), "next"),
+        ):
+            if url is not None:
+                links.append(f'<{url}>; rel="{label}"')
+
+        headers = {"Link": ", ".join(links)} if links else {}
+        return Response(data, headers=headers)
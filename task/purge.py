@@ -1,44 +1,176 @@
+import logging
 import os
-import shutil
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from itertools import islice
 from pathlib import Path
+from threading import Event
+from time import monotonic
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
 
 from django.conf import settings
 
+from .models import PurgeJob
 from .models import Task
+from .trash import add_entry
+from .trash import move_to_trash
+from .utils import handle_exception
+from .utils import RateLimiter
+from .utils import remove_tree
 
+logger = logging.getLogger(__name__)
 
-def purge(move_to_dir: Path = None) -> None:
-    keep_dirs = set()
-    for task in Task.objects.all():
-        keep_dirs.add(task.data_path)
-        keep_dirs.add(task.sample_data_path)
-
-    exist_dirs = set()
-    root = settings.DATA_DIR
-    if root.exists():
-        for dir in os.listdir(root):
-            path = root / dir
-            if path.is_dir() and len(dir.split(".")) in [2, 3]:
-                exist_dirs.add(root / dir)
-
-    useless = exist_dirs - keep_dirs
-    print(f"{len(useless)} directories to be deleted.")
-
-    for dir in sorted(useless):
-        if not dir.exists():
-            print(f"{dir} is not exists, skip deletion.")
-            continue
-        if move_to_dir:
-            print(f"start move {dir} to trash dir {move_to_dir} ...")
-            to_dir = move_to_dir / dir.name
-            to_dir.parent.mkdir(parents=True, exist_ok=True)
-            os.rename(dir, move_to_dir / dir.name)
-            print(f"{dir} moved to trash dir.")
-        else:
-            print(f"start delete {dir} ...")
-            shutil.rmtree(dir)
-            print(f"{dir} deleted.")
+BATCH_SIZE = 500
+
+
+def is_task_dir(name: str) -> bool:
+    """
+    >>> is_task_dir("123abc.def"), is_task_dir("123abc.def.sample")
+    (True, True)
+    >>> is_task_dir("baidupcsleecher_trash")
+    False
+    """
+    return len(name.split(".")) in [2, 3]
+
+
+def get_task_path(name: str) -> str:
+    """
+    >>> get_task_path("123abc.def.sample")
+    '123abc.def'
+    """
+    if name.endswith(".sample"):
+        return name[: -len(".sample")]
+    return name
+
+
+def get_exist_task_paths(paths: Iterable[str]) -> Set[str]:
+    shared_ids = {path.split(".")[0] for path in paths}
+    tasks = Task.objects.filter(shared_id__in=shared_ids)
+    return {
+        f"{shared_id}.{shared_password}"
+        for shared_id, shared_password in tasks.values_list(
+            "shared_id",
+            "shared_password",
+        )
+    }
+
+
+def iter_useless_dirs(root: Path, batch_size: int = BATCH_SIZE) -> Iterator[Path]:
+    """
+    Stream the directories of deleted tasks, looking up the tasks of a
+    batch of directories at a time rather than loading all of them.
+    """
+    if not root.exists():
+        return
+    with os.scandir(root) as entries:
+        candidates = (
+            entry.name
+            for entry in entries
+            if is_task_dir(entry.name) and entry.is_dir(follow_symlinks=False)
+        )
+        while True:
+            names = list(islice(candidates, batch_size))
+            if not names:
+                return
+            exist_paths = get_exist_task_paths(get_task_path(n) for n in names)
+            for name in names:
+                if get_task_path(name) not in exist_paths:
+                    yield root / name
+
+
+def purge_dir(
+    path: Path,
+    to_trash: bool,
+    limiter: RateLimiter,
+    cancelled: Event,
+) -> Tuple[int, int]:
+    if to_trash:
+        logger.info(f"move {path} to trash dir")
+        return 0, move_to_trash(path, limiter)
+    logger.info(f"delete {path}")
+    return remove_tree(path, limiter, cancelled)
+
+
+def run_job(job: PurgeJob, progress_interval: Optional[float] = None) -> None:
+    """
+    Move or delete the directories of deleted tasks with a pool of threads,
+    save the progress and check for cancellation every `progress_interval`.
+    """
+    if progress_interval is None:
+        progress_interval = settings.PROGRESS_INTERVAL_SECONDS
+    limiter = RateLimiter(settings.PURGE_FILES_PER_SECOND)
+    cancelled = Event()
+    workers = settings.PURGE_WORKERS
+    saved_at = monotonic()
+    futures: Dict[Future, Path] = {}
+
+    def collect() -> None:
+        nonlocal saved_at
+        # wake up to save the progress, even if no directory is done
+        done, _ = wait(
+            futures,
+            timeout=progress_interval or None,
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            path = futures.pop(future)
+            files, size = future.result()
+            if not path.exists():
+                job.purged_dirs += 1
+            if job.move_to_trash:
+                add_entry(path.name, size)
+            else:
+                job.deleted_files += files
+                job.deleted_size += size
+        if monotonic() - saved_at >= progress_interval:
+            job.save_progress()
+            saved_at = monotonic()
+            if job.is_cancel_requested():
+                cancelled.set()
+
+    error = ""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for path in iter_useless_dirs(settings.DATA_DIR):
+                if cancelled.is_set():
+                    break
+                job.total_dirs += 1
+                future = executor.submit(
+                    purge_dir,
+                    path,
+                    job.move_to_trash,
+                    limiter,
+                    cancelled,
+                )
+                futures[future] = path
+                # bounded, so that huge data dirs are never listed in memory
+                while len(futures) >= workers * 2:
+                    collect()
+            while futures:
+                collect()
+        except Exception as e:
+            # stop the running threads before leaving the pool
+            cancelled.set()
+            error = handle_exception(e)
+
+    if error:
+        job.finish(PurgeJob.Status.FAILED, error)
+    elif cancelled.is_set():
+        job.finish(PurgeJob.Status.CANCELLED)
+    else:
+        job.finish(PurgeJob.Status.DONE)
+    logger.info(
+        f"{job}: {job.purged_dirs}/{job.total_dirs} directories purged, "
+        f"{job.deleted_files} files of {job.deleted_size} bytes deleted.",
+    )
 
 
 def remove_tasks(keep_task_ids: List[int] = []) -> List[int]:
@@ -0,0 +1,181 @@
+import logging
+import shutil
+from pathlib import PurePosixPath
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .baidupcs import BaiduPCSClient
+from .baidupcs import list_shared_files
+from .callback import callback
+from .content import ContentIndex
+from .leecher import lease
+from .models import Task
+from .utils import handle_exception
+
+logger = logging.getLogger(__name__)
+
+Files = List[Dict[str, Any]]
+
+
+def is_same_file(old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    """
+    >>> is_same_file({"size": 1, "md5": "a"}, {"size": 1, "md5": "a"})
+    True
+    >>> is_same_file({"size": 1, "md5": "a"}, {"size": 1, "md5": "b"})
+    False
+    >>> is_same_file({"size": 1, "md5": ""}, {"size": 1, "md5": "b"})
+    True
+    >>> is_same_file({"size": 1}, {"size": 2})
+    False
+    """
+    if old["size"] != new["size"]:
+        return False
+    old_md5, new_md5 = old.get("md5"), new.get("md5")
+    return not (old_md5 and new_md5) or old_md5 == new_md5
+
+
+def diff_files(old: Files, new: Files) -> Tuple[Files, Files, List[str]]:
+    """
+    Compare two manifests of files by path, size and md5.
+    Return the added and changed files of the new manifest,
+    and the paths of the removed ones.
+
+    >>> old = [
+    ...     {"path": "a", "size": 1, "is_file": True},
+    ...     {"path": "b", "size": 1, "is_file": True},
+    ...     {"path": "c", "size": 1, "is_file": True},
+    ...     {"path": "d", "size": 0, "is_file": False},
+    ... ]
+    >>> new = [
+    ...     {"path": "a", "size": 1, "is_file": True},
+    ...     {"path": "b", "size": 2, "is_file": True},
+    ...     {"path": "e", "size": 1, "is_file": True},
+    ... ]
+    >>> added, changed, removed = diff_files(old, new)
+    >>> [f["path"] for f in added], [f["path"] for f in changed], removed
+    (['e'], ['b'], ['c'])
+    """
+    old_files = {f["path"]: f for f in old if f.get("is_file")}
+    new_files = {f["path"]: f for f in new if f.get("is_file")}
+    added = [f for path, f in new_files.items() if path not in old_files]
+    changed = [
+        f
+        for path, f in new_files.items()
+        if path in old_files and not is_same_file(old_files[path], f)
+    ]
+    removed = [path for path in old_files if path not in new_files]
+    return added, changed, removed
+
+
+def get_remote_path(task: Task, path: str) -> str:
+    return str(PurePosixPath(task.remote_path) / path)
+
+
+def remove_local_files(task: Task, paths: List[str]) -> None:
+    for path in paths:
+        local_path = task.data_path / path
+        if local_path.is_dir():
+            shutil.rmtree(local_path, ignore_errors=True)
+        else:
+            local_path.unlink(missing_ok=True)
+
+
+def transfer_changes(client: BaiduPCSClient, task: Task) -> List[str]:
+    """
+    Save the new and changed files of the share to the remote dir of
+    the task. Return the paths removed from the share.
+    """
+    shared_files = list_shared_files(client, task.shared_link, task.shared_password)
+    rules = task.get_rules()
+    if rules:
+        shared_files = [f for f in shared_files if rules.match(f["path"], f["size"])]
+    added, changed, removed = diff_files(task.remote_files, shared_files)
+    stale = [f["path"] for f in changed]
+    if task.resync_remove_deleted:
+        stale += removed
+    if stale:
+        client.delete(*[get_remote_path(task, path) for path in stale])
+    if added or changed:
+        client.transfer_shared_files(
+            task.remote_path,
+            task.shared_link,
+            added + changed,
+        )
+    logger.info(
+        f"{task} resync: {len(added)} added, {len(changed)} changed, "
+        f"{len(removed)} removed",
+    )
+    return removed
+
+
+def download_changes(client: BaiduPCSClient, task: Task, files: Files) -> None:
+    content_index = ContentIndex(task) if settings.DEDUPE_FILES else None
+    remove_local_files(task, [f["path"] for f in files])
+    for file in files:
+        local_path = task.data_path / file["path"]
+        client.download_file(
+            get_remote_path(task, file["path"]),
+            local_path.parent,
+            file["size"],
+            callback_progress=task.add_progress,
+            md5=file.get("md5"),
+            content_index=content_index,
+        )
+
+
+def resync(client: BaiduPCSClient, task: Task) -> Dict[str, int]:
+    """
+    Fetch the files added or changed since the share was saved, and remove
+    the deleted ones if requested. Files kept the same are not touched.
+    A failed resync marks the task as failed but keeps the request, so that
+    it is taken again once the task is resumed.
+    Return the numbers of files changed.
+    """
+    logger.info(f"start resync {task} ...")
+    summary = dict(added=0, changed=0, removed=0)
+    succeeded = False
+    with lease(task):
+        try:
+            old_files = task.remote_files
+            removed = transfer_changes(client, task)
+            task.set_files(client.list_files(task.remote_path))
+            added, changed, _ = diff_files(old_files, task.remote_files)
+            if not task.local_evicted_at:
+                task.reset_progress()
+                download_changes(client, task, added + changed)
+                if task.resync_remove_deleted:
+                    remove_local_files(task, removed)
+            task.resynced_at = timezone.now()
+            summary.update(added=len(added), changed=len(changed))
+            if task.resync_remove_deleted:
+                summary.update(removed=len(removed))
+            task.resync_requested_at = None
+            succeeded = True
+        except Exception as e:
+            logger.error(f"resync {task} failed.")
+            task.failed = True
+            task.set_error(handle_exception(e))
+            task.next_retry_at = task.get_next_retry_at()
+        task.save(
+            update_fields=[
+                *Task.FILES_FIELDS,
+                "resynced_at",
+                "resync_requested_at",
+                "failed",
+                *Task.ERROR_FIELDS,
+                "next_retry_at",
+            ],
+        )
+    if succeeded:
+        # local files of duplicates are changed along with the task
+        Task.bulk_update(task.filter_sharing_files())
+        callback(task, "files_resynced")
+    else:
+        callback(task, "resync_failed")
+    logger.info(f"resync {task} finished: {summary}")
+    return summary
@@ -0,0 +1,93 @@
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import List
+from typing import Optional
+from typing import Pattern
+
+# prefix of a rule given as a regex, instead of a glob pattern
+REGEX_PREFIX = "re:"
+
+
+def parse_rules(text: str) -> List[str]:
+    """
+    One rule per line, blank lines and comments starting with `#` are skipped.
+
+    >>> parse_rules("*.mp3\\n\\n# lyrics\\n re:.*\\\\.lrc$ ")
+    ['*.mp3', 're:.*\\\\.lrc$']
+    """
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            rules.append(line)
+    return rules
+
+
+@lru_cache(maxsize=128)
+def compile_patterns(text: str) -> Optional[Pattern]:
+    """
+    Compile all rules into a single regex, which matches whole paths.
+    Raise `re.error` if any regex rule is invalid.
+
+    >>> compile_patterns("*.mp3\\nre:cd[0-9]/").pattern
+    '(?:(?s:.*\\\\.mp3)\\\\Z)|(?:cd[0-9]/)'
+    >>> compile_patterns("") is None
+    True
+    """
+    patterns = []
+    for rule in parse_rules(text):
+        if rule.startswith(REGEX_PREFIX):
+            patterns.append(rule[len(REGEX_PREFIX) :])
+        else:
+            patterns.append(translate(rule))
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+class PathRules:
+    """
+    Which files of a share to save and download, by the paths relative to
+    the share and the sizes of files. Paths are included if they match any
+    `include` rule (or there is none), and match no `exclude` rule.
+
+    >>> rules = PathRules(include="*.mp3\\n*.flac", exclude="*/demo/*", max_file_size=10)
+    >>> rules.match("cd1/01.mp3", 5), rules.match("cd1/cover.jpg", 5)
+    (True, False)
+    >>> rules.match("cd1/demo/01.mp3", 5), rules.match("cd1/01.flac", 20)
+    (False, False)
+    >>> rules.match_dir("cd1/demo"), rules.match_dir("cd1")
+    (False, True)
+    """
+
+    def __init__(
+        self,
+        include: str = "",
+        exclude: str = "",
+        max_file_size: Optional[int] = None,
+    ) -> None:
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.max_file_size = max_file_size
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude or self.max_file_size is not None)
+
+    def match_dir(self, path: str) -> bool:
+        """
+        Whether files in the directory may match, include rules are checked
+        on the files only. `*/demo/*` excludes the directory `cd1/demo`.
+        """
+        if not self.exclude:
+            return True
+        return not (self.exclude.match(path) or self.exclude.match(path + "/"))
+
+    def match(self, path: str, size: Optional[int] = None) -> bool:
+        if self.include and not self.include.match(path):
+            return False
+        if self.exclude and self.exclude.match(path):
+            return False
+        if self.max_file_size is not None and size is not None:
+            return size <= self.max_file_size
+        return True
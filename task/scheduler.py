@@ -0,0 +1,102 @@
+from collections import deque
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import models
+
+from .models import Task
+
+# fifo: first come, first served
+# priority: higher priority first, then fifo
+# sjf: higher priority first, then shortest job (smallest total_size) first
+# fair: higher priority first, and take turns between callback hosts
+POLICIES = ("fifo", "priority", "sjf", "fair")
+
+
+def get_callback_host(url: Optional[str]) -> str:
+    """
+    >>> get_callback_host('http://host:8000/notify/')
+    'host:8000'
+    >>> get_callback_host(None)
+    ''
+    """
+    if not url:
+        return ""
+    return urlparse(url).netloc
+
+
+def fair_share(
+    tasks: Iterable[Task],
+    served: Optional[Dict[str, int]] = None,
+) -> Generator[Task, None, None]:
+    """
+    Interleave tasks of different callback hosts in round-robin order,
+    keeping the order of tasks of the same host. Hosts with fewer tasks
+    in `served` take their turn first.
+    """
+    queues: Dict[str, deque] = {}
+    for task in tasks:
+        queues.setdefault(get_callback_host(task.callback), deque()).append(task)
+    if served:
+        queues = dict(sorted(queues.items(), key=lambda q: served.get(q[0], 0)))
+
+    while queues:
+        for host in list(queues):
+            queue = queues[host]
+            yield queue.popleft()
+            if not queue:
+                del queues[host]
+
+
+def schedule(
+    tasks: models.QuerySet,
+    policy: Optional[str] = None,
+    served: Optional[Dict[str, int]] = None,
+) -> Iterable[Task]:
+    policy = policy or settings.SCHEDULING_POLICY
+    if policy == "fifo":
+        return tasks.order_by("id")
+    if policy == "priority":
+        return tasks.order_by("-priority", "id")
+    if policy == "sjf":
+        return tasks.order_by("-priority", "total_size", "id")
+    if policy == "fair":
+        return fair_share(tasks.order_by("-priority", "id"), served)
+    raise ValueError(f"unknown scheduling policy: {policy}")
+
+
+def next_task(
+    tasks: models.QuerySet,
+    policy: Optional[str] = None,
+    served: Optional[Dict[str, int]] = None,
+) -> Optional[Task]:
+    """
+    The head of the queue, selected again for every task a runner takes,
+    so that tasks queued meanwhile with a higher priority are not delayed.
+    """
+    queue = schedule(tasks, policy, served)
+    if isinstance(queue, models.QuerySet):
+        return queue.first()
+    return next(iter(queue), None)
+
+
+def run_queue(tasks: models.QuerySet, run) -> None:
+    """
+    Run tasks one by one until none are left. Tasks already run in this
+    round are excluded, as some, e.g. waiting for disk space, stay in the
+    queue.
+    """
+    done = []
+    served: Dict[str, int] = {}
+    while True:
+        task = next_task(tasks.exclude(id__in=done), served=served)
+        if task is None:
+            return
+        done.append(task.id)
+        host = get_callback_host(task.callback)
+        served[host] = served.get(host, 0) + 1
+        run(task)
@@ -1,11 +1,42 @@
+import re
+
 from django.conf import settings
 from rest_framework import serializers
 
+from .models import PurgeJob
 from .models import Task
+from .rules import compile_patterns
 from .utils import parse_shared_link
 
 
+class RulesField(serializers.CharField):
+    """
+    Path rules, one per line, or a list of them.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("required", False)
+        kwargs.setdefault("allow_blank", True)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            data = "\n".join(str(rule) for rule in data)
+        value = super().to_internal_value(data)
+        try:
+            compile_patterns(value)
+        except re.error as exc:
+            raise serializers.ValidationError(f"invalid rule: {exc}")
+        return value
+
+
 class TaskSerializer(serializers.HyperlinkedModelSerializer):
+    include_paths = RulesField()
+    exclude_paths = RulesField()
+    # fast-forward to finished if the same share has been downloaded
+    dedupe = serializers.BooleanField(write_only=True, required=False)
+    duplicate_of = serializers.PrimaryKeyRelatedField(read_only=True)
+
     class Meta:
         model = Task
         fields = [
@@ -17,6 +48,7 @@ class TaskSerializer(serializers.HyperlinkedModelSerializer):
             "shared_password",
             "status",
             "callback",
+            "callback_full",
             "created_at",
             "started_at",
             "finished_at",
@@ -24,7 +56,16 @@ class TaskSerializer(serializers.HyperlinkedModelSerializer):
             "file_listed_at",
             "sample_downloaded_at",
             "full_downloaded_at",
+            "local_evicted_at",
+            "resync_requested_at",
+            "resynced_at",
+            "updated_at",
+            "version",
             "full_download_now",
+            "priority",
+            "include_paths",
+            "exclude_paths",
+            "max_file_size",
             "total_files",
             "total_size",
             "largest_file",
@@ -34,15 +75,20 @@ class TaskSerializer(serializers.HyperlinkedModelSerializer):
             "sample_downloaded_files",
             "download_percent",
             "downloaded_size",
+            "progress_size",
             "current_progressing_stage",
             "done",
             "failed",
             "recoverable",
+            "error_code",
+            "error_class",
             "retry_times",
             "message",
             "captcha_required",
             "captcha_url",
             "captcha",
+            "dedupe",
+            "duplicate_of",
         ]
 
     def validate(self, data):
@@ -55,8 +101,38 @@ class TaskSerializer(serializers.HyperlinkedModelSerializer):
         full_download_now = data.get("full_download_now")
         if full_download_now is None:
             data["full_download_now"] = settings.FULL_DOWNLOAD_IMMEDIATELY
+        if data.get("dedupe") is None:
+            data["dedupe"] = settings.DEDUPE_TASKS
         return data
 
+    def create(self, validated_data):
+        validated_data.pop("dedupe", None)
+        return super().create(validated_data)
+
+
+class TaskEventSerializer(serializers.ModelSerializer):
+    """
+    Compact task document of callback events, from stored fields only.
+    """
+
+    class Meta:
+        model = Task
+        fields = [
+            "id",
+            "shared_id",
+            "status",
+            "failed",
+            "recoverable",
+            "error_code",
+            "error_class",
+            "retry_times",
+            "full_download_now",
+            "captcha_required",
+            "total_files",
+            "total_size",
+            "progress_size",
+        ]
+
 
 class CaptchaCodeSerializer(serializers.Serializer):
     code = serializers.CharField()
@@ -66,9 +142,85 @@ class FullDownloadNowSerializer(serializers.Serializer):
     full_download_now = serializers.BooleanField()
 
 
+class PrioritySerializer(serializers.Serializer):
+    priority = serializers.IntegerField()
+
+
+class RulesSerializer(serializers.Serializer):
+    include_paths = RulesField()
+    exclude_paths = RulesField()
+    max_file_size = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        min_value=0,
+    )
+
+
+class ResyncSerializer(serializers.Serializer):
+    # delete local files removed from the share too
+    remove_deleted = serializers.BooleanField(default=False)
+
+
 class PurgeSerializer(serializers.Serializer):
     move_to_trash = serializers.BooleanField(default=True)
 
 
+class PurgeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurgeJob
+        fields = "__all__"
+
+
+class FileListSerializer(serializers.Serializer):
+    prefix = serializers.CharField(required=False, default="")
+    recursive = serializers.BooleanField(required=False, default=True)
+    glob = serializers.CharField(required=False, default="")
+    min_size = serializers.IntegerField(required=False, min_value=0)
+    max_size = serializers.IntegerField(required=False, min_value=0)
+    fields = serializers.CharField(required=False, default="")
+    offset = serializers.IntegerField(required=False, default=0, min_value=0)
+    limit = serializers.IntegerField(required=False, min_value=0)
+    # "format" is taken by the format suffix of rest framework
+    output = serializers.ChoiceField(
+        choices=["json", "ndjson"],
+        required=False,
+        default="json",
+    )
+
+    def validate_fields(self, value):
+        return [field.strip() for field in value.split(",") if field.strip()]
+
+
+class BulkOperationSerializer(serializers.Serializer):
+    operation = serializers.ChoiceField(
+        choices=[
+            "restart",
+            "restart_downloading",
+            "resume",
+            "erase",
+            "full_download_now",
+        ],
+    )
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+    )
+    # the same parameters as filtering the task list
+    filter = serializers.DictField(required=False, allow_empty=False)
+    full_download_now = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, data):
+        if ("ids" in data) == ("filter" in data):
+            raise serializers.ValidationError("either ids or filter is required")
+        return data
+
+
+class StatsSerializer(serializers.Serializer):
+    # time window on created_at of tasks
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
 class OperationSerializer(serializers.Serializer):
     pass
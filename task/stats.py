@@ -0,0 +1,109 @@
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from django.db import models
+from django.db.models import Avg
+from django.db.models import Count
+from django.db.models import DurationField
+from django.db.models import ExpressionWrapper
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
+
+from .models import Task
+
+# stage name: (started timestamp, completed timestamp)
+STAGE_DURATIONS = {
+    "waiting": ("created_at", "started_at"),
+    "transferring": ("started_at", "transfer_completed_at"),
+    "sampling": ("transfer_completed_at", "sample_downloaded_at"),
+    "downloading": ("sample_downloaded_at", "full_downloaded_at"),
+    "total": ("created_at", "full_downloaded_at"),
+}
+
+
+def duration(start: str, end: str) -> ExpressionWrapper:
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+
+def seconds(value: Optional[timedelta]) -> Optional[float]:
+    """
+    >>> seconds(timedelta(minutes=1, microseconds=500000))
+    60.5
+    >>> seconds(None) is None
+    True
+    """
+    if value is None:
+        return None
+    return value.total_seconds()
+
+
+def get_stats(tasks: Optional[models.QuerySet] = None) -> Dict[str, Any]:
+    """
+    Aggregate tasks with a few GROUP BY queries over stored fields only.
+    """
+    if tasks is None:
+        tasks = Task.objects.all()
+    tasks = tasks.order_by()
+
+    unfinished = ~Q(status=Task.Status.FINISHED) & Q(failed=False)
+    totals = tasks.aggregate(
+        count=Count("id"),
+        failed_count=Count("id", filter=Q(failed=True)),
+        sum_files=Sum("total_files", default=0),
+        sum_size=Sum("total_size", default=0),
+        sum_queued=Sum("total_size", filter=unfinished, default=0),
+        sum_downloaded=Sum(
+            "total_size",
+            filter=Q(full_downloaded_at__isnull=False),
+            default=0,
+        ),
+        **{
+            f"{name}_seconds": Avg(
+                duration(start, end),
+                filter=Q(**{f"{end}__isnull": False}),
+            )
+            for name, (start, end) in STAGE_DURATIONS.items()
+        },
+    )
+
+    by_status = tasks.values("status").annotate(
+        count=Count("id"),
+        total_size=Sum("total_size", default=0),
+    )
+    failures = (
+        tasks.filter(failed=True)
+        .values("error_class")
+        .annotate(
+            count=Count("id"),
+            recoverable=Count("id", filter=Q(recoverable=True)),
+        )
+        .order_by("-count", "error_class")
+    )
+
+    count = totals["count"]
+    return {
+        "tasks": count,
+        "failed": totals["failed_count"],
+        "failure_rate": totals["failed_count"] / count if count else 0.0,
+        "total_files": totals["sum_files"],
+        "total_size": totals["sum_size"],
+        "queued_size": totals["sum_queued"],
+        "downloaded_size": totals["sum_downloaded"],
+        "status": {
+            row["status"]: {"count": row["count"], "total_size": row["total_size"]}
+            for row in by_status.order_by("status")
+        },
+        "failures": {
+            row["error_class"]: {
+                "count": row["count"],
+                "recoverable": row["recoverable"],
+            }
+            for row in failures
+        },
+        "average_seconds": {
+            name: seconds(totals[f"{name}_seconds"]) for name in STAGE_DURATIONS
+        },
+    }
@@ -3,7 +3,7 @@ from pathlib import Path
 import pytest
 from django.conf import settings
 
-from ..utils import walk_files
+from ..utils import scan_files
 
 
 @pytest.fixture(autouse=True)
@@ -14,7 +14,7 @@ def data_dir_setup(tmp_path: Path):
 
     print(f"files in tmp_path {tmp_path}:")
     total = 0
-    for path in walk_files(tmp_path):
-        print(f"  {path}")
+    for file in scan_files(tmp_path):
+        print(f"  {tmp_path / file.path}")
         total += 1
     print(f"total: {total} files")
@@ -1,14 +1,23 @@
+import gzip
+from datetime import timedelta
 from pathlib import Path
 from unittest.mock import MagicMock
 from unittest.mock import Mock
 from unittest.mock import patch
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from ..models import PurgeJob
 from ..models import Task
+from ..pagination import TaskCursorPagination
 from ..serializers import TaskSerializer
 from ..utils import list_files
 
@@ -78,6 +87,7 @@ class TaskViewSetTestCase(APITestCase):
         assert data["sample_downloaded_files"] == 0
         assert set(data.keys()) == {
             "callback",
+            "callback_full",
             "captcha_required",
             "captcha_url",
             "captcha",
@@ -86,18 +96,29 @@ class TaskViewSetTestCase(APITestCase):
             "done",
             "download_percent",
             "downloaded_size",
+            "duplicate_of",
+            "error_class",
+            "error_code",
+            "exclude_paths",
             "failed",
             "file_listed_at",
             "finished_at",
             "full_download_now",
             "full_downloaded_at",
             "id",
+            "include_paths",
             "is_downloading",
             "largest_file_size",
             "largest_file",
+            "local_evicted_at",
+            "max_file_size",
             "message",
             "path",
+            "priority",
+            "progress_size",
             "recoverable",
+            "resync_requested_at",
+            "resynced_at",
             "retry_times",
             "sample_download_percent",
             "sample_downloaded_at",
@@ -111,6 +132,8 @@ class TaskViewSetTestCase(APITestCase):
             "total_files",
             "total_size",
             "transfer_completed_at",
+            "updated_at",
+            "version",
         }
 
     def test_create_task_full_download_now(self):
@@ -198,6 +221,27 @@ class TaskViewSetTestCase(APITestCase):
         task = Task.objects.get(pk=self.task.id)
         self.assertEqual(task.full_download_now, True)
 
+    def test_priority_action(self):
+        url = reverse("task-priority", args=[self.task.id])
+
+        response = self.client.post(url, {"priority": 10}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["priority"] == 10
+        assert Task.objects.get(pk=self.task.id).priority == 10
+
+    def test_create_task_with_priority(self):
+        url = reverse("task-list")
+        data = {
+            "shared_link": "https://pan.baidu.com/s/badbeef?pwd=bee",
+            "priority": 3,
+        }
+
+        response = self.client.post(url, data, format="json")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["priority"] == 3
+
     def test_restart(self):
         self.task.status = self.task.Status.STARTED
         self.task.failed = True
@@ -287,6 +331,63 @@ class TaskViewSetTestCase(APITestCase):
         assert self.task.largest_file == "张楚/孤独的人是可耻的.mp3"
         assert self.task.largest_file_size == 9518361
 
+    def test_files_filtered(self):
+        url = reverse("task-files", args=[self.task.id])
+
+        response = self.client.get(
+            url,
+            {"prefix": "张楚", "glob": "*.mp3", "min_size": 2000000},
+        )
+        assert [f["path"] for f in response.json()] == ["张楚/孤独的人是可耻的.mp3"]
+
+        response = self.client.get(
+            url,
+            {"fields": "path,size", "offset": 1, "limit": 1},
+        )
+        assert response.json() == [{"path": "张楚/孤独的人是可耻的.mp3", "size": 9518361}]
+
+        response = self.client.get(url, {"prefix": "", "recursive": "false"})
+        assert [f["path"] for f in response.json()] == ["张楚"]
+
+        response = self.client.get(url, {"min_size": -1})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_files_ndjson(self):
+        url = reverse("task-files", args=[self.task.id])
+
+        response = self.client.get(url, {"output": "ndjson", "fields": "path"})
+        content = b"".join(response.streaming_content).decode()
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert content.splitlines()[1] == '{"path": "张楚/孤独的人是可耻的.mp3"}'
+
+        response = self.client.get(
+            url,
+            {"output": "ndjson"},
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        assert response["Content-Encoding"] == "gzip"
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        assert len(content.splitlines()) == 3
+
+    async def test_files_ndjson_asgi(self):
+        url = reverse("task-files", args=[self.task.id])
+
+        response = await self.async_client.get(url, {"output": "ndjson"})
+
+        assert response.is_async
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        assert len(content.decode().splitlines()) == 3
+
+    def test_local_files_filtered(self):
+        touch_task_files(self.task)
+
+        response = self.client.get(
+            reverse("task-local-files", args=[self.task.id]),
+            {"glob": "*蚂蚁*"},
+        )
+
+        assert response.json() == [{"file": "张楚/蚂蚁蚂蚁.mp3", "size": 5120}]
+
     def test_local_files(self):
         response = self.client.get(
             reverse("task-local-files", args=[self.task.id]),
@@ -325,6 +426,16 @@ class TaskViewSetTestCase(APITestCase):
         assert response.json() == {str(id): "task deleted"}
         assert len(Task.objects.filter(pk=id)) == 0
 
+    def purge(self, **data):
+        response = self.client.post(reverse("task-purge"), data=data, format="json")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["status"] == "Pending"
+        call_command("runpurge", "--once")
+        response = self.client.get(
+            reverse("task-purge-job", args=[response.json()["id"]]),
+        )
+        return response.json()
+
     def test_purge(self):
         touch_task_files(self.task)
         self.task.delete()
@@ -335,9 +446,11 @@ class TaskViewSetTestCase(APITestCase):
             "123abc.def/张楚/蚂蚁蚂蚁.mp3",
         ]
 
-        response = self.client.post(reverse("task-purge"))
+        job = self.purge()
 
-        assert response.json() == {"done": True}
+        assert job["status"] == "Done"
+        assert job["total_dirs"] == 2
+        assert job["purged_dirs"] == 2
         assert sorted(list_files(settings.DATA_DIR)) == [
             "baidupcsleecher_trash/123abc.def.sample/张楚/孤独的人是可耻的.mp3",
             "baidupcsleecher_trash/123abc.def.sample/张楚/蚂蚁蚂蚁.mp3",
@@ -350,13 +463,12 @@ class TaskViewSetTestCase(APITestCase):
         self.task.delete()
         assert list_files(settings.DATA_DIR) != []
 
-        response = self.client.post(
-            reverse("task-purge"),
-            data={"move_to_trash": False},
-            format="json",
-        )
+        job = self.purge(move_to_trash=False)
 
-        assert response.json() == {"done": True}
+        assert job["status"] == "Done"
+        assert job["purged_dirs"] == 2
+        assert job["deleted_files"] == 4
+        assert job["deleted_size"] == 4 * 5 * 1024
         assert list_files(settings.DATA_DIR) == []
 
     def test_purge_nothing(self):
@@ -369,11 +481,76 @@ class TaskViewSetTestCase(APITestCase):
             "123abc.def/张楚/蚂蚁蚂蚁.mp3",
         ]
 
-        response = self.client.post(reverse("task-purge"))
+        job = self.purge()
 
-        assert response.json() == {"done": True}
+        assert job["status"] == "Done"
+        assert job["total_dirs"] == 0
         assert sorted(list_files(settings.DATA_DIR)) == files
 
+    def test_cancel_purge_job(self):
+        touch_task_files(self.task)
+        self.task.delete()
+        response = self.client.post(reverse("task-purge"))
+        url = reverse("task-purge-job", args=[response.json()["id"]])
+
+        response = self.client.delete(url)
+        call_command("runpurge", "--once")
+
+        assert response.json()["status"] == "Cancelled"
+        assert self.client.get(url).json()["status"] == "Cancelled"
+        assert len(list_files(settings.DATA_DIR)) == 4
+
+    @patch("task.models.PurgeJob.is_cancel_requested", return_value=True)
+    def test_cancel_running_purge_job(self, mock_is_cancel_requested):
+        touch_task_files(self.task)
+        self.task.delete()
+
+        with override_settings(PURGE_WORKERS=1, PROGRESS_INTERVAL_SECONDS=0):
+            job = self.purge(move_to_trash=False)
+
+        assert job["status"] == "Cancelled"
+        assert job["total_dirs"] == 2
+
+    def test_resume_abandoned_purge_job(self):
+        touch_task_files(self.task)
+        self.task.delete()
+        expired_at = timezone.now() - timedelta(days=1)
+        job = PurgeJob.objects.create(
+            status=PurgeJob.Status.RUNNING,
+            move_to_trash=False,
+            started_at=expired_at,
+            heartbeat_at=expired_at,
+            total_dirs=2,
+            purged_dirs=1,
+        )
+        cancelled = PurgeJob.objects.create(
+            status=PurgeJob.Status.RUNNING,
+            cancel_requested=True,
+            started_at=expired_at,
+        )
+        living = PurgeJob.objects.create(
+            status=PurgeJob.Status.RUNNING,
+            started_at=expired_at,
+            heartbeat_at=timezone.now(),
+        )
+
+        call_command("runpurge", "--once")
+
+        job.refresh_from_db()
+        assert job.status == PurgeJob.Status.DONE
+        assert job.total_dirs == 3
+        assert job.purged_dirs == 3
+        assert list_files(settings.DATA_DIR) == []
+        cancelled.refresh_from_db()
+        assert cancelled.status == PurgeJob.Status.CANCELLED
+        living.refresh_from_db()
+        assert living.status == PurgeJob.Status.RUNNING
+
+    def test_purge_job_not_found(self):
+        response = self.client.get(reverse("task-purge-job", args=[404]))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
     def test_download_percent(self):
         touch_task_files(self.task)
 
@@ -404,3 +581,355 @@ class TaskViewSetTestCase(APITestCase):
         response = self.client.get(url)
         data = response.json()
         assert data["current_progressing_stage"] == "waiting_permit_download"
+
+
+class ConditionalRequestTestCase(APITestCase):
+    def setUp(self):
+        self.task = Task.objects.create(shared_id="foo", shared_password="bar")
+
+    def test_retrieve_not_modified(self):
+        url = reverse("task-detail", kwargs={"pk": self.task.id})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        assert response.status_code == status.HTTP_200_OK
+        assert etag == f'"{self.task.id}.{self.task.version}"'
+        assert response["Last-Modified"]
+
+        with patch("task.views.TaskViewSet.get_object") as get_object:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        get_object.assert_not_called()
+
+        self.task.priority = 1
+        self.task.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_list_not_modified(self):
+        url = reverse("task-list")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.task.add_progress(1024)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        etag = response["ETag"]
+        Task.objects.create(shared_id="baz", shared_password="qux")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_retrieve_invalid_pk(self):
+        response = self.client.get(reverse("task-detail", args=["abc"]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_deleted(self):
+        Task.objects.create(shared_id="baz", shared_password="qux")
+        url = reverse("task-list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        assert not response.has_header("Last-Modified")
+
+        self.task.delete()
+        response = self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH=etag,
+            HTTP_IF_MODIFIED_SINCE=http_date(),
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 1
+
+    def test_local_files_deleted_not_cached(self):
+        url = reverse("task-detail", kwargs={"pk": self.task.id})
+        touch_file(path=self.task.data_path / "test.txt")
+        response = self.client.get(url)
+        assert response.json()["downloaded_size"] == 5120
+        etag = response["ETag"]
+
+        self.client.delete(reverse("task-local-files", args=[self.task.id]))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["downloaded_size"] == 0
+        response = self.client.get(reverse("task-list"))
+        assert response.json()[0]["downloaded_size"] == 0
+
+    def test_version_bumped(self):
+        version = self.task.version
+
+        self.task.save(update_fields=["priority"])
+        self.task.save_fields(progress_size=1)
+
+        assert Task.objects.get(pk=self.task.id).version == version + 2
+
+
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        for i in range(3):
+            Task.objects.create(shared_id=f"foo{i}", shared_password="bar")
+
+    @override_settings(TASK_PAGINATION="cursor")
+    def test_cursor_pagination(self):
+        with patch.object(TaskCursorPagination, "page_size", 2):
+            response = self.client.get(reverse("task-list"))
+
+            assert [t["shared_id"] for t in response.json()] == ["foo2", "foo1"]
+            assert 'rel="next"' in response["Link"]
+            assert 'rel="prev"' not in response["Link"]
+            assert response["ETag"]
+
+            next_url = response["Link"].split(">")[0].lstrip("<")
+            response = self.client.get(next_url)
+
+            assert [t["shared_id"] for t in response.json()] == ["foo0"]
+            assert 'rel="prev"' in response["Link"]
+            assert 'rel="next"' not in response["Link"]
+
+
+class TaskCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.task = Task.objects.create(shared_id="foo", shared_password="bar")
+
+    def test_documents_cached(self):
+        url = reverse("task-detail", kwargs={"pk": self.task.id})
+        document = self.client.get(url).json()
+
+        with patch("task.cache.TaskSerializer") as serializer:
+            assert self.client.get(url).json() == document
+            assert self.client.get(reverse("task-list")).json() == [document]
+        serializer.assert_not_called()
+
+        self.task.priority = 3
+        self.task.save()
+        assert self.client.get(url).json()["priority"] == 3
+        assert self.client.get(reverse("task-list")).json()[0]["priority"] == 3
+
+
+class BulkOperationTestCase(APITestCase):
+    def setUp(self):
+        self.tasks = [
+            Task.objects.create(shared_id=f"foo{i}", shared_password="bar")
+            for i in range(3)
+        ]
+        self.failed = self.tasks[0]
+        self.failed.status = Task.Status.FINISHED
+        self.failed.failed = True
+        self.failed.set_error("error_code: -65, message: 操作过于频繁，请您稍后重试")
+        self.failed.save()
+        self.url = reverse("task-bulk")
+
+    def test_resume_by_ids(self):
+        ids = [task.id for task in self.tasks[:2]] + [999]
+
+        response = self.client.post(
+            self.url,
+            {"operation": "resume", "ids": ids},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 2
+        assert response.json()["results"] == {
+            str(self.tasks[0].id): "done",
+            str(self.tasks[1].id): "skipped, not failed",
+            "999": "not found",
+        }
+        task = Task.objects.get(pk=self.failed.id)
+        assert not task.failed
+        assert task.status == Task.Status.INITED
+        assert task.retry_times == 1
+
+    def test_resume_by_filter(self):
+        response = self.client.post(
+            self.url,
+            {"operation": "resume", "filter": {"error_class": "throttled"}},
+            format="json",
+        )
+
+        assert response.json()["results"] == {str(self.failed.id): "done"}
+        assert not Task.objects.get(pk=self.failed.id).failed
+
+    def test_unknown_filter(self):
+        response = self.client.post(
+            self.url,
+            {"operation": "restart", "filter": {"statsu": "Inited"}},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Task.objects.filter(retry_times=0).count() == 3
+
+    def test_ids_or_filter_required(self):
+        response = self.client.post(self.url, {"operation": "restart"}, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_full_download_now(self):
+        response = self.client.post(
+            self.url,
+            {"operation": "full_download_now", "filter": {"status": "Inited"}},
+            format="json",
+        )
+
+        assert response.json()["count"] == 2
+        assert Task.objects.filter(full_download_now=True).count() == 2
+
+    @patch("task.views.get_baidupcs_client")
+    def test_erase(self, mock_get_baidupcs_client):
+        ids = [task.id for task in self.tasks[1:]]
+
+        response = self.client.post(
+            self.url,
+            {"operation": "erase", "ids": ids},
+            format="json",
+        )
+
+        assert response.json()["count"] == 2
+        assert list(Task.objects.values_list("id", flat=True)) == [self.failed.id]
+        mock_get_baidupcs_client.return_value.delete.assert_called_once_with(
+            *[task.remote_path for task in self.tasks[1:]],
+        )
+
+
+class BulkCreateTestCase(APITestCase):
+    def setUp(self):
+        Task.objects.create(
+            shared_link="https://pan.baidu.com/s/123abc?pwd=def",
+            shared_id="123abc",
+            shared_password="def",
+        )
+        self.url = reverse("task-bulk-create")
+
+    def test_bulk_create_json(self):
+        response = self.client.post(
+            self.url,
+            [
+                "https://pan.baidu.com/s/1abc?pwd=1234",
+                {"shared_link": "https://pan.baidu.com/s/2abc", "priority": 3},
+                "https://pan.baidu.com/s/123abc",
+                "https://pan.baidu.com/s/1abc",
+                "invalid",
+            ],
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] == 2
+        assert response.json()["duplicate"] == 2
+        assert response.json()["invalid"] == 1
+        results = response.json()["results"]
+        assert [r["status"] for r in results] == [
+            "created",
+            "created",
+            "duplicate",
+            "duplicate",
+            "invalid",
+        ]
+        task = Task.objects.get(pk=results[0]["id"])
+        assert task.shared_id == "1abc"
+        assert task.shared_password == "1234"
+        assert Task.objects.get(shared_id="2abc").priority == 3
+
+    def test_bulk_create_plain_text(self):
+        response = self.client.post(
+            self.url,
+            "https://pan.baidu.com/s/1abc 1234\n"
+            '{"shared_link": "https://pan.baidu.com/s/2abc"}\n'
+            "https://pan.baidu.com/s/123abc\n",
+            content_type="application/x-ndjson",
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["created"] == 2
+        assert response.json()["duplicate"] == 1
+        assert Task.objects.get(shared_id="1abc").shared_password == "1234"
+
+    def test_bulk_create_allow_duplicates(self):
+        response = self.client.post(
+            self.url + "?skip_duplicates=false",
+            "https://pan.baidu.com/s/123abc",
+            content_type="text/plain",
+        )
+
+        assert response.json()["created"] == 1
+        assert Task.objects.filter(shared_id="123abc").count() == 2
+
+    def test_bulk_create_long_password(self):
+        response = self.client.post(
+            self.url,
+            "https://pan.baidu.com/s/1abc 12345",
+            content_type="text/plain",
+        )
+
+        result = response.json()["results"][0]
+        assert result["status"] == "invalid"
+        assert result["error"].startswith("shared_password: ")
+
+    def test_bulk_create_invalid_json(self):
+        response = self.client.post(
+            self.url,
+            "[invalid",
+            content_type="application/json",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class StatsTestCase(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.done = Task.objects.create(
+            shared_id="done",
+            status=Task.Status.FINISHED,
+            started_at=now,
+            transfer_completed_at=now + timedelta(seconds=10),
+            sample_downloaded_at=now + timedelta(seconds=20),
+            full_downloaded_at=now + timedelta(seconds=60),
+            total_files=2,
+            total_size=1000,
+        )
+        self.queued = Task.objects.create(shared_id="queued", total_size=300)
+        self.failed = Task.objects.create(
+            shared_id="failed",
+            status=Task.Status.FINISHED,
+            failed=True,
+            total_size=50,
+        )
+        self.failed.set_error("BaiduPCS._request")
+        self.failed.save()
+
+    def test_stats(self):
+        response = self.client.get(reverse("task-stats"))
+
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        assert stats["tasks"] == 3
+        assert stats["failed"] == 1
+        assert stats["failure_rate"] == 1 / 3
+        assert stats["total_size"] == 1350
+        assert stats["queued_size"] == 300
+        assert stats["downloaded_size"] == 1000
+        assert stats["status"] == {
+            "Finished": {"count": 2, "total_size": 1050},
+            "Inited": {"count": 1, "total_size": 300},
+        }
+        assert stats["failures"] == {"network": {"count": 1, "recoverable": 1}}
+        assert stats["average_seconds"]["transferring"] == 10
+        assert stats["average_seconds"]["downloading"] == 40
+
+    def test_stats_time_window(self):
+        Task.objects.filter(pk=self.done.id).update(
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        response = self.client.get(reverse("task-stats"), {"since": since})
+
+        assert response.json()["tasks"] == 2
+        assert response.json()["downloaded_size"] == 0
+        assert response.json()["average_seconds"]["transferring"] is None
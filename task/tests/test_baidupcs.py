@@ -144,6 +144,32 @@ class TestSaveShared(unittest.TestCase):
         self.client.api.exists.assert_called_with(remotedir)
         self.client.api.transfer_shared_paths.assert_called()
 
+    def test_save_shared_callback_transferred(self):
+        shared_path = PcsSharedPath(
+            fs_id=3,
+            path="/leecher/a.wav",
+            size=1024,
+            is_dir=False,
+            is_file=True,
+            md5="beef",
+            uk=123,
+            share_id=4,
+            bdstoken="ffee",
+        )
+        self.client.api.shared_paths.return_value = [shared_path]
+        self.client.api.exists.return_value = True
+        self.client.api.list.return_value = []
+        callback = MagicMock()
+
+        save_shared(
+            self.client,
+            "https://pan.baidu.com/s/1transferred",
+            "/test_remote_dir",
+            callback_transferred=callback,
+        )
+
+        callback.assert_called_once_with(shared_path, "/test_remote_dir")
+
     def test_save_shared_expired(self):
         shared_url = "https://pan.baidu.com/s/expired"
         self.client.api.exists.return_value = False
@@ -0,0 +1,143 @@
+from datetime import timedelta
+from json import loads
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.test import TestCase
+from django.utils import timezone
+from requests import HTTPError
+
+from ..callback import callback
+from ..callback import send_callbacks
+from ..models import CallbackEvent
+from ..models import Task
+
+
+class CallbackTestCase(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(
+            shared_id="foo",
+            shared_password="foo",
+            callback="http://host/notify",
+        )
+        self.session = MagicMock()
+
+    def test_callback_saved_to_outbox(self):
+        event = callback(self.task, "link_saved")
+
+        assert event.url == "http://host/notify"
+        assert loads(event.payload)["action"] == "link_saved"
+        assert list(CallbackEvent.filter_due()) == [event]
+
+    def test_compact_payload(self):
+        self.task.set_files([{"path": "a", "is_file": True, "size": 10}])
+        self.task.file_listed_at = self.task.created_at
+        self.task.save()
+
+        payload = loads(callback(self.task, "files_ready").payload)
+
+        assert payload["version"] == 1
+        assert payload["task"]["id"] == self.task.id
+        assert payload["task"]["total_size"] == 10
+        assert "captcha" not in payload["task"]
+        assert "downloaded_size" not in payload["task"]
+        assert list(payload["delta"]) == ["file_listed_at"]
+
+    def test_full_payload(self):
+        self.task.callback_full = True
+
+        payload = loads(callback(self.task, "link_saved").payload)
+
+        assert payload["version"] == 1
+        assert "downloaded_size" in payload["task"]
+        assert payload["delta"] == {"transfer_completed_at": None}
+
+    def test_no_callback_url(self):
+        self.task.callback = ""
+
+        assert callback(self.task, "link_saved") is None
+        assert CallbackEvent.objects.count() == 0
+
+    def test_send_callbacks(self):
+        callback(self.task, "link_saved")
+        callback(self.task, "files_ready")
+
+        assert send_callbacks(self.session) == 2
+
+        assert self.session.post.call_count == 2
+        kwargs = self.session.post.call_args.kwargs
+        assert kwargs["json"]["action"] == "files_ready"
+        assert kwargs["timeout"] > 0
+        assert list(CallbackEvent.filter_due()) == []
+
+    @override_settings(CALLBACK_BATCH_SIZE=10)
+    def test_send_callbacks_in_batch(self):
+        callback(self.task, "link_saved")
+        callback(self.task, "files_ready")
+
+        assert send_callbacks(self.session) == 2
+
+        assert self.session.post.call_count == 1
+        body = self.session.post.call_args.kwargs["json"]
+        assert [i["action"] for i in body["events"]] == ["link_saved", "files_ready"]
+
+    def test_send_callbacks_failed(self):
+        first = callback(self.task, "link_saved")
+        second = callback(self.task, "files_ready")
+        self.session.post.return_value.raise_for_status.side_effect = HTTPError("500")
+
+        assert send_callbacks(self.session) == 0
+
+        assert self.session.post.call_count == 1
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert first.attempts == 1
+        assert first.message == "500"
+        assert not first.delivered_at
+        assert second.attempts == 0
+        assert second.next_attempt_at == first.next_attempt_at
+        assert list(CallbackEvent.filter_due()) == []
+
+    def test_keep_order_beyond_limit(self):
+        first = callback(self.task, "link_saved")
+        CallbackEvent.objects.filter(pk=first.pk).update(
+            next_attempt_at=timezone.now() + timedelta(minutes=1),
+        )
+        callback(self.task, "files_ready")
+        other = Task.objects.create(shared_id="bar", callback="http://other/notify")
+        third = callback(other, "link_saved")
+
+        assert list(CallbackEvent.filter_due()) == [third]
+
+    def test_claim_once(self):
+        callback(self.task, "link_saved")
+        events = list(CallbackEvent.filter_due())
+
+        assert CallbackEvent.claim(events) == events
+        assert CallbackEvent.claim(events) == []
+        assert list(CallbackEvent.filter_due()) == []
+        assert send_callbacks(self.session) == 0
+
+    @override_settings(CALLBACK_RETRY_LIMIT=1)
+    def test_give_up_callback(self):
+        event = callback(self.task, "link_saved")
+        self.session.post.side_effect = ConnectionError("timeout")
+
+        send_callbacks(self.session)
+
+        event.refresh_from_db()
+        assert event.failed
+        assert list(CallbackEvent.filter_due()) == []
+
+    @patch("task.management.commands.runcallback.get_session")
+    def test_run_command(self, mock_get_session):
+        mock_get_session.return_value = self.session
+        event = callback(self.task, "link_saved")
+
+        call_command("runcallback", "--once")
+
+        event.refresh_from_db()
+        assert event.delivered_at
+        assert self.session.post.call_count == 1
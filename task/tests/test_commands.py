@@ -1,3 +1,6 @@
+from datetime import timedelta
+from io import StringIO
+from tempfile import NamedTemporaryFile
 from unittest import mock
 
 from baidupcs_py.baidupcs import api
@@ -6,8 +9,10 @@ from django.conf import settings
 from django.core.management import call_command
 from django.test import override_settings
 from django.test import TestCase
+from django.utils import timezone
 from requests import Session
 
+from task.leecher import run_stage
 from task.management.commands.runresume import Command as ResumeCommand
 from task.models import Task
 
@@ -72,6 +77,118 @@ class TransferCommandTest(TestCase):
         assert task.status == Task.Status.TRANSFERRED
 
 
+class PipelineCommandTest(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(
+            shared_id="foo",
+            shared_password="foo",
+            full_download_now=True,
+        )
+
+    @mock.patch("task.baidupcs.save_shared", return_value=None)
+    @mock.patch.object(api.BaiduPCS, "access_shared", return_value={})
+    @mock.patch.object(BaiduPCSApi, "list", return_value={})
+    @mock.patch(
+        "task.utils.parse_shared_link",
+        return_value={"id": "foo", "password": "foo"},
+    )
+    @mock.patch.object(Session, "request", side_effect=mocked_requests)
+    @mock.patch("requests.get", side_effect=mocked_requests)
+    @mock.patch("requests.post", side_effect=mocked_requests)
+    @override_settings(PAN_BAIDU_BDUSS="xyb")
+    @override_settings(PAN_BAIDU_COOKIES="BAIDUID=x; BDUSS=y; STOKEN=b")
+    @override_settings(PIPELINE_STAGES=True)
+    def test_pipeline(
+        self,
+        mock_post,
+        mock_get,
+        mock_sget,
+        mock_parse,
+        mock_list,
+        mock_access,
+        mock_save,
+    ):
+        call_command("runtransfer", "--once")
+
+        task = Task.objects.get(pk=self.task.id)
+        assert task.status == Task.Status.FINISHED
+        assert task.sample_downloaded_at
+        assert task.full_downloaded_at
+
+    @mock.patch("task.baidupcs.save_shared", return_value=None)
+    @mock.patch.object(api.BaiduPCS, "access_shared", return_value={})
+    @mock.patch.object(BaiduPCSApi, "list", return_value={})
+    @mock.patch(
+        "task.utils.parse_shared_link",
+        return_value={"id": "foo", "password": "foo"},
+    )
+    @mock.patch.object(Session, "request", side_effect=mocked_requests)
+    @mock.patch("requests.get", side_effect=mocked_requests)
+    @mock.patch("requests.post", side_effect=mocked_requests)
+    @override_settings(PAN_BAIDU_BDUSS="xyb")
+    @override_settings(PAN_BAIDU_COOKIES="BAIDUID=x; BDUSS=y; STOKEN=b")
+    @override_settings(PIPELINE_STAGES=True)
+    def test_pipeline_wait_for_permit(
+        self,
+        mock_post,
+        mock_get,
+        mock_sget,
+        mock_parse,
+        mock_list,
+        mock_access,
+        mock_save,
+    ):
+        self.task.full_download_now = False
+        self.task.save()
+
+        call_command("runtransfer", "--once")
+
+        task = Task.objects.get(pk=self.task.id)
+        assert task.status == Task.Status.SAMPLING_DOWNLOADED
+        assert task.full_downloaded_at is None
+
+
+class RunStageTest(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(shared_id="foo", shared_password="foo")
+
+    @override_settings(PIPELINE_STAGES=True)
+    def test_skip_taken_task(self):
+        stage = mock.Mock()
+        taken = Task.objects.get(pk=self.task.id)
+        taken.claim()
+
+        assert not run_stage(mock.Mock(), self.task, stage)
+        stage.assert_not_called()
+
+    def test_release_after_stage(self):
+        stage = mock.Mock()
+
+        assert run_stage(mock.Mock(), self.task, stage)
+
+        stage.assert_called_once()
+        assert Task.objects.get(pk=self.task.id).heartbeat_at is None
+
+    @override_settings(PIPELINE_STAGES=True)
+    @mock.patch("task.leecher.admit", return_value=True)
+    def test_permit_while_sampling(self, mock_admit):
+        Task.objects.filter(pk=self.task.id).update(status=Task.Status.TRANSFERRED)
+        self.task.refresh_from_db()
+        client = mock.Mock()
+
+        def permit(*args, **kwargs):
+            Task.objects.filter(pk=self.task.id).update(full_download_now=True)
+
+        client.leech.side_effect = permit
+
+        assert run_stage(client, self.task, mock.Mock())
+
+        task = Task.objects.get(pk=self.task.id)
+        assert task.full_download_now
+        assert task.status == Task.Status.FINISHED
+        assert client.leech.call_count == 2
+
+
 class SamplingDownloaderCommandTest(TestCase):
     def setUp(self):
         self.task = Task.objects.create(shared_id="foo", shared_password="foo")
@@ -144,6 +261,7 @@ class LeecherCommandTest(TestCase):
 
         task = Task.objects.get(pk=self.task.id)
         assert task.status == Task.Status.FINISHED
+        assert task.heartbeat_at is None
 
 
 class ResumeCommandTest(TestCase):
@@ -154,7 +272,7 @@ class ResumeCommandTest(TestCase):
         self.task.transfer_completed_at = self.task.created_at
         self.task.sample_downloaded_at = self.task.created_at
         self.task.failed = True
-        self.task.message = "BaiduPCS._request"
+        self.task.set_error("BaiduPCS._request")
         self.task.save()
 
     def test_resume(self):
@@ -168,7 +286,7 @@ class ResumeCommandTest(TestCase):
         assert task.retry_times == 1
 
     def test_resume_not_recoverable_task(self):
-        self.task.message = "error_code: 105,"
+        self.task.set_error("error_code: 105,")
         self.task.save()
         assert self.task.retry_times == 0
 
@@ -205,3 +323,86 @@ class ResumeCommandTest(TestCase):
         assert task.status == Task.Status.TRANSFERRED
         assert not task.failed
         assert task.retry_times == 1
+
+    def test_reap_stuck_task(self):
+        stuck = Task.objects.create(shared_id="bar", shared_password="bar")
+        stuck.status = Task.Status.STARTED
+        stuck.started_at = stuck.created_at - timedelta(days=1)
+        stuck.heartbeat_at = stuck.started_at
+        stuck.save()
+
+        call_command("runresume", "--once")
+
+        task = Task.objects.get(pk=stuck.id)
+        assert task.status == Task.Status.INITED
+        assert not task.failed
+        assert task.heartbeat_at is None
+
+    def test_resume_not_due_task(self):
+        self.task.next_retry_at = timezone.now() + timedelta(minutes=5)
+        self.task.save()
+
+        ResumeCommand().resume_once()
+
+        task = Task.objects.get(pk=self.task.id)
+        assert task.failed
+        assert task.retry_times == 0
+
+    def test_resume_due_task(self):
+        self.task.next_retry_at = timezone.now() - timedelta(seconds=1)
+        self.task.save()
+
+        ResumeCommand().resume_once()
+
+        task = Task.objects.get(pk=self.task.id)
+        assert not task.failed
+        assert task.next_retry_at is None
+        assert task.retry_times == 1
+
+
+class ImportLinksCommandTest(TestCase):
+    def test_import(self):
+        Task.objects.create(shared_id="123abc", shared_password="def")
+        with NamedTemporaryFile("w", suffix=".txt") as f:
+            f.write(
+                "# links from crawler\n"
+                "https://pan.baidu.com/s/1abc?pwd=1234\n"
+                "https://pan.baidu.com/s/123abc\n"
+                "invalid\n",
+            )
+            f.flush()
+            stdout = StringIO()
+
+            call_command("importlinks", f.name, stdout=stdout, stderr=StringIO())
+
+        assert "created: 1, duplicate: 1, invalid: 1" in stdout.getvalue()
+        assert Task.objects.get(shared_id="1abc").shared_password == "1234"
+
+    def test_import_invalid_items(self):
+        with NamedTemporaryFile("w", suffix=".ndjson") as f:
+            f.write(
+                '{"shared_link": "https://pan.baidu.com/s/1abc", "priority": "high"}\n'
+                '{"shared_link": "https://pan.baidu.com/s/2abc", "callback": ["a"]}\n'
+                '{"shared_link": "https://pan.baidu.com/s/3abc"\n'
+                '{"shared_link": "https://pan.baidu.com/s/4abc", "priority": 3}\n',
+            )
+            f.flush()
+            stdout = StringIO()
+            stderr = StringIO()
+
+            call_command("importlinks", f.name, stdout=stdout, stderr=stderr)
+
+        assert "created: 1, duplicate: 0, invalid: 3" in stdout.getvalue()
+        assert "item 0: priority: " in stderr.getvalue()
+        assert "item 2: invalid json" in stderr.getvalue()
+        assert Task.objects.get().priority == 3
+
+    @override_settings(DEDUPE_TASKS=True)
+    @mock.patch("task.management.commands.importlinks.import_links", return_value=[])
+    def test_import_no_dedupe(self, mock_import):
+        with NamedTemporaryFile("w", suffix=".txt") as f:
+            call_command("importlinks", f.name, "--no-dedupe", stdout=StringIO())
+            assert mock_import.call_args.kwargs["dedupe"] is False
+
+            call_command("importlinks", f.name, stdout=StringIO())
+            assert mock_import.call_args.kwargs["dedupe"] is True
@@ -0,0 +1,83 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..baidupcs import BaiduPCSClient
+from ..content import ContentIndex
+from ..models import ContentFile
+from ..models import Task
+
+FILES = [
+    {
+        "path": "dir/song.mp3",
+        "is_dir": False,
+        "is_file": True,
+        "size": 5,
+        "md5": "5d41402abc4b2a76b9719d911017c592",
+    },
+]
+
+
+def fake_download_url(local_path: Path, url: str, headers, limit=0, **kwargs):
+    local_path.write_text("hello")
+    return 5
+
+
+@patch("task.baidupcs.download_url", side_effect=fake_download_url)
+@patch("task.baidupcs.BaiduPCSClient.list_files", return_value=FILES)
+class ContentIndexTestCase(TestCase):
+    def setUp(self):
+        self.client = BaiduPCSClient("bduss", {"BDUSS": "bduss"}, api=MagicMock())
+        self.task1 = Task.objects.create(shared_id="share1", shared_password="pwd")
+        self.task2 = Task.objects.create(shared_id="share2", shared_password="pwd")
+
+    def leech(self, task: Task) -> None:
+        self.client.leech(
+            "/remote",
+            task.data_path,
+            content_index=ContentIndex(task),
+        )
+
+    def test_link_downloaded_file(self, mock_list, mock_download):
+        self.leech(self.task1)
+        self.leech(self.task2)
+
+        assert mock_download.call_count == 1
+        source = self.task1.data_path / "dir/song.mp3"
+        target = self.task2.data_path / "dir/song.mp3"
+        assert target.read_text() == "hello"
+        assert target.stat().st_ino == source.stat().st_ino
+        assert ContentFile.objects.count() == 2
+
+    def test_stale_entry_removed(self, mock_list, mock_download):
+        self.leech(self.task1)
+        (self.task1.data_path / "dir/song.mp3").unlink()
+
+        self.leech(self.task2)
+
+        assert mock_download.call_count == 2
+        assert list(ContentFile.objects.values_list("task", flat=True)) == [
+            self.task2.id,
+        ]
+
+    def test_samples_not_linked(self, mock_list, mock_download):
+        self.leech(self.task1)
+
+        self.client.leech(
+            "/remote",
+            self.task2.sample_data_path,
+            sample_size=2,
+            content_index=ContentIndex(self.task2),
+        )
+
+        assert mock_download.call_count == 2
+        assert ContentFile.objects.count() == 1
+
+    @patch("task.content.link_file", return_value=False)
+    def test_download_if_not_linkable(self, mock_link, mock_list, mock_download):
+        self.leech(self.task1)
+        self.leech(self.task2)
+
+        assert mock_download.call_count == 2
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..importer import import_links
+from ..models import CallbackEvent
+from ..models import Task
+from ..stats import get_stats
+from .test_api import touch_file
+
+LINK = "https://pan.baidu.com/s/123abc?pwd=def"
+
+
+class DedupeTestCase(APITestCase):
+    def setUp(self):
+        self.original = Task.objects.create(
+            shared_link=LINK,
+            shared_id="123abc",
+            shared_password="def",
+        )
+        self.original.set_files(
+            [{"path": "a.mp3", "is_dir": False, "is_file": True, "size": 5}],
+        )
+        self.original.status = Task.Status.FINISHED
+        self.original.full_downloaded_at = timezone.now()
+        self.original.save()
+        touch_file(self.original.data_path / "a.mp3")
+
+    def create(self, **data):
+        data.setdefault("shared_link", LINK)
+        response = self.client.post(reverse("task-list"), data, format="json")
+        assert response.status_code == 201
+        return response.json()
+
+    def test_fast_forward(self):
+        data = self.create(dedupe=True, callback="http://host/notify")
+
+        assert data["status"] == "Finished"
+        assert data["duplicate_of"] == self.original.id
+        assert data["total_files"] == 1
+        assert data["largest_file"] == "a.mp3"
+        assert data["finished_at"]
+        event = CallbackEvent.objects.get()
+        assert event.action == "files_downloaded"
+        assert event.task_id == data["id"]
+
+    def test_no_dedupe_by_default(self):
+        data = self.create()
+
+        assert data["status"] == "Inited"
+        assert data["duplicate_of"] is None
+
+    @override_settings(DEDUPE_TASKS=True)
+    def test_dedupe_by_settings(self):
+        assert self.create()["duplicate_of"] == self.original.id
+
+    def test_local_files_missing(self):
+        (self.original.data_path / "a.mp3").unlink()
+        self.original.data_path.rmdir()
+
+        assert self.create(dedupe=True)["status"] == "Inited"
+
+    def test_original_too_old(self):
+        self.original.full_downloaded_at = timezone.now() - timedelta(days=30)
+        self.original.save()
+
+        assert self.create(dedupe=True)["status"] == "Inited"
+
+    def test_other_password(self):
+        data = self.create(shared_link="https://pan.baidu.com/s/123abc?pwd=xyz")
+
+        assert data["status"] == "Inited"
+
+    def test_chain_to_original(self):
+        first = self.create(dedupe=True)
+        Task.objects.filter(pk=self.original.pk).update(
+            full_downloaded_at=timezone.now() - timedelta(hours=1),
+        )
+
+        second = self.create(dedupe=True)
+
+        assert first["duplicate_of"] == self.original.id
+        assert second["duplicate_of"] == self.original.id
+
+    def test_durations_of_duplicate(self):
+        Task.objects.filter(pk=self.original.pk).delete()
+        original = Task.objects.create(
+            shared_link=LINK,
+            shared_id="123abc",
+            shared_password="def",
+            status=Task.Status.FINISHED,
+            transfer_completed_at=timezone.now() - timedelta(hours=1),
+            full_downloaded_at=timezone.now() - timedelta(hours=1),
+        )
+        data = self.create(dedupe=True)
+        assert data["duplicate_of"] == original.id
+
+        stats = get_stats(Task.objects.filter(pk=data["id"]))
+
+        assert stats["average_seconds"]["transferring"] >= 0
+        assert stats["average_seconds"]["total"] >= 0
+
+    @patch("task.views.get_baidupcs_client")
+    def test_erase_original(self, mock_get_client):
+        data = self.create(dedupe=True)
+
+        response = self.client.delete(reverse("task-erase", args=[self.original.id]))
+
+        assert response.json() == {
+            str(self.original.id): "task deleted, "
+            "files kept for other tasks of the same share",
+        }
+        mock_get_client.return_value.delete.assert_not_called()
+        duplicate = Task.objects.get(pk=data["id"])
+        assert duplicate.duplicate_of is None
+        assert (duplicate.data_path / "a.mp3").exists()
+
+        self.client.delete(reverse("task-erase", args=[duplicate.id]))
+
+        assert not duplicate.data_path.exists()
+        mock_get_client.return_value.delete.assert_called_once_with(
+            duplicate.remote_path,
+        )
+
+    @patch("task.views.get_baidupcs_client")
+    def test_bulk_erase(self, mock_get_client):
+        data = self.create(dedupe=True)
+        url = reverse("task-bulk")
+
+        self.client.post(url, {"operation": "erase", "ids": [data["id"]]})
+
+        assert (self.original.data_path / "a.mp3").exists()
+        mock_get_client.return_value.delete.assert_not_called()
+
+        self.client.post(url, {"operation": "erase", "ids": [self.original.id]})
+
+        assert not self.original.data_path.exists()
+        mock_get_client.return_value.delete.assert_called_once_with(
+            self.original.remote_path,
+        )
+
+    def test_import(self):
+        results = list(
+            import_links([LINK, "https://pan.baidu.com/s/other"], False, dedupe=True),
+        )
+
+        assert results[0]["duplicate_of"] == self.original.id
+        assert "duplicate_of" not in results[1]
+        task = Task.objects.get(pk=results[0]["id"])
+        assert task.status == Task.Status.FINISHED
+        assert task.total_size == 5
+
+    def test_import_skip_duplicates(self):
+        results = list(import_links([LINK, LINK], dedupe=True))
+
+        assert results[0]["duplicate_of"] == self.original.id
+        assert results[1]["status"] == "duplicate"
+        task = Task.objects.get(pk=results[0]["id"])
+        assert task.status == Task.Status.FINISHED
@@ -0,0 +1,206 @@
+import os
+from datetime import timedelta
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+from django.test import override_settings
+from django.test import TestCase
+from django.utils import timezone
+
+from ..disk import admit
+from ..disk import filter_evictable
+from ..disk import get_local_size
+from ..disk import get_reserved_size
+from ..disk import InsufficientDiskSpace
+from ..leecher import leech
+from ..models import ContentFile
+from ..models import Task
+from .test_api import touch_file
+
+GB = 1024**3
+
+
+def disk_usage(total: int = 100 * GB, free: int = 50 * GB) -> Mock:
+    return Mock(total=total, free=free)
+
+
+@patch("task.disk.shutil.disk_usage", return_value=disk_usage())
+class AdmissionTestCase(TestCase):
+    def create_task(self, shared_id: str, total_size: int, **fields) -> Task:
+        fields.setdefault("status", Task.Status.SAMPLING_DOWNLOADED)
+        return Task.objects.create(
+            shared_id=shared_id,
+            shared_password="pwd",
+            total_size=total_size,
+            full_download_now=True,
+            **fields,
+        )
+
+    def test_admit(self, mock_disk_usage):
+        task = self.create_task("new", 10 * GB)
+
+        assert admit(task)
+
+    def test_in_flight_reserved(self, mock_disk_usage):
+        running = self.create_task("running", 30 * GB, progress_size=5 * GB)
+        running.heartbeat(force=True)
+        task = self.create_task("new", 30 * GB)
+
+        assert get_reserved_size(exclude=task) == 25 * GB
+        assert not admit(task)
+
+        running.release()
+        assert admit(task)
+
+    @override_settings(DISK_RESERVED_SIZE=45 * GB)
+    def test_reserved_free_space(self, mock_disk_usage):
+        task = self.create_task("new", 10 * GB)
+
+        assert not admit(task)
+
+    def test_larger_than_disk(self, mock_disk_usage):
+        task = self.create_task("huge", 200 * GB)
+
+        with pytest.raises(InsufficientDiskSpace):
+            admit(task)
+
+    def test_leech_waits_for_space(self, mock_disk_usage):
+        task = self.create_task("new", 60 * GB)
+        client = Mock()
+
+        leech(client, task)
+
+        client.leech.assert_not_called()
+        task.refresh_from_db()
+        assert task.status == Task.Status.SAMPLING_DOWNLOADED
+        assert not task.failed
+
+    def test_leech_evicted_again(self, mock_disk_usage):
+        task = self.create_task("evicted", 10 * GB, local_evicted_at=timezone.now())
+        client = Mock()
+
+        leech(client, task)
+
+        client.leech.assert_called_once()
+        task.refresh_from_db()
+        assert task.full_downloaded_at
+        assert task.local_evicted_at is None
+
+    def test_leech_fails_if_never_fits(self, mock_disk_usage):
+        task = self.create_task("huge", 200 * GB)
+        client = Mock()
+
+        leech(client, task)
+
+        client.leech.assert_not_called()
+        task.refresh_from_db()
+        assert task.failed
+        assert task.error_class == "disk_full"
+        assert not task.recoverable
+
+
+@override_settings(DATA_DIR_QUOTA=100)
+@patch("task.disk.shutil.disk_usage", return_value=disk_usage())
+class QuotaEvictionTestCase(TestCase):
+    def create_finished(self, shared_id: str, accessed_days_ago: int) -> Task:
+        now = timezone.now()
+        task = Task.objects.create(
+            shared_id=shared_id,
+            shared_password="pwd",
+            status=Task.Status.FINISHED,
+            total_size=40,
+            full_downloaded_at=now - timedelta(days=10),
+            accessed_at=now - timedelta(days=accessed_days_ago),
+        )
+        touch_file(task.data_path / "file")
+        return task
+
+    def test_evict_least_recently_accessed(self, mock_disk_usage):
+        old = self.create_finished("old", accessed_days_ago=5)
+        recent = self.create_finished("recent", accessed_days_ago=1)
+        task = Task.objects.create(
+            shared_id="new",
+            shared_password="pwd",
+            status=Task.Status.SAMPLING_DOWNLOADED,
+            total_size=50,
+        )
+
+        assert admit(task)
+
+        old.refresh_from_db()
+        recent.refresh_from_db()
+        assert old.local_evicted_at
+        assert not old.data_path.exists()
+        assert recent.local_evicted_at is None
+        assert recent.data_path.exists()
+
+    def test_touch_keeps_version(self, mock_disk_usage):
+        task = self.create_finished("task", accessed_days_ago=5)
+        version = task.version
+
+        task.touch()
+
+        task.refresh_from_db()
+        assert task.version == version
+        assert task.accessed_at > timezone.now() - timedelta(minutes=1)
+
+    def create_duplicate(self, original: Task, accessed_days_ago: int) -> Task:
+        now = timezone.now()
+        return Task.objects.create(
+            shared_id=original.shared_id,
+            shared_password=original.shared_password,
+            status=Task.Status.FINISHED,
+            total_size=original.total_size,
+            full_downloaded_at=now,
+            accessed_at=now - timedelta(days=accessed_days_ago),
+            duplicate_of=original,
+        )
+
+    def test_shared_dir_counted_once(self, mock_disk_usage):
+        original = self.create_finished("original", accessed_days_ago=5)
+        self.create_duplicate(original, accessed_days_ago=5)
+
+        assert get_local_size() == 40
+
+    def test_hardlinks_counted_once(self, mock_disk_usage):
+        first = self.create_finished("first", accessed_days_ago=5)
+        second = self.create_finished("second", accessed_days_ago=5)
+        source = first.data_path / "file"
+        (second.data_path / "file").unlink()
+        os.link(source, second.data_path / "file")
+        for task in [first, second]:
+            ContentFile.objects.create(
+                task=task,
+                md5="md5",
+                size=40,
+                path=f"{task.path}/file",
+            )
+
+        assert get_local_size() == 40
+
+    def test_evict_shared_dir(self, mock_disk_usage):
+        original = self.create_finished("original", accessed_days_ago=5)
+        duplicate = self.create_duplicate(original, accessed_days_ago=5)
+        recent = self.create_finished("recent", accessed_days_ago=1)
+        task = Task.objects.create(
+            shared_id="new",
+            shared_password="pwd",
+            status=Task.Status.SAMPLING_DOWNLOADED,
+            total_size=50,
+        )
+
+        assert admit(task)
+
+        duplicate.refresh_from_db()
+        assert duplicate.local_evicted_at
+        assert not original.data_path.exists()
+        assert Task.objects.get(pk=recent.pk).local_evicted_at is None
+
+    def test_shared_dir_recently_accessed(self, mock_disk_usage):
+        original = self.create_finished("original", accessed_days_ago=5)
+        self.create_duplicate(original, accessed_days_ago=0)
+        old = self.create_finished("old", accessed_days_ago=3)
+
+        assert [task.shared_id for task in filter_evictable()][0] == "old"
+        assert old.data_path.exists()
@@ -0,0 +1,55 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..events import format_cursor
+from ..models import Task
+
+
+async def read_events(response):
+    content = b"".join([chunk async for chunk in response.streaming_content])
+    events = []
+    for message in content.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in message.splitlines() if ": " in line
+        )
+        if "data" in fields:
+            events.append(fields)
+    return events
+
+
+class TaskEventsTestCase(TestCase):
+    def setUp(self):
+        self.task = Task.objects.create(shared_id="foo", shared_password="bar")
+        self.other = Task.objects.create(shared_id="baz", shared_password="qux")
+        self.url = reverse("task-events")
+
+    async def test_snapshot_of_tasks(self):
+        response = await self.async_client.get(
+            self.url,
+            {"ids": str(self.task.id), "timeout": 0},
+        )
+
+        assert response["Content-Type"] == "text/event-stream"
+        events = await read_events(response)
+        assert len(events) == 1
+        assert f'"id": {self.task.id}' in events[0]["data"]
+        assert '"status": "Inited"' in events[0]["data"]
+        assert events[0]["id"] == format_cursor((self.task.updated_at, self.task.id))
+
+    async def test_resume_from_last_event(self):
+        cursor = format_cursor((self.task.updated_at, self.task.id))
+
+        response = await self.async_client.get(
+            self.url,
+            {"timeout": 0},
+            headers={"Last-Event-ID": cursor},
+        )
+
+        events = await read_events(response)
+        assert len(events) == 1
+        assert f'"id": {self.other.id}' in events[0]["data"]
+
+    async def test_no_changes(self):
+        response = await self.async_client.get(self.url, {"timeout": 0})
+
+        assert await read_events(response) == []
@@ -1,6 +1,16 @@
+from datetime import timedelta
+from time import sleep
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import override_settings
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.utils import timezone
 
+from ..leecher import lease
 from ..models import Task
+from .test_api import touch_file
 
 
 class TaskTestCase(TestCase):
@@ -220,11 +230,243 @@ class TaskTestCase(TestCase):
         assert not self.task.recoverable
 
         self.task.failed = True
-        self.task.message = "BaiduPCS._request"
+        self.task.set_error("BaiduPCS._request")
         assert self.task.recoverable
+        assert self.task.error_class == "network"
 
-        self.task.message = "error_code: 105,"
+        self.task.set_error("error_code: 105,")
         assert not self.task.recoverable
+        assert self.task.error_code == 105
 
-        self.task.message = "unknown error"
+        self.task.set_error("unknown error")
         assert not self.task.recoverable
+        assert self.task.error_class == "unknown"
+
+    @override_settings(ERROR_RULES=[["unknown error", "custom", True]])
+    def test_recoverable_configured(self):
+        self.task.set_error("unknown error")
+
+        assert self.task.recoverable
+        assert self.task.error_class == "custom"
+
+    def test_reap_lease_expired(self):
+        task = self.task
+        task.status = task.Status.STARTED
+        task.started_at = task.created_at
+        task.heartbeat_at = timezone.now() - timedelta(
+            seconds=settings.HEARTBEAT_TIMEOUT_SECONDS + 1,
+        )
+        task.save()
+
+        assert Task.reap_lease_expired() == [task]
+
+        task = Task.objects.get(pk=task.id)
+        assert task.status == task.Status.INITED
+        assert task.heartbeat_at is None
+        assert not task.failed
+
+    def test_reap_lease_expired_to_downloading(self):
+        task = self.task
+        task.status = task.Status.TRANSFERRED
+        task.heartbeat_at = timezone.now() - timedelta(days=1)
+        task.save()
+
+        Task.reap_lease_expired()
+
+        task = Task.objects.get(pk=task.id)
+        assert task.status == task.Status.TRANSFERRED
+        assert task.heartbeat_at is None
+        assert list(Task.filter_transferd()) == [task]
+
+    def test_not_reap_living_lease(self):
+        task = self.task
+        task.status = task.Status.TRANSFERRED
+        task.save()
+        task.heartbeat(force=True)
+
+        assert task.is_leased
+        assert Task.reap_lease_expired() == []
+        assert list(Task.filter_transferd()) == []
+
+    def test_not_reap_waiting_for_captcha(self):
+        task = self.task
+        task.status = task.Status.STARTED
+        task.started_at = timezone.now() - timedelta(days=1)
+        task.captcha_required = True
+        task.save()
+
+        assert task.is_waiting_for_captcha_code
+        assert Task.reap_lease_expired() == []
+
+    def test_reap_started_without_heartbeat(self):
+        task = self.task
+        task.status = task.Status.STARTED
+        task.started_at = timezone.now() - timedelta(days=1)
+        task.save()
+
+        assert Task.reap_lease_expired() == [task]
+        assert Task.objects.get(pk=task.id).status == task.Status.INITED
+
+    def test_reap_without_retry(self):
+        task = self.task
+        task.status = task.Status.TRANSFERRED
+        task.heartbeat_at = timezone.now() - timedelta(days=1)
+        task.save()
+
+        for _ in range(settings.RETRY_TIMES_LIMIT + 1):
+            Task.objects.filter(pk=task.id).update(heartbeat_at=task.heartbeat_at)
+            assert Task.reap_lease_expired() == [task]
+
+        assert Task.objects.get(pk=task.id).retry_times == 0
+
+    def test_not_reap_beaten_in_meantime(self):
+        task = self.task
+        task.status = task.Status.TRANSFERRED
+        task.heartbeat_at = timezone.now() - timedelta(days=1)
+        task.save()
+        expired = Task.filter_lease_expired
+
+        def beat_after_filter():
+            tasks = list(expired())
+            task.heartbeat(force=True)
+            return tasks
+
+        with patch.object(Task, "filter_lease_expired", beat_after_filter):
+            assert Task.reap_lease_expired() == []
+        assert Task.objects.get(pk=task.id).is_leased
+
+    def test_heartbeat_throttled(self):
+        self.task.heartbeat(force=True)
+        beat_at = self.task.heartbeat_at
+
+        self.task.heartbeat()
+
+        assert self.task.heartbeat_at == beat_at
+        assert Task.objects.get(pk=self.task.id).heartbeat_at == beat_at
+
+    def test_claim_once(self):
+        worker1 = Task.objects.get(pk=self.task.id)
+        worker2 = Task.objects.get(pk=self.task.id)
+
+        assert worker1.claim()
+        assert not worker2.claim()
+        assert Task.objects.get(pk=self.task.id).is_leased
+
+    def test_claim_changed_status(self):
+        worker = Task.objects.get(pk=self.task.id)
+        Task.objects.filter(pk=self.task.id).update(status=Task.Status.TRANSFERRED)
+
+        assert not worker.claim()
+
+    def test_bulk_resume_same_as_resume(self):
+        now = timezone.now()
+        cases = [
+            dict(),
+            dict(started_at=now),
+            dict(started_at=now, transfer_completed_at=now),
+            dict(started_at=now, transfer_completed_at=now, sample_downloaded_at=now),
+            dict(
+                started_at=now,
+                transfer_completed_at=now,
+                sample_downloaded_at=now,
+                full_download_now=True,
+            ),
+        ]
+        pairs = []
+        for i, fields in enumerate(cases):
+            pair = []
+            for j in range(2):
+                task = Task.objects.create(
+                    shared_id=f"bulk{i}.{j}",
+                    status=Task.Status.FINISHED,
+                    failed=True,
+                    **fields,
+                )
+                task.set_error("BaiduPCS._request")
+                task.save()
+                pair.append(task)
+            pairs.append(pair)
+
+        for single, _ in pairs:
+            single.schedule_resume()
+        resumed = Task.bulk_resume(Task.objects.filter(shared_id__endswith=".1"))
+
+        assert resumed == len(cases)
+        for single, bulk in pairs:
+            bulk = Task.objects.get(pk=bulk.id)
+            single = Task.objects.get(pk=single.id)
+            for field in ["status", "failed", "error_class", "retry_times"]:
+                assert getattr(bulk, field) == getattr(single, field), field
+            assert bulk.version > 0
+
+    def test_add_progress_throttled(self):
+        self.task.reset_progress()
+        updated_at = Task.objects.get(pk=self.task.id).updated_at
+
+        self.task.add_progress(100)
+
+        assert self.task.progress_size == 100
+        task = Task.objects.get(pk=self.task.id)
+        assert task.progress_size == 0
+        assert task.updated_at == updated_at
+
+        with override_settings(PROGRESS_INTERVAL_SECONDS=0):
+            self.task.add_progress(100)
+
+        task = Task.objects.get(pk=self.task.id)
+        assert task.progress_size == 200
+        assert task.updated_at > updated_at
+        assert task.heartbeat_at
+
+    def test_local_files(self):
+        assert self.task.local_files == []
+
+        touch_file(self.task.data_path / "a.mp3")
+        touch_file(self.task.data_path / "cd1" / "b.mp3")
+        (self.task.data_path / "link.mp3").symlink_to(self.task.data_path / "a.mp3")
+        (self.task.data_path / "broken.mp3").symlink_to(self.task.data_path / "x")
+        (self.task.data_path / "cd2").symlink_to(self.task.data_path / "cd1")
+
+        files = sorted(self.task.local_files, key=lambda f: f["file"])
+        assert [f["file"] for f in files] == ["a.mp3", "cd1/b.mp3", "link.mp3"]
+        assert files[1]["size"] == 5120
+        # symlinks to files count by their targets, like os.path.getsize
+        assert files[2]["size"] == 5120
+        assert self.task.local_size == 3 * 5120
+        assert self.task.sample_downloaded_files == 3
+
+    def test_next_retry_at_backoff(self):
+        self.task.set_error("error_code: -65, message: 操作过于频繁，请您稍后重试")
+        assert self.task.error_class == "throttled"
+        base = settings.RETRY_THROTTLED_BACKOFF_SECONDS
+
+        self.task.retry_times = 2
+        delay = (self.task.get_next_retry_at() - timezone.now()).total_seconds()
+
+        assert base * 2 - 1 <= delay <= base * 4
+
+    def test_filter_due_retries(self):
+        self.task.failed = True
+        self.task.set_error("BaiduPCS._request")
+        self.task.next_retry_at = timezone.now() + timedelta(minutes=1)
+        self.task.save()
+
+        assert list(Task.filter_due_retries()) == []
+
+        self.task.next_retry_at = timezone.now()
+        self.task.save()
+
+        assert list(Task.filter_due_retries()) == [self.task]
+
+
+class LeaseTestCase(TransactionTestCase):
+    @override_settings(HEARTBEAT_INTERVAL_SECONDS=0.01)
+    def test_heartbeat_in_background(self):
+        task = Task.objects.create(shared_id="foo", shared_password="foo")
+
+        with lease(task):
+            beat_at = task.heartbeat_at
+            sleep(0.1)
+            assert Task.objects.get(pk=task.id).heartbeat_at > beat_at
+
+        assert Task.objects.get(pk=task.id).heartbeat_at is None
@@ -0,0 +1,205 @@
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from baidupcs_py.baidupcs import BaiduPCSError
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..baidupcs import BaiduPCSClient
+from ..models import CallbackEvent
+from ..models import Task
+from ..resync import resync
+
+
+def file(path: str, md5: str, size: int = 5, **fields):
+    return dict(path=path, is_dir=False, is_file=True, size=size, md5=md5, **fields)
+
+
+def shared_file(path: str, md5: str, fs_id: int):
+    return file(path, md5, fs_id=fs_id, uk=1, share_id=2, bdstoken="token")
+
+
+SHARED_FILES = [
+    shared_file("a.mp3", "a", 1),
+    shared_file("b.mp3", "b2", 2),
+    shared_file("d/e.mp3", "e", 3),
+]
+
+
+def fake_download_url(local_path: Path, url: str, headers, limit=0, **kwargs):
+    local_path.write_text("new")
+    return 3
+
+
+@patch("task.baidupcs.download_url", side_effect=fake_download_url)
+@patch("task.resync.list_shared_files", return_value=SHARED_FILES)
+class ResyncTestCase(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.task = Task.objects.create(
+            shared_link="https://pan.baidu.com/s/123abc",
+            shared_id="123abc",
+            shared_password="def",
+            callback="http://host/notify",
+            status=Task.Status.FINISHED,
+            full_download_now=True,
+            started_at=now,
+            transfer_completed_at=now,
+            sample_downloaded_at=now,
+            full_downloaded_at=now,
+        )
+        self.task.set_files(
+            [file("a.mp3", "a"), file("b.mp3", "b"), file("c.mp3", "c")],
+        )
+        self.task.save()
+        for name in ["a.mp3", "b.mp3", "c.mp3"]:
+            path = self.task.data_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("old")
+
+        self.client_ = BaiduPCSClient("bduss", {"BDUSS": "bduss"}, api=MagicMock())
+        remote_files = [
+            file(f"{self.task.remote_path}/{f['path']}", f["md5"]) for f in SHARED_FILES
+        ]
+        remote_files.append(file(f"{self.task.remote_path}/c.mp3", "c"))
+        self.client_.list_files = MagicMock(return_value=remote_files)
+
+    def read(self, name: str) -> str:
+        return (self.task.data_path / name).read_text()
+
+    def test_resync(self, mock_list_shared, mock_download):
+        self.task.request_resync()
+
+        summary = resync(self.client_, self.task)
+
+        assert summary == dict(added=1, changed=1, removed=0)
+        api = self.client_.api
+        api.remove.assert_called_once_with(f"{self.task.remote_path}/b.mp3")
+        transferred = {
+            call.args[0]: call.args[1] for call in api.transfer_shared_paths.mock_calls
+        }
+        assert transferred == {
+            self.task.remote_path: [2],
+            f"{self.task.remote_path}/d": [3],
+        }
+        assert mock_download.call_count == 2
+        assert self.read("a.mp3") == "old"
+        assert self.read("b.mp3") == "new"
+        assert self.read("c.mp3") == "old"
+        assert self.read("d/e.mp3") == "new"
+
+        self.task.refresh_from_db()
+        assert self.task.resync_requested_at is None
+        assert self.task.resynced_at
+        assert self.task.total_files == 4
+        assert self.task.status == Task.Status.FINISHED
+        assert CallbackEvent.objects.get().action == "files_resynced"
+
+    def test_duplicate_version_bumped(self, mock_list_shared, mock_download):
+        duplicate = Task.objects.create(
+            shared_link=self.task.shared_link,
+            shared_id=self.task.shared_id,
+            shared_password=self.task.shared_password,
+            duplicate_of=self.task,
+        )
+        self.task.request_resync()
+
+        resync(self.client_, self.task)
+
+        assert Task.objects.get(pk=duplicate.pk).version == duplicate.version + 1
+
+    def test_remove_deleted(self, mock_list_shared, mock_download):
+        self.task.request_resync(remove_deleted=True)
+
+        summary = resync(self.client_, self.task)
+
+        assert summary["removed"] == 1
+        self.client_.api.remove.assert_called_once_with(
+            f"{self.task.remote_path}/b.mp3",
+            f"{self.task.remote_path}/c.mp3",
+        )
+        assert not (self.task.data_path / "c.mp3").exists()
+
+    def test_failed(self, mock_list_shared, mock_download):
+        mock_list_shared.side_effect = BaiduPCSError("error_code: 145, message: ...")
+        self.task.request_resync()
+
+        resync(self.client_, self.task)
+
+        self.task.refresh_from_db()
+        assert self.task.resync_requested_at
+        assert self.task.resynced_at is None
+        assert self.task.failed
+        assert self.task.next_retry_at
+        assert self.task.error_code == 145
+        assert self.read("b.mp3") == "old"
+        assert CallbackEvent.objects.get().action == "resync_failed"
+        assert list(Task.filter_resync_requested()) == []
+
+        self.task.schedule_resume()
+
+        self.task.refresh_from_db()
+        assert self.task.status == Task.Status.FINISHED
+        assert list(Task.filter_resync_requested()) == [self.task]
+
+    def test_failed_evicted(self, mock_list_shared, mock_download):
+        mock_list_shared.side_effect = BaiduPCSError("error_code: 145, message: ...")
+        self.task.local_evicted_at = timezone.now()
+        self.task.save()
+        self.task.request_resync()
+
+        resync(self.client_, self.task)
+        self.task.schedule_resume()
+
+        self.task.refresh_from_db()
+        assert not self.task.failed
+        assert self.task.local_evicted_at
+        mock_download.assert_not_called()
+
+    def test_api(self, mock_list_shared, mock_download):
+        url = reverse("task-resync", args=[self.task.id])
+
+        response = self.client.post(url, {"remove_deleted": True}, format="json")
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["resync_requested_at"]
+        self.task.refresh_from_db()
+        assert self.task.resync_remove_deleted
+        assert list(Task.filter_resync_requested()) == [self.task]
+
+    def test_api_unfinished(self, mock_list_shared, mock_download):
+        Task.objects.filter(pk=self.task.pk).update(status=Task.Status.TRANSFERRED)
+        url = reverse("task-resync", args=[self.task.id])
+
+        response = self.client.post(url, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @patch("task.management.commands.runresync.get_baidupcs_client")
+    def test_runresync(self, mock_get_client, mock_list_shared, mock_download):
+        mock_get_client.return_value = self.client_
+        self.task.request_resync()
+
+        call_command("runresync", once=True)
+
+        self.task.refresh_from_db()
+        assert self.task.resynced_at
+        assert self.read("d/e.mp3") == "new"
+
+    def test_abandoned_resync_released(self, mock_list_shared, mock_download):
+        self.task.request_resync()
+        Task.objects.filter(pk=self.task.pk).update(
+            heartbeat_at=timezone.now() - timedelta(days=1),
+        )
+
+        Task.reap_lease_expired()
+
+        self.task.refresh_from_db()
+        assert self.task.heartbeat_at is None
+        assert self.task.retry_times == 0
+        assert list(Task.filter_resync_requested()) == [self.task]
@@ -0,0 +1,175 @@
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from baidupcs_py.baidupcs.inner import PcsSharedPath
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..baidupcs import BaiduPCSClient
+from ..baidupcs import save_shared
+from ..leecher import leech
+from ..models import Task
+from ..rules import PathRules
+
+
+def shared_path(path: str, fs_id: int, is_dir: bool = False, size: int = 5):
+    return PcsSharedPath(
+        fs_id=fs_id,
+        path=path,
+        size=size,
+        is_dir=is_dir,
+        is_file=not is_dir,
+        md5="",
+        uk=1,
+        share_id=2,
+        bdstoken="token",
+    )
+
+
+class SaveSharedTestCase(APITestCase):
+    def setUp(self):
+        self.api = MagicMock()
+        self.api.exists.return_value = True
+        self.api.list.return_value = []
+        self.api.shared_paths.return_value = [shared_path("/album", 1, is_dir=True)]
+        sub_paths = {
+            "/album": [
+                shared_path("/album/01.mp3", 2),
+                shared_path("/album/cover.jpg", 3),
+                shared_path("/album/demo", 4, is_dir=True),
+                shared_path("/album/02.mp3", 5, size=50),
+            ],
+            "/album/demo": [shared_path("/album/demo/03.mp3", 6)],
+        }
+        self.api.list_shared_paths.side_effect = lambda path, *args, **kwargs: (
+            sub_paths[path]
+        )
+        self.client_ = BaiduPCSClient("bduss", {"BDUSS": "bduss"}, api=self.api)
+
+    def save(self, rules=None):
+        save_shared(self.client_, "https://pan.baidu.com/s/1abc", "/dir", rules=rules)
+        return [call.args[1][0] for call in self.api.transfer_shared_paths.mock_calls]
+
+    def test_without_rules(self):
+        assert self.save() == [1]
+
+    def test_with_rules(self):
+        rules = PathRules(include="*.mp3", exclude="*/demo/*", max_file_size=10)
+
+        assert self.save(rules) == [2]
+        self.api.list_shared_paths.assert_called_once()
+        assert self.api.transfer_shared_paths.call_args.args[0] == "/dir/album"
+
+    def transferred(self):
+        return {
+            call.args[0]: call.args[1]
+            for call in self.api.transfer_shared_paths.mock_calls
+        }
+
+    def test_matched_files_in_chunks(self):
+        self.save(PathRules(include="*.mp3"))
+
+        assert self.transferred() == {"/dir/album": [2, 5], "/dir/album/demo": [6]}
+        assert self.api.list.call_count == 2
+
+    def test_skip_existing_matched_files(self):
+        self.api.list.return_value = [shared_path("/dir/album/02.mp3", 7)]
+
+        self.save(PathRules(include="*.mp3"))
+
+        assert self.transferred()["/dir/album"] == [2]
+
+
+@patch("task.baidupcs.download_url", return_value=5)
+class DownloadRulesTestCase(APITestCase):
+    def setUp(self):
+        self.task = Task.objects.create(
+            shared_link="https://pan.baidu.com/s/123abc",
+            shared_id="123abc",
+            shared_password="def",
+            exclude_paths="*.jpg",
+        )
+        files = [
+            dict(path=path, is_dir=False, is_file=True, size=5, md5="")
+            for path in ["a/01.mp3", "a/cover.jpg"]
+        ]
+        self.client_ = BaiduPCSClient("bduss", {"BDUSS": "bduss"}, api=MagicMock())
+        self.client_.list_files = MagicMock(return_value=files)
+
+    def test_leech(self, mock_download):
+        self.client_.leech(
+            self.task.remote_path,
+            self.task.data_path,
+            rules=self.task.get_rules(),
+        )
+
+        assert mock_download.call_count == 1
+        assert mock_download.call_args.args[0].name == "01.mp3"
+
+    @patch("task.leecher.admit", return_value=True)
+    def test_rules_changed_while_downloading(self, mock_admit, mock_download):
+        def change_rules(*args, **kwargs):
+            Task.objects.filter(pk=self.task.pk).update(
+                exclude_paths="*.flac",
+                priority=5,
+            )
+
+        self.client_.leech = MagicMock(side_effect=change_rules)
+
+        leech(self.client_, self.task)
+
+        task = Task.objects.get(pk=self.task.pk)
+        assert task.status == Task.Status.FINISHED
+        assert task.exclude_paths == "*.flac"
+        assert task.priority == 5
+
+    def test_no_rules(self, mock_download):
+        Task.objects.filter(pk=self.task.pk).update(exclude_paths="")
+        self.task.refresh_from_db()
+
+        assert self.task.get_rules() is None
+
+
+class RulesApiTestCase(APITestCase):
+    def test_create(self):
+        response = self.client.post(
+            reverse("task-list"),
+            {
+                "shared_link": "https://pan.baidu.com/s/123abc",
+                "include_paths": ["*.mp3", "re:.*\\.flac$"],
+                "max_file_size": 1024,
+            },
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        data = response.json()
+        assert data["include_paths"] == "*.mp3\nre:.*\\.flac$"
+        assert data["max_file_size"] == 1024
+
+    def test_invalid_rule(self):
+        response = self.client.post(
+            reverse("task-list"),
+            {"shared_link": "https://pan.baidu.com/s/123abc", "exclude_paths": "re:("},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "exclude_paths" in response.json()
+
+    def test_change_rules(self):
+        task = Task.objects.create(shared_id="123abc", shared_password="def")
+        version = task.version
+
+        response = self.client.post(
+            reverse("task-rules", args=[task.id]),
+            {"exclude_paths": "*.jpg"},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        task.refresh_from_db()
+        assert task.exclude_paths == "*.jpg"
+        assert task.include_paths == ""
+        assert task.version == version + 1
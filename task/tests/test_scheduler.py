@@ -0,0 +1,94 @@
+import pytest
+from django.test import TestCase
+
+from ..models import Task
+from ..scheduler import next_task
+from ..scheduler import run_queue
+from ..scheduler import schedule
+
+
+class ScheduleTestCase(TestCase):
+    def setUp(self):
+        self.big = Task.objects.create(
+            shared_id="big",
+            callback="http://a/notify",
+            total_size=1000,
+        )
+        self.small = Task.objects.create(
+            shared_id="small",
+            callback="http://a/notify",
+            total_size=10,
+        )
+        self.urgent = Task.objects.create(
+            shared_id="urgent",
+            callback="http://a/notify",
+            total_size=5000,
+            priority=1,
+        )
+        self.other = Task.objects.create(
+            shared_id="other",
+            callback="http://b/notify",
+            total_size=100,
+        )
+
+    def test_fifo(self):
+        tasks = list(schedule(Task.objects.all(), "fifo"))
+
+        assert tasks == [self.big, self.small, self.urgent, self.other]
+
+    def test_priority(self):
+        tasks = list(schedule(Task.objects.all(), "priority"))
+
+        assert tasks == [self.urgent, self.big, self.small, self.other]
+
+    def test_shortest_job_first(self):
+        tasks = list(schedule(Task.objects.all(), "sjf"))
+
+        assert tasks == [self.urgent, self.small, self.other, self.big]
+
+    def test_fair_share(self):
+        tasks = list(schedule(Task.objects.all(), "fair"))
+
+        assert tasks == [self.urgent, self.other, self.big, self.small]
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            schedule(Task.objects.all(), "random")
+
+    def test_fair_share_served(self):
+        tasks = list(schedule(Task.objects.all(), "fair", {"a": 1}))
+
+        assert tasks == [self.other, self.urgent, self.big, self.small]
+
+    def test_next_task(self):
+        assert next_task(Task.objects.all(), "sjf") == self.urgent
+        assert next_task(Task.objects.all(), "fair", {"a": 1}) == self.other
+        assert next_task(Task.objects.none(), "fair") is None
+
+    def test_run_queue_reselects_head(self):
+        runs = []
+        created = []
+
+        def run(task):
+            runs.append(task)
+            if not created:
+                created.append(
+                    Task.objects.create(
+                        shared_id="later",
+                        callback="http://c/notify",
+                        priority=2,
+                    ),
+                )
+
+        with self.settings(SCHEDULING_POLICY="priority"):
+            run_queue(Task.objects.all(), run)
+
+        assert runs == [self.urgent, created[0], self.big, self.small, self.other]
+
+    def test_run_queue_fair(self):
+        runs = []
+
+        with self.settings(SCHEDULING_POLICY="fair"):
+            run_queue(Task.objects.all(), runs.append)
+
+        assert runs == [self.urgent, self.other, self.big, self.small]
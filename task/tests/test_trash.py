@@ -0,0 +1,116 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import PurgeJob
+from ..models import TrashEntry
+from ..trash import evict
+from ..trash import get_trash_dir
+from ..trash import get_usage
+from ..trash import sync_entries
+from ..utils import list_files
+
+
+def make_dir(path: Path, size: int) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "file").write_bytes(b"x" * size)
+
+
+class TrashTestCase(TestCase):
+    def add_trash(self, name: str, size: int, days_ago: int = 0) -> TrashEntry:
+        make_dir(get_trash_dir() / name, size)
+        return TrashEntry.objects.create(
+            name=name,
+            size=size,
+            moved_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def test_purge_records_entries(self):
+        make_dir(settings.DATA_DIR / "foo.bar", 10)
+        make_dir(settings.DATA_DIR / "foo.bar.sample", 3)
+        PurgeJob.objects.create(move_to_trash=True)
+
+        call_command("runpurge", "--once")
+
+        entries = TrashEntry.objects.order_by("name")
+        assert [(e.name, e.size) for e in entries] == [
+            ("foo.bar", 10),
+            ("foo.bar.sample", 3),
+        ]
+        assert get_usage()["size"] == 13
+
+    def test_purge_replaces_older_copy(self):
+        self.add_trash("foo.bar", 10, days_ago=3)
+        make_dir(settings.DATA_DIR / "foo.bar", 20)
+        PurgeJob.objects.create(move_to_trash=True)
+
+        call_command("runpurge", "--once")
+
+        entry = TrashEntry.objects.get()
+        assert entry.size == 20
+        assert entry.moved_at > timezone.now() - timedelta(days=1)
+        assert (get_trash_dir() / "foo.bar" / "file").stat().st_size == 20
+
+    def test_evict_by_size(self):
+        self.add_trash("a.a", 10, days_ago=3)
+        self.add_trash("b.b", 10, days_ago=2)
+        self.add_trash("c.c", 10, days_ago=1)
+
+        evicted = evict(max_size=15, max_age_days=0)
+
+        assert [e.name for e in evicted] == ["a.a", "b.b"]
+        assert list(TrashEntry.objects.values_list("name", flat=True)) == ["c.c"]
+        assert list_files(get_trash_dir()) == ["c.c/file"]
+
+    def test_evict_by_age(self):
+        self.add_trash("a.a", 10, days_ago=10)
+        self.add_trash("b.b", 10, days_ago=1)
+
+        evicted = evict(max_size=0, max_age_days=7)
+
+        assert [e.name for e in evicted] == ["a.a"]
+        assert list_files(get_trash_dir()) == ["b.b/file"]
+
+    def test_evict_nothing_without_limits(self):
+        self.add_trash("a.a", 10, days_ago=1000)
+
+        assert evict(max_size=0, max_age_days=0) == []
+
+    @override_settings(TRASH_MAX_AGE_DAYS=7)
+    def test_runner_evicts(self):
+        self.add_trash("a.a", 10, days_ago=10)
+
+        call_command("runpurge", "--once")
+
+        assert not TrashEntry.objects.exists()
+        assert list_files(get_trash_dir()) == []
+
+    def test_sync_entries(self):
+        make_dir(get_trash_dir() / "legacy.dir", 5)
+        TrashEntry.objects.create(name="gone.dir", size=1)
+
+        sync_entries()
+
+        entry = TrashEntry.objects.get()
+        assert entry.name == "legacy.dir"
+        assert entry.size == 5
+
+    @override_settings(TRASH_MAX_SIZE=100)
+    def test_usage_api(self):
+        self.add_trash("a.a", 10, days_ago=2)
+        self.add_trash("b.b", 20)
+
+        response = self.client.get(reverse("task-trash"))
+
+        data = response.json()
+        assert data["count"] == 2
+        assert data["size"] == 30
+        assert data["max_size"] == 100
+        assert data["max_age_days"] == 0
+        assert data["oldest_moved_at"]
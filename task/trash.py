@@ -0,0 +1,127 @@
+import logging
+import os
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from threading import Event
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models import Min
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import TrashEntry
+from .utils import get_dir_size
+from .utils import RateLimiter
+from .utils import remove_tree
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR_NAME = "baidupcsleecher_trash"
+
+
+def get_trash_dir() -> Path:
+    return settings.DATA_DIR / TRASH_DIR_NAME
+
+
+def move_to_trash(path: Path, limiter: RateLimiter) -> int:
+    """
+    Move the directory into the trash dir, replacing an older copy of it.
+    Return the size of the moved directory.
+    """
+    trash_dir = get_trash_dir()
+    trash_dir.mkdir(parents=True, exist_ok=True)
+    target = trash_dir / path.name
+    if target.exists():
+        remove_tree(target, limiter, Event())
+    size = get_dir_size(path)
+    os.rename(path, target)
+    return size
+
+
+def add_entry(name: str, size: int) -> TrashEntry:
+    entry, _ = TrashEntry.objects.update_or_create(
+        name=name,
+        defaults=dict(size=size, moved_at=timezone.now()),
+    )
+    return entry
+
+
+def sync_entries() -> None:
+    """
+    Record directories in the trash dir which were moved there before the
+    trash was managed, and forget those which were removed by hand.
+    """
+    trash_dir = get_trash_dir()
+    names = set()
+    if trash_dir.exists():
+        with os.scandir(trash_dir) as entries:
+            names = {e.name for e in entries if e.is_dir(follow_symlinks=False)}
+    known = set(TrashEntry.objects.values_list("name", flat=True))
+    TrashEntry.objects.filter(name__in=known - names).delete()
+    for name in names - known:
+        path = trash_dir / name
+        moved_at = datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc)
+        TrashEntry.objects.create(name=name, size=get_dir_size(path), moved_at=moved_at)
+
+
+def get_expired_entries(max_size: int, max_age_days: int) -> List[TrashEntry]:
+    """
+    Entries older than `max_age_days`, and then the oldest ones until the
+    rest of the trash fits in `max_size`. No limit if either is 0.
+    """
+    entries = TrashEntry.objects.order_by("moved_at", "id")
+    expired = []
+    if max_age_days:
+        expired_before = timezone.now() - timedelta(days=max_age_days)
+        expired = list(entries.filter(moved_at__lt=expired_before))
+    if max_size:
+        kept = entries.exclude(id__in=[entry.id for entry in expired])
+        total = kept.aggregate(total=Sum("size"))["total"] or 0
+        for entry in kept:
+            if total <= max_size:
+                break
+            expired.append(entry)
+            total -= entry.size
+    return expired
+
+
+def evict(
+    max_size: Optional[int] = None,
+    max_age_days: Optional[int] = None,
+) -> List[TrashEntry]:
+    """
+    Delete the expired directories in the trash, oldest first.
+    """
+    if max_size is None:
+        max_size = settings.TRASH_MAX_SIZE
+    if max_age_days is None:
+        max_age_days = settings.TRASH_MAX_AGE_DAYS
+    limiter = RateLimiter(settings.PURGE_FILES_PER_SECOND)
+    evicted = []
+    for entry in get_expired_entries(max_size, max_age_days):
+        path = get_trash_dir() / entry.name
+        if path.exists():
+            remove_tree(path, limiter, Event())
+        entry.delete()
+        evicted.append(entry)
+        logger.info(f"{entry} evicted from trash, moved at {entry.moved_at}")
+    return evicted
+
+
+def get_usage() -> Dict[str, Any]:
+    usage = TrashEntry.objects.aggregate(
+        count=Count("id"),
+        size=Sum("size"),
+        oldest_moved_at=Min("moved_at"),
+    )
+    usage["size"] = usage["size"] or 0
+    usage["max_size"] = settings.TRASH_MAX_SIZE
+    usage["max_age_days"] = settings.TRASH_MAX_AGE_DAYS
+    return usage
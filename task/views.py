@@ -1,11 +1,25 @@
 import logging
+from hashlib import md5
 from io import BytesIO
+from typing import Any
+from typing import Dict
+from typing import Iterable
 from typing import Optional
+from typing import Tuple
 
 from baidupcs_py.baidupcs import BaiduPCSError
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import models
 from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django_filters import rest_framework as filters
+from django_filters.filterset import filterset_factory
 from rest_framework import mixins
 from rest_framework import status
 from rest_framework import viewsets
@@ -13,17 +27,42 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .baidupcs import get_baidupcs_client
+from .cache import get_task_documents
+from .dedupe import dedupe
+from .events import parse_cursor
+from .events import stream_task_events
+from .filelist import filter_files
+from .filelist import gzip_stream
+from .filelist import iterate_in_thread
+from .filelist import paginate
+from .filelist import select_fields
+from .filelist import to_ndjson
+from .importer import import_links
+from .importer import parse_links
+from .importer import summarize
 from .leecher import transfer
+from .models import PurgeJob
 from .models import Task
-from .purge import purge
+from .pagination import TaskCursorPagination
+from .serializers import BulkOperationSerializer
 from .serializers import CaptchaCodeSerializer
+from .serializers import FileListSerializer
 from .serializers import FullDownloadNowSerializer
 from .serializers import OperationSerializer
+from .serializers import PrioritySerializer
+from .serializers import PurgeJobSerializer
 from .serializers import PurgeSerializer
+from .serializers import ResyncSerializer
+from .serializers import RulesSerializer
+from .serializers import StatsSerializer
 from .serializers import TaskSerializer
+from .stats import get_stats
+from .trash import get_usage as get_trash_usage
 
 logger = logging.getLogger(__name__)
 
+SHARED_FILES_KEPT = "files kept for other tasks of the same share"
+
 
 def delete_remote_files(
     task_id: int,
@@ -42,6 +81,123 @@ def delete_remote_files(
     return Response({task_id: success_message})
 
 
+def file_list_response(request, files: Iterable[Dict[str, Any]], key: str):
+    """
+    Respond the file list filtered, paginated and reduced to the fields by
+    query parameters. NDJSON output is streamed, compressed if acceptable.
+    """
+    serializer = FileListSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    files = filter_files(
+        files,
+        key=key,
+        prefix=params["prefix"],
+        recursive=params["recursive"],
+        glob=params["glob"],
+        min_size=params.get("min_size"),
+        max_size=params.get("max_size"),
+    )
+    files = paginate(files, params["offset"], params.get("limit"))
+    files = select_fields(files, params["fields"])
+    if params["output"] == "json":
+        return Response(list(files))
+
+    content = to_ndjson(files)
+    gzipped = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if gzipped:
+        content = gzip_stream(content)
+    if isinstance(request._request, ASGIRequest):
+        content = iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type="application/x-ndjson")
+    if gzipped:
+        response["Content-Encoding"] = "gzip"
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+def erase_tasks(tasks: models.QuerySet) -> Optional[str]:
+    """
+    Erase tasks with their local files, and remote files in one request.
+    Return the error of deleting remote files if any.
+    """
+    tasks = list(tasks.only("id", "shared_id", "shared_password"))
+    Task.objects.filter(id__in=[task.id for task in tasks]).delete()
+    # files of the same share are kept while other tasks still use them
+    kept = set(
+        Task.objects.filter(
+            shared_id__in={task.shared_id for task in tasks},
+        ).values_list("shared_id", "shared_password"),
+    )
+    tasks = [
+        task for task in tasks if (task.shared_id, task.shared_password) not in kept
+    ]
+    for task in tasks:
+        task.delete_files()
+    if not tasks:
+        return None
+    try:
+        client = get_baidupcs_client()
+        client.delete(*dict.fromkeys(task.remote_path for task in tasks))
+    except Exception as exc:
+        logger.error(f"delete remote files of erased tasks failed: {exc}")
+        return str(exc)
+    return None
+
+
+def get_etag(versions: Iterable[Tuple[int, int]], extra: str = "") -> str:
+    """
+    Strong etag from (id, version) of tasks.
+
+    >>> get_etag([(1, 2)])
+    '"1.2"'
+    >>> get_etag([(1, 2), (3, 4)], "count=2")
+    '"e70dca4602035ef780b8ed1bd6e3c37e"'
+    """
+    versions = list(versions)
+    if len(versions) == 1 and not extra:
+        return '"%d.%d"' % versions[0]
+    content = ",".join("%d.%d" % v for v in versions) + ";" + extra
+    return '"%s"' % md5(content.encode()).hexdigest()
+
+
+def set_conditional_headers(response, etag: str, last_modified) -> None:
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+
+
+async def task_events(request):
+    """
+    Stream changes of tasks as server-sent events, filtered by `ids`.
+    Every event carries changed fields only, except the first one of
+    each task. Reconnecting with `Last-Event-ID` resumes the stream.
+    """
+    ids = [int(i) for i in request.GET.get("ids", "").split(",") if i.isdigit()]
+    cursor = parse_cursor(
+        request.headers.get("Last-Event-ID") or request.GET.get("since", ""),
+    )
+    if not cursor and not ids:
+        # only stream new changes if neither tasks nor position are given
+        cursor = (timezone.now(), 0)
+    try:
+        timeout = float(
+            request.GET.get("timeout", settings.TASK_EVENTS_TIMEOUT_SECONDS),
+        )
+    except ValueError:
+        timeout = settings.TASK_EVENTS_TIMEOUT_SECONDS
+    timeout = max(0, min(timeout, settings.TASK_EVENTS_TIMEOUT_SECONDS))
+    once = request.GET.get("once", "") in ("1", "true")
+
+    response = StreamingHttpResponse(
+        stream_task_events(ids, cursor, timeout, once=once),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class TaskViewSet(
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -52,14 +208,187 @@ class TaskViewSet(
     queryset = Task.objects.all().order_by("-id")
     serializer_class = TaskSerializer
     filter_backends = (filters.DjangoFilterBackend,)
-    filterset_fields = ("shared_link", "shared_id", "status", "failed")
+    filterset_fields = (
+        "shared_link",
+        "shared_id",
+        "status",
+        "failed",
+        "recoverable",
+        "error_class",
+        "priority",
+    )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if (
+                settings.TASK_PAGINATION == "cursor"
+                or TaskCursorPagination.cursor_query_param in self.request.query_params
+            ):
+                self._paginator = TaskCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    def perform_create(self, serializer):
+        task = serializer.save()
+        if serializer.validated_data["dedupe"]:
+            dedupe(task)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Answer conditional requests by the version of the task,
+        before loading and serializing it, or serve the cached document.
+        """
+        try:
+            row = (
+                self.get_queryset()
+                .filter(pk=kwargs["pk"])
+                .values("id", "version", "updated_at")
+                .first()
+            )
+        except (TypeError, ValueError, ValidationError):
+            # invalid pk, not found as get_object answers
+            row = None
+        if not row:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = get_etag([(row["id"], row["version"])])
+        last_modified = row["updated_at"]
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()),
+        )
+        if not_modified:
+            set_conditional_headers(not_modified, etag, last_modified)
+            return not_modified
+        documents = get_task_documents([row])
+        if not documents:
+            return super().retrieve(request, *args, **kwargs)
+        response = Response(documents[0])
+        set_conditional_headers(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        Answer conditional requests by versions of tasks in the page,
+        before loading and serializing them, or serve cached documents.
+        Only the etag is used, as deleting a task never raises the time
+        of last modification of the page.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values("id", "version", "updated_at")
+        page = self.paginate_queryset(rows)
+        paginated = page is not None
+        extra = ""
+        if not paginated:
+            page = list(rows)
+        elif not isinstance(self.paginator, TaskCursorPagination):
+            # links of page number pagination depend on the count
+            extra = f"count={self.paginator.page.paginator.count}"
+        etag = get_etag([(row["id"], row["version"]) for row in page], extra)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified:
+            set_conditional_headers(not_modified, etag, None)
+            return not_modified
+        documents = get_task_documents(page)
+        if paginated:
+            response = self.get_paginated_response(documents)
+        else:
+            response = Response(documents)
+        set_conditional_headers(response, etag, None)
+        return response
+
+    @action(methods=["post"], detail=False, name="Operate tasks in bulk")
+    def bulk(self, request):
+        """
+        Run an operation on tasks given by `ids`, or by `filter` with the
+        same parameters as filtering the task list, in as few queries as
+        possible. Report the result of every task.
+        """
+        serializer = self.get_serializer_class()(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        tasks = Task.objects.all()
+        if "ids" in data:
+            tasks = tasks.filter(id__in=data["ids"])
+        else:
+            unknown = set(data["filter"]) - set(self.filterset_fields)
+            if unknown:
+                return Response(
+                    {"error": f"unknown filter: {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            filterset_class = filterset_factory(Task, fields=self.filterset_fields)
+            filterset = filterset_class(data["filter"], queryset=tasks)
+            if not filterset.is_valid():
+                return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+            tasks = filterset.qs
+        ids = list(tasks.order_by("id").values_list("id", flat=True))
+        tasks = Task.objects.filter(id__in=ids)
+
+        operation = data["operation"]
+        results = {task_id: "done" for task_id in ids}
+        for task_id in set(data.get("ids", [])) - set(ids):
+            results[task_id] = "not found"
+        response = {"operation": operation, "count": len(ids), "results": results}
+        if operation == "restart":
+            Task.bulk_restart(tasks)
+        elif operation == "restart_downloading":
+            Task.bulk_restart_downloading(tasks)
+        elif operation == "resume":
+            failed = set(tasks.filter(failed=True).values_list("id", flat=True))
+            Task.bulk_resume(tasks)
+            for task_id in set(ids) - failed:
+                results[task_id] = "skipped, not failed"
+        elif operation == "full_download_now":
+            Task.bulk_update(tasks, full_download_now=data["full_download_now"])
+        elif operation == "erase":
+            error = erase_tasks(tasks)
+            if error:
+                response["error"] = f"remote files not deleted: {error}"
+        return Response(response)
+
+    @action(detail=False, name="Statistics of tasks")
+    def stats(self, request):
+        serializer = StatsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        tasks = Task.objects.all()
+        if "since" in serializer.validated_data:
+            tasks = tasks.filter(created_at__gte=serializer.validated_data["since"])
+        if "until" in serializer.validated_data:
+            tasks = tasks.filter(created_at__lt=serializer.validated_data["until"])
+        return Response(get_stats(tasks))
+
+    @action(methods=["post"], detail=False, name="Create tasks in bulk")
+    def bulk_create(self, request):
+        """
+        Accept a JSON array, NDJSON or plain text with one link per line,
+        and report the result of every item.
+        """
+        skip_duplicates = request.query_params.get("skip_duplicates", "true")
+        try:
+            items = list(parse_links(request.body.decode()))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        dedupe = request.query_params.get("dedupe", str(int(settings.DEDUPE_TASKS)))
+        results = import_links(
+            items,
+            skip_duplicates=skip_duplicates.lower() not in ("false", "0"),
+            dedupe=dedupe.lower() not in ("false", "0"),
+        )
+        return Response(summarize(results))
 
     @action(methods=["get", "delete"], detail=True, name="Remote Files")
     def files(self, request, pk: Optional[int] = None):
         task = self.get_object()
         if request.method == "GET":
-            return Response(task.load_files())
+            return file_list_response(request, task.load_files(), "path")
         if request.method == "DELETE":
+            if task.filter_sharing_files().exists():
+                return Response({task.id: f"remote {SHARED_FILES_KEPT}"})
             return delete_remote_files(
                 task.id,
                 task.remote_path,
@@ -70,9 +399,13 @@ class TaskViewSet(
     def local_files(self, request, pk: Optional[int] = None):
         task = self.get_object()
         if request.method == "GET":
-            return Response(task.list_local_files())
+            task.touch()
+            return file_list_response(request, task.list_local_files(), "file")
         if request.method == "DELETE":
+            if task.filter_sharing_files().exists():
+                return Response({task.id: f"local {SHARED_FILES_KEPT}"})
             task.delete_files()
+            task.bump_version()
             return Response({task.id: "local files deleted"})
 
     @action(detail=True, name="Captch Image")
@@ -113,6 +446,24 @@ class TaskViewSet(
         task.save()
         return Response(TaskSerializer(task).data)
 
+    @action(methods=["post"], detail=True, name="Change priority of task")
+    def priority(self, request, pk: Optional[int] = None):
+        serializer = PrioritySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = self.get_object()
+        task.priority = serializer.validated_data["priority"]
+        task.save()
+        return Response(TaskSerializer(task).data)
+
+    @action(methods=["post"], detail=True, name="Change path rules of task")
+    def rules(self, request, pk: Optional[int] = None):
+        serializer = self.get_serializer_class()(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = self.get_object()
+        # applied to the files not downloaded yet
+        task.save_fields(**serializer.validated_data)
+        return Response(TaskSerializer(task).data)
+
     @action(methods=["post"], detail=True, name="Restart task to downloading files")
     def restart_downloading(self, request, pk: Optional[int] = None):
         task = self.get_object()
@@ -131,11 +482,29 @@ class TaskViewSet(
         task.schedule_resume()
         return Response({"status": task.status})
 
+    @action(methods=["post"], detail=True, name="Fetch changes of the share")
+    def resync(self, request, pk: Optional[int] = None):
+        serializer = self.get_serializer_class()(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = self.get_object()
+        if task.status != Task.Status.FINISHED or task.failed:
+            return Response(
+                {"error": "only finished tasks can be resynced"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        task.request_resync(serializer.validated_data["remove_deleted"])
+        # `runresync` will fetch the changes in background
+        return Response(
+            TaskSerializer(task).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
     @action(methods=["delete"], detail=True, name="Erase task, remote and local files")
     def erase(self, request, pk: Optional[int] = None):
         task = self.get_object()
         task_id = task.id
-        task.erase()
+        if not task.erase():
+            return Response({task_id: f"task deleted, {SHARED_FILES_KEPT}"})
         message = "task deleted"
         try:
             return delete_remote_files(
@@ -155,20 +524,44 @@ class TaskViewSet(
     def purge(self, request):
         serializer = self.get_serializer_class()(data=request.data)
         serializer.is_valid(raise_exception=True)
-        if serializer.validated_data["move_to_trash"]:
-            purge(settings.DATA_DIR / "baidupcsleecher_trash")
-        else:
-            purge()
-        return Response({"done": True})
+        job = PurgeJob.objects.create(
+            move_to_trash=serializer.validated_data["move_to_trash"],
+        )
+        # `runpurge` will run the job in background
+        return Response(
+            PurgeJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        methods=["get", "delete"],
+        detail=False,
+        url_path=r"purge/(?P<job_id>[0-9]+)",
+        name="Progress of purge job, or cancel it",
+    )
+    def purge_job(self, request, job_id: int):
+        job = get_object_or_404(PurgeJob, pk=job_id)
+        if request.method == "DELETE" and not job.done:
+            job.cancel()
+        return Response(PurgeJobSerializer(job).data)
+
+    @action(methods=["get"], detail=False, name="Usage of the trash")
+    def trash(self, request):
+        return Response(get_trash_usage())
 
     def get_serializer_class(self):
         serializer_classes = {
+            "bulk": BulkOperationSerializer,
             "captcha_code": CaptchaCodeSerializer,
             "full_download_now": FullDownloadNowSerializer,
+            "priority": PrioritySerializer,
             "purge": PurgeSerializer,
+            "resync": ResyncSerializer,
+            "rules": RulesSerializer,
             "restart": OperationSerializer,
             "restart_downloading": OperationSerializer,
             "resume": OperationSerializer,
             "erase": OperationSerializer,
+            "purge_job": OperationSerializer,
         }
         return serializer_classes.get(self.action, self.serializer_class)
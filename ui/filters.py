@@ -0,0 +1,89 @@
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+
+import django_filters
+from django import forms
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from task.models import Task
+
+INPUT_CLASS = "input input-bordered input-sm"
+SELECT_CLASS = "select select-bordered select-sm"
+BOOLEAN_CHOICES = [("", "---------"), ("true", "Yes"), ("false", "No")]
+
+
+def start_of_day(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def search_largest_file(queryset: QuerySet, name: str, value: str) -> QuerySet:
+    """
+    Full-text search on PostgreSQL, backed by the GIN index created in
+    migration 0021, a plain substring match on other databases.
+    """
+    if connection.vendor == "postgresql":
+        matched = RawSQL(
+            "to_tsvector('simple', largest_file) @@ plainto_tsquery('simple', %s)",
+            [value],
+            output_field=BooleanField(),
+        )
+        return queryset.filter(matched)
+    return queryset.filter(largest_file__icontains=value)
+
+
+class TaskFilter(django_filters.FilterSet):
+    status = django_filters.ChoiceFilter(
+        choices=Task.Status.choices,
+        widget=forms.Select(attrs={"class": SELECT_CLASS}),
+    )
+    failed = django_filters.BooleanFilter(
+        widget=forms.Select(choices=BOOLEAN_CHOICES, attrs={"class": SELECT_CLASS}),
+    )
+    recoverable = django_filters.BooleanFilter(
+        widget=forms.Select(choices=BOOLEAN_CHOICES, attrs={"class": SELECT_CLASS}),
+    )
+    shared_id = django_filters.CharFilter(
+        lookup_expr="startswith",
+        widget=forms.TextInput(
+            attrs={"class": INPUT_CLASS, "placeholder": "shared id"},
+        ),
+    )
+    created_after = django_filters.DateFilter(
+        method="filter_created_after",
+        widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}),
+    )
+    created_before = django_filters.DateFilter(
+        method="filter_created_before",
+        widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}),
+    )
+    q = django_filters.CharFilter(
+        method=search_largest_file,
+        widget=forms.TextInput(
+            attrs={"class": INPUT_CLASS, "placeholder": "Search file / 搜索文件"},
+        ),
+    )
+
+    class Meta:
+        model = Task
+        fields = [
+            "status",
+            "failed",
+            "recoverable",
+            "shared_id",
+            "created_after",
+            "created_before",
+            "q",
+        ]
+
+    # compare with the bounds of the days, so the index of created_at is used
+    def filter_created_after(self, queryset: QuerySet, name: str, value: date):
+        return queryset.filter(created_at__gte=start_of_day(value))
+
+    def filter_created_before(self, queryset: QuerySet, name: str, value: date):
+        return queryset.filter(created_at__lt=start_of_day(value + timedelta(days=1)))
@@ -1,13 +1,28 @@
+import re
+
 from django import forms
+from django.conf import settings
 
 from task.models import Task
+from task.rules import compile_patterns
 from task.utils import parse_shared_link
 
 
 class NewTaskForm(forms.ModelForm):
+    # fast-forward to finished if the same share has been downloaded
+    dedupe = forms.BooleanField(required=False)
+
     class Meta:
         model = Task
-        fields = ["shared_link", "shared_id", "shared_password", "full_download_now"]
+        fields = [
+            "shared_link",
+            "shared_id",
+            "shared_password",
+            "full_download_now",
+            "priority",
+            "include_paths",
+            "exclude_paths",
+        ]
         widgets = {
             "shared_link": forms.TextInput(
                 attrs={"class": "input input-bordered w-full max-w-xxs"},
@@ -16,8 +31,39 @@ class NewTaskForm(forms.ModelForm):
                 attrs={"class": "input input-bordered w-full max-w-xxs"},
             ),
             "full_download_now": forms.TextInput(attrs={"class": "form-control"}),
+            "priority": forms.NumberInput(
+                attrs={"class": "input input-bordered w-full max-w-xxs"},
+            ),
+            "include_paths": forms.Textarea(
+                attrs={"class": "textarea textarea-bordered w-full", "rows": 2},
+            ),
+            "exclude_paths": forms.Textarea(
+                attrs={"class": "textarea textarea-bordered w-full", "rows": 2},
+            ),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["priority"].required = False
+        self.fields["dedupe"].initial = settings.DEDUPE_TASKS
+
+    def clean_priority(self):
+        return self.cleaned_data.get("priority") or 0
+
+    def clean_rules(self, name: str) -> str:
+        value = self.cleaned_data.get(name, "")
+        try:
+            compile_patterns(value)
+        except re.error as exc:
+            raise forms.ValidationError(f"invalid rule: {exc}")
+        return value
+
+    def clean_include_paths(self):
+        return self.clean_rules("include_paths")
+
+    def clean_exclude_paths(self):
+        return self.clean_rules("exclude_paths")
+
     def clean(self):
         cleaned_data = super().clean()
         shared_link = cleaned_data.get("shared_link")
@@ -0,0 +1,52 @@
+from typing import List
+from typing import Optional
+
+from django.db import models
+
+from task.models import Task
+
+
+class CursorPage:
+    """
+    A page of tasks in descending order of id, located by the id of a task
+    on the adjacent page instead of a page number, so neither COUNT(*) nor
+    deep OFFSET is needed.
+    """
+
+    def __init__(
+        self,
+        queryset: models.QuerySet,
+        per_page: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ):
+        self.per_page = per_page
+        self.object_list: List[Task] = []
+        if after:
+            # tasks newer than `after`, the closest ones
+            tasks = list(queryset.filter(id__gt=after).order_by("id")[: per_page + 1])
+            self.object_list = tasks[:per_page][::-1]
+            self.has_previous = len(tasks) > per_page
+            self.has_next = True
+        if not self.object_list:
+            tasks = queryset.order_by("-id")
+            if before:
+                tasks = tasks.filter(id__lt=before)
+            tasks = list(tasks[: per_page + 1])
+            self.object_list = tasks[:per_page]
+            self.has_previous = bool(before)
+            self.has_next = len(tasks) > per_page
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    @property
+    def previous_cursor(self) -> Optional[int]:
+        return self.object_list[0].id if self.object_list else None
+
+    @property
+    def next_cursor(self) -> Optional[int]:
+        return self.object_list[-1].id if self.object_list else None
@@ -1,4 +1,9 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import Client
+from django.test import override_settings
 from django.test import TestCase
 from django.urls import reverse
 
@@ -97,6 +102,62 @@ class TaskUITestCase(BaseTestCase):
         assert b"hello" in response.content
         assert b"wrld" in response.content
 
+    def test_new_task_with_priority(self):
+        response = self.client.post(
+            reverse("new_task"),
+            {
+                "shared_link": "https://pan.baidu.com/s/hello",
+                "priority": "5",
+            },
+        )
+
+        assert response.status_code == 302
+        assert Task.objects.get(shared_id="hello").priority == 5
+
+    def test_new_task_with_rules(self):
+        response = self.client.post(
+            reverse("new_task"),
+            {
+                "shared_link": "https://pan.baidu.com/s/hello",
+                "include_paths": "*.mp3\n*.flac",
+            },
+        )
+
+        assert response.status_code == 302
+        rules = Task.objects.get(shared_id="hello").get_rules()
+        assert rules.match("cd1/01.flac")
+        assert not rules.match("cd1/cover.jpg")
+
+    def test_new_task_with_invalid_rules(self):
+        response = self.client.post(
+            reverse("new_task"),
+            {
+                "shared_link": "https://pan.baidu.com/s/hello",
+                "exclude_paths": "re:(",
+            },
+        )
+
+        assert response.status_code == 200
+        assert b"invalid rule" in response.content
+        assert not Task.objects.filter(shared_id="hello").exists()
+
+    @patch("task.dedupe.is_fresh", return_value=True)
+    def test_new_task_dedupe(self, mock_is_fresh):
+        original = Task.objects.get(id=1)
+
+        response = self.client.post(
+            reverse("new_task"),
+            {
+                "shared_link": "https://pan.baidu.com/s/badbeef?pwd=bee",
+                "dedupe": "on",
+            },
+        )
+
+        assert response.status_code == 302
+        task = Task.objects.order_by("-id").first()
+        assert task.status == Task.Status.FINISHED
+        assert task.duplicate_of == original
+
     def test_new_task_failed(self):
         response = self.client.post(
             reverse("new_task"),
@@ -189,3 +250,168 @@ class HTMXTestCase(BaseTestCase):
         assert len(Task.objects.all()) == 2
         response = self.client.get(reverse("index"))
         assert b"wrongurl" not in response.content
+
+
+@override_settings(TASK_PAGINATION="cursor")
+class CursorPaginationTestCase(BaseTestCase):
+    def test_next_page(self):
+        response = self.client.get(reverse("task_list"), {"per_page": 1})
+
+        assert b"feedcafe" in response.content
+        assert b"badbeef" not in response.content
+        assert b"Next Page" in response.content
+        assert b"Prev Page" not in response.content
+        assert b"before=2" in response.content
+
+    def test_prev_page(self):
+        response = self.client.get(
+            reverse("task_list"),
+            {"per_page": 1, "before": 2},
+        )
+
+        assert b"badbeef" in response.content
+        assert b"Next Page" not in response.content
+        assert b"after=1" in response.content
+
+        response = self.client.get(reverse("task_list"), {"per_page": 1, "after": 1})
+
+        assert b"feedcafe" in response.content
+        assert b"Prev Page" not in response.content
+
+
+class TaskListCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_rendered_page_cached(self):
+        url = reverse("task_list")
+        content = self.client.get(url).content
+
+        with patch("ui.views.render_to_string") as render_to_string:
+            assert self.client.get(url).content == content
+        render_to_string.assert_not_called()
+
+        task = Task.objects.get(id=2)
+        task.shared_password = "beef"
+        task.save()
+        response = self.client.get(url)
+        assert b"beef" in response.content
+
+    @override_settings(TASK_CACHE_SECONDS=0)
+    def test_cache_disabled(self):
+        url = reverse("task_list")
+        self.client.get(url)
+
+        with patch("ui.views.render_to_string", return_value="") as render_to_string:
+            self.client.get(url)
+        render_to_string.assert_called_once()
+
+
+class TaskProgressTestCase(BaseTestCase):
+    def test_active_task_polled(self):
+        response = self.client.get(reverse("task_list"))
+
+        assert b'hx-get="/ui/task/2/progress?status=Inited"' in response.content
+        assert b"/ui/task/1/progress" not in response.content
+
+    def test_progress_fragment(self):
+        task = Task.objects.get(id=2)
+        task.status = Task.Status.SAMPLING_DOWNLOADED
+        task.full_download_now = True
+        task.sample_downloaded_at = task.created_at
+        task.total_size = 1000
+        task.progress_size = 250
+        task.save()
+
+        with patch("task.models.Task.list_local_files") as list_local_files:
+            response = self.client.get(
+                reverse("task_progress", args=[2]),
+                {"status": "SampleDLed"},
+            )
+        list_local_files.assert_not_called()
+
+        assert "HX-Retarget" not in response
+        assert b"width:25%" in response.content
+        assert b"every 3s" in response.content
+        assert b"feedcafe" not in response.content
+
+    def test_status_changed(self):
+        response = self.client.get(
+            reverse("task_progress", args=[1]),
+            {"status": "SampleDLed"},
+        )
+
+        assert response["HX-Retarget"] == "#task-1"
+        assert b"badbeef" in response.content
+        assert b"hx-trigger" not in response.content
+
+    def test_deleted_task(self):
+        response = self.client.get(reverse("task_progress", args=[999]))
+
+        assert response.status_code == 286
+
+
+class TaskFilterTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        task = Task.objects.get(id=2)
+        task.set_files(
+            [
+                {"path": "张楚/孤独的人是可耻的.mp3", "size": 100, "is_file": True},
+                {"path": "张楚/姐姐.mp3", "size": 50, "is_file": True},
+            ],
+        )
+        task.failed = True
+        task.save()
+
+    def get_task_list(self, **params):
+        response = self.client.get(reverse("task_list"), params)
+        assert response.status_code == 200
+        return response.content.decode()
+
+    def test_filter_status(self):
+        content = self.get_task_list(status="Finished")
+
+        assert "badbeef" in content
+        assert "feedcafe" not in content
+
+    def test_filter_failed(self):
+        content = self.get_task_list(failed="true")
+
+        assert "badbeef" not in content
+        assert "feedcafe" in content
+
+    def test_filter_shared_id_prefix(self):
+        content = self.get_task_list(shared_id="feed")
+
+        assert "badbeef" not in content
+        assert "feedcafe" in content
+
+    def test_filter_created_at(self):
+        today = Task.objects.get(id=1).created_at.date()
+
+        assert "badbeef" in self.get_task_list(created_after=today)
+        assert "badbeef" in self.get_task_list(created_before=today)
+        assert "badbeef" not in self.get_task_list(
+            created_after=today + timedelta(days=1),
+        )
+
+    def test_search_largest_file(self):
+        content = self.get_task_list(q="孤独")
+
+        assert "badbeef" not in content
+        assert "feedcafe" in content
+
+    def test_filters_kept_in_pagination(self):
+        content = self.get_task_list(failed="false", per_page=1)
+
+        assert "badbeef" in content
+        assert "Next Page" not in content
+
+        today = Task.objects.get(id=1).created_at.date()
+        content = self.get_task_list(created_after=today, per_page=1)
+
+        assert "Next Page" in content
+        assert f"created_after={today}&per_page=1&page=2" in content
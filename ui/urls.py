@@ -6,5 +6,6 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("new", views.new_task, name="new_task"),
     path("list", views.task_list, name="task_list"),
+    path("task/<int:task_id>/progress", views.task_progress, name="task_progress"),
     path("nothing", views.nothing, name="nothing"),
 ]
@@ -1,16 +1,26 @@
 import json
+from hashlib import md5
+from typing import Tuple
+from typing import Union
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Page
 from django.core.paginator import Paginator
 from django.http import HttpRequest
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_GET
 from django.views.decorators.http import require_POST
 from django_htmx.middleware import HtmxDetails
 
+from .filters import TaskFilter
 from .forms import NewTaskForm
+from .pagination import CursorPage
+from task.cache import get_cache_key
+from task.dedupe import dedupe
 from task.models import Task
 
 
@@ -18,25 +28,114 @@ class HtmxHttpRequest(HttpRequest):
     htmx: HtmxDetails
 
 
-def get_task_list_page(request: HtmxHttpRequest) -> Page:
-    tasks = Task.objects.all().order_by("-id")
-    page_number = int(request.GET.get("page") or 1)
+# query parameters of the position in the list, the others are filters
+PAGE_PARAMS = ("page", "per_page", "before", "after")
+
+
+def get_filter_query(request: HtmxHttpRequest) -> str:
+    params = request.GET.copy()
+    for name in PAGE_PARAMS:
+        params.pop(name, None)
+    return params.urlencode()
+
+
+def get_task_list_page(
+    request: HtmxHttpRequest,
+) -> Tuple[Union[Page, CursorPage], TaskFilter]:
+    # the other fields are loaded only if the rendered page is not cached
+    tasks = Task.objects.only("id", "version", "updated_at").order_by("-id")
+    task_filter = TaskFilter(request.GET, queryset=tasks)
+    tasks = task_filter.qs
     per_page = int(request.GET.get("per_page") or 10)
+    if settings.TASK_PAGINATION == "cursor":
+        page = CursorPage(
+            tasks,
+            per_page,
+            before=int(request.GET.get("before") or 0),
+            after=int(request.GET.get("after") or 0),
+        )
+        return page, task_filter
+    page_number = int(request.GET.get("page") or 1)
     paginator = Paginator(tasks, per_page=per_page)
     page = paginator.get_page(page_number)
-    return page
+    return page, task_filter
+
+
+def get_page_cache_key(page: Union[Page, CursorPage], filter_query: str = "") -> str:
+    if isinstance(page, CursorPage):
+        position = (page.per_page, page.has_previous, page.has_next)
+    else:
+        position = (page.number, page.paginator.num_pages, page.paginator.per_page)
+    tasks = ",".join(get_cache_key(t.id, t.version, t.updated_at) for t in page)
+    content = f"{position};{filter_query};{tasks}"
+    return f"ui:task_list:{md5(content.encode()).hexdigest()}"
+
+
+def render_task_list(request: HtmxHttpRequest, page: Union[Page, CursorPage]) -> str:
+    """
+    Render the page of tasks, or reuse the rendered one if none of the
+    tasks in the page has changed since.
+    """
+    filter_query = get_filter_query(request)
+    key = get_page_cache_key(page, filter_query)
+    html = cache.get(key) if settings.TASK_CACHE_SECONDS else None
+    if html is None:
+        tasks = Task.objects.in_bulk([task.id for task in page])
+        page.object_list = [tasks[task.id] for task in page if task.id in tasks]
+        html = render_to_string(
+            "ui/task_list.html",
+            {
+                "page": page,
+                "filter_query": filter_query,
+                "progress_interval": settings.UI_PROGRESS_INTERVAL_SECONDS,
+            },
+            request,
+        )
+        if settings.TASK_CACHE_SECONDS:
+            cache.set(key, html, timeout=settings.TASK_CACHE_SECONDS)
+    return html
 
 
 @require_GET
 def index(request: HtmxHttpRequest) -> HttpResponse:
-    page = get_task_list_page(request)
-    return render(request, "ui/index.html", {"page": page, "form": NewTaskForm()})
+    page, task_filter = get_task_list_page(request)
+    return render(
+        request,
+        "ui/index.html",
+        {
+            "task_list": render_task_list(request, page),
+            "filter": task_filter,
+            "form": NewTaskForm(),
+        },
+    )
 
 
 @require_GET
 def task_list(request: HtmxHttpRequest) -> HttpResponse:
-    page = get_task_list_page(request)
-    return render(request, "ui/task_list.html", {"page": page})
+    page, task_filter = get_task_list_page(request)
+    return HttpResponse(render_task_list(request, page))
+
+
+@require_GET
+def task_progress(request: HtmxHttpRequest, task_id: int) -> HttpResponse:
+    """
+    The progress bar of an active task, polled from stored fields only.
+    Once the status changed, the whole card is rendered again instead.
+    """
+    try:
+        task = Task.objects.defer("files", "captcha").get(pk=task_id)
+    except Task.DoesNotExist:
+        # stop polling
+        return HttpResponse(status=286)
+
+    context = {"task": task, "progress_interval": settings.UI_PROGRESS_INTERVAL_SECONDS}
+    if task.is_active and task.status == request.GET.get("status"):
+        return render(request, "ui/task_progress.html", context)
+
+    response = render(request, "ui/task_card.html", context)
+    response["HX-Retarget"] = f"#task-{task.id}"
+    response["HX-Reswap"] = "outerHTML"
+    return response
 
 
 @require_POST
@@ -52,6 +151,8 @@ def new_task(request: HtmxHttpRequest) -> HttpResponse:
         )
 
     task = form.save()
+    if form.cleaned_data["dedupe"]:
+        dedupe(task)
 
     if not request.htmx:
         return HttpResponseRedirect("/ui/")